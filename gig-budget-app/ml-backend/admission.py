@@ -0,0 +1,180 @@
+import contextlib
+import json
+import os
+import threading
+import time
+
+try:
+    from threadpoolctl import ThreadpoolController
+except ImportError:  # Thread budgets are then not enforced
+    ThreadpoolController = None
+
+CPUS = os.cpu_count() or 2
+
+def _lane_setting(lane, setting, default):
+    return type(default)(os.environ.get(f'ADMISSION_{lane.upper()}_{setting}', default))
+
+# Each kind of work runs in its own lane, with at most CONCURRENCY requests
+# running and QUEUE more waiting up to QUEUE_TIMEOUT seconds for a slot;
+# anything beyond that is turned away with 429 and Retry-After. THREADS caps
+# the OpenMP threads (HistGradientBoosting, KMeans) a request of the lane may
+# start, so concurrent requests do not oversubscribe the cores. Every setting
+# can be overridden with ADMISSION_<LANE>_<SETTING>, e.g. ADMISSION_BATCH_QUEUE.
+LANE_DEFAULTS = {
+    # Dashboard requests: short, latency-sensitive
+    'interactive': {"CONCURRENCY": CPUS * 2, "QUEUE": CPUS * 8, "QUEUE_TIMEOUT": 2.0, "THREADS": 1,
+                    "RETRY_AFTER": 1},
+    # Bulk requests (tax batches, scenario sweeps, dataset uploads) and background model fits
+    'batch': {"CONCURRENCY": max(1, CPUS // 4), "QUEUE": CPUS * 2, "QUEUE_TIMEOUT": 10.0,
+              "THREADS": max(1, CPUS // 4), "RETRY_AFTER": 5},
+    # Retraining: one at a time, in its own process, on at most half the cores
+    'training': {"CONCURRENCY": 1, "QUEUE": 0, "QUEUE_TIMEOUT": 0.0, "THREADS": max(1, CPUS // 2),
+                 "RETRY_AFTER": 60}
+}
+
+# Lane of each API route; other /api/ routes are interactive
+ROUTE_LANES = {
+    'tax-batch': 'batch',
+    'expense-scenarios': 'batch',
+    'datasets': 'batch',
+    'categorize-expenses': 'batch',
+    'train-models': 'training'
+}
+
+# Operational endpoints that must answer even when every lane is saturated
+UNLIMITED_ROUTES = frozenset({'memory', 'memory/profile', 'cluster', 'admission'})
+
+class LaneSaturated(Exception):
+    """A lane's running and queued slots are all taken"""
+
+    def __init__(self, lane):
+        super().__init__(f"The {lane.name} lane is saturated")
+        self.lane = lane
+
+_controller = None
+_controller_lock = threading.Lock()
+
+def limit_threads(threads):
+    """Cap the OpenMP threads started from the calling thread; OpenMP thread counts are per thread
+
+    BLAS pools are process-wide and left alone, since one request's limit
+    would change every other running request's.
+    """
+    global _controller
+    if not threads or ThreadpoolController is None:
+        return contextlib.nullcontext()
+    with _controller_lock:
+        if _controller is None:
+            _controller = ThreadpoolController()  # Scans the loaded libraries once
+    return _controller.limit(limits=threads, user_api='openmp')
+
+class Lane:
+    """Bounded concurrency with a bounded wait queue in front of it"""
+
+    def __init__(self, name, concurrency, queue, queue_timeout, threads, retry_after):
+        self.name = name
+        self.concurrency = concurrency
+        self.queue = queue
+        self.queue_timeout = queue_timeout
+        self.threads = threads
+        self.retry_after = retry_after
+        self.running = 0
+        self.waiting = 0
+        self.stats = {"admitted": 0, "queued": 0, "shed": 0, "timed_out": 0}
+        self._slots = threading.Condition()
+
+    @classmethod
+    def from_environ(cls, name):
+        settings = {setting: _lane_setting(name, setting, default) for setting, default in LANE_DEFAULTS[name].items()}
+        return cls(name, settings["CONCURRENCY"], settings["QUEUE"], settings["QUEUE_TIMEOUT"], settings["THREADS"],
+                   settings["RETRY_AFTER"])
+
+    def acquire(self):
+        """Take a running slot, waiting in the queue if there is room; raises LaneSaturated otherwise"""
+        with self._slots:
+            if self.running >= self.concurrency:
+                if self.waiting >= self.queue:
+                    self.stats["shed"] += 1
+                    raise LaneSaturated(self)
+                self.waiting += 1
+                self.stats["queued"] += 1
+                deadline = time.monotonic() + self.queue_timeout
+                try:
+                    while self.running >= self.concurrency:
+                        remaining = deadline - time.monotonic()
+                        if remaining <= 0:
+                            self.stats["timed_out"] += 1
+                            raise LaneSaturated(self)
+                        self._slots.wait(remaining)
+                finally:
+                    self.waiting -= 1
+            self.running += 1
+            self.stats["admitted"] += 1
+
+    def release(self):
+        with self._slots:
+            self.running -= 1
+            self._slots.notify()
+
+    def report(self):
+        return {
+            "concurrency": self.concurrency,
+            "queue": self.queue,
+            "threads": self.threads,
+            "running": self.running,
+            "waiting": self.waiting,
+            "requests": dict(self.stats)
+        }
+
+class AdmissionController:
+    """The lanes, and which one each request path belongs to"""
+
+    def __init__(self, lanes=None):
+        self.lanes = lanes or {name: Lane.from_environ(name) for name in LANE_DEFAULTS}
+
+    def __getitem__(self, name):
+        return self.lanes[name]
+
+    def lane_for(self, path):
+        """Lane of an /api/ path, or None for paths that are not admission-controlled"""
+        if not path.startswith('/api/'):
+            return None
+        route = path[len('/api/'):].rstrip('/')
+        if route in UNLIMITED_ROUTES:
+            return None
+        return self.lanes[ROUTE_LANES.get(route, 'interactive')]
+
+    def report(self):
+        return {name: lane.report() for name, lane in self.lanes.items()}
+
+class AdmissionMiddleware:
+    """WSGI middleware that runs each API request in its lane, or sheds it with 429 and Retry-After"""
+
+    def __init__(self, app, controller):
+        self.app = app
+        self.controller = controller
+
+    def __call__(self, environ, start_response):
+        lane = self.controller.lane_for(environ.get('PATH_INFO', ''))
+        if lane is None or environ.get('REQUEST_METHOD') == 'OPTIONS':
+            return self.app(environ, start_response)
+        try:
+            lane.acquire()
+        except LaneSaturated:
+            body = json.dumps({"error": f"Server is busy with {lane.name} work, please retry"}).encode('utf-8')
+            start_response('429 Too Many Requests', [('Content-Type', 'application/json'),
+                                                     ('Content-Length', str(len(body))),
+                                                     ('Retry-After', str(lane.retry_after)),
+                                                     ('Access-Control-Allow-Origin', '*')])
+            return [body]
+        try:
+            # The slot is held until the whole body is produced
+            with limit_threads(lane.threads):
+                iterable = self.app(environ, start_response)
+                try:
+                    return list(iterable)
+                finally:
+                    if hasattr(iterable, 'close'):
+                        iterable.close()
+        finally:
+            lane.release()
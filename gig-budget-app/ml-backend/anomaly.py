@@ -0,0 +1,220 @@
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+from appends import AppendDetector, entry_rows
+from features import entry_columns
+from ledger import LedgerEntries
+
+# Each expense moves its category's running mean and variance by this share
+EWMA_ALPHA = 0.1
+
+# Expenses this many standard deviations above their category's running mean are flagged
+ANOMALY_Z_THRESHOLD = 3.0
+
+# A category needs this many earlier expenses before its expenses are scored
+MIN_HISTORY = 5
+
+# Deviations are measured against at least this share of the running mean (and
+# at least one rupee), so a category with near-constant amounts such as rent
+# does not flag small changes
+MIN_STD_FRACTION = 0.1
+
+# Batches are applied in passes of at most this many entries per category,
+# which keeps the exponential weights of one pass well inside float64 range
+MAX_PASS_RANK = 256
+
+# Maximum number of users whose statistics are kept in memory
+ANOMALY_CACHE_SIZE = 1024
+
+def _z_scores(amounts, means, seconds, counts):
+    """Standardized deviation of amounts from the running statistics; NaN without enough history"""
+    std = np.sqrt(np.maximum(seconds - means * means, 0.0))
+    std = np.maximum(std, np.maximum(MIN_STD_FRACTION * np.abs(means), 1.0))
+    return np.where(counts >= MIN_HISTORY, (amounts - means) / std, np.nan)
+
+class AnomalyState:
+    """EWMA mean and variance of one user's expense amounts per category
+
+    Memory is three numbers per category, however many expenses have been
+    seen. Every expense is scored against the statistics of the expenses
+    before it, then folded into them.
+    """
+
+    def __init__(self, alpha=EWMA_ALPHA):
+        self.alpha = alpha
+        self.slots = {}  # category -> index in the arrays below
+        self.means = np.empty(0)
+        self.seconds = np.empty(0)  # EWMA of squared amounts
+        self.counts = np.empty(0, dtype=np.int64)
+
+        # The caller's entry list as of the last sync, used to detect appends
+        self.source = AppendDetector()
+
+    def _slot(self, category):
+        slot = self.slots.get(category)
+        if slot is None:
+            slot = self.slots[category] = len(self.slots)
+            self.means = np.append(self.means, 0.0)
+            self.seconds = np.append(self.seconds, 0.0)
+            self.counts = np.append(self.counts, 0)
+        return slot
+
+    def score(self, category, amount):
+        """(z-score, expected amount) of one new expense, then apply it; O(1)"""
+        slot = self._slot(category)
+        if self.counts[slot] == 0:
+            self.means[slot], self.seconds[slot] = amount, amount * amount
+        mean = self.means[slot]
+        z = float(_z_scores(amount, mean, self.seconds[slot], self.counts[slot]))
+
+        self.means[slot] += self.alpha * (amount - mean)
+        self.seconds[slot] += self.alpha * (amount * amount - self.seconds[slot])
+        self.counts[slot] += 1
+        return z, float(mean)
+
+    def score_batch(self, categories, amounts):
+        """(z-scores, expected amounts) of expenses in date order, then apply them
+
+        Equivalent to calling score() on each expense in turn, computed for
+        all categories at once: within a category, the EWMA after j expenses
+        is (1 - alpha)^j * (m0 + alpha * sum_i (1 - alpha)^-i * x_i), so the
+        statistics in front of every expense come from a cumsum per category.
+        """
+        amounts = np.asarray(amounts, dtype=np.float64)
+        slots = np.fromiter((self._slot(category) for category in categories), dtype=np.int64, count=len(amounts))
+        scores = np.full(len(amounts), np.nan)
+        expected = np.full(len(amounts), np.nan)
+        if not len(amounts):
+            return scores, expected
+
+        # Position of each expense among the batch's expenses of its category
+        order = np.argsort(slots, kind='stable')
+        sorted_slots = slots[order]
+        starts = np.flatnonzero(np.r_[True, sorted_slots[1:] != sorted_slots[:-1]])
+        ranks = np.empty(len(amounts), dtype=np.int64)
+        ranks[order] = np.arange(len(order)) - np.repeat(starts, np.diff(np.r_[starts, len(order)]))
+
+        by_rank = np.argsort(ranks, kind='stable')
+        passes = range(0, int(ranks.max()) + 1, MAX_PASS_RANK)
+        bounds = np.searchsorted(ranks[by_rank], [*passes, len(amounts)])
+        for first, start, end in zip(passes, bounds[:-1], bounds[1:]):
+            rows = by_rank[start:end]
+            scores[rows], expected[rows] = self._apply(slots[rows], amounts[rows], ranks[rows] - first)
+        return scores, expected
+
+    def _apply(self, slots, amounts, ranks):
+        """score_batch for one pass: ranks are 0..MAX_PASS_RANK-1 within each category, in date order"""
+        # Categories seen for the first time start at their first amount
+        first = ranks == 0
+        new = first & (self.counts[slots] == 0)
+        self.means[slots[new]] = amounts[new]
+        self.seconds[slots[new]] = amounts[new] ** 2
+
+        # Grouped cumulative sums of the weighted amounts, excluding each expense itself
+        order = np.lexsort((ranks, slots))
+        decay = 1.0 - self.alpha
+        growth = decay ** -(ranks[order] + 1.0)
+        sorted_slots = slots[order]
+        starts = np.flatnonzero(np.r_[True, sorted_slots[1:] != sorted_slots[:-1]])
+        lengths = np.diff(np.r_[starts, len(order)])
+
+        def exclusive_cumsum(values):
+            # One cumsum per category, so a category's sums never carry the (much larger) totals of others
+            weighted = growth * values[order]
+            sums = np.zeros(len(weighted))
+            for start, length in zip(starts, lengths):
+                np.cumsum(weighted[start:start + length - 1], out=sums[start + 1:start + length])
+            return sums
+
+        sorted_amounts = amounts[order]
+        shrink = decay ** ranks[order].astype(np.float64)
+        means = shrink * (self.means[sorted_slots] + self.alpha * exclusive_cumsum(amounts))
+        seconds = shrink * (self.seconds[sorted_slots] + self.alpha * exclusive_cumsum(amounts * amounts))
+        counts = self.counts[sorted_slots] + ranks[order]
+        scores = _z_scores(sorted_amounts, means, seconds, counts)
+
+        # Fold each category's last expense of the pass into its statistics
+        last = starts + lengths - 1
+        last_slots = sorted_slots[last]
+        self.means[last_slots] = means[last] + self.alpha * (sorted_amounts[last] - means[last])
+        self.seconds[last_slots] = seconds[last] + self.alpha * (sorted_amounts[last] ** 2 - seconds[last])
+        self.counts[last_slots] += lengths
+
+        unsorted_scores = np.empty(len(order))
+        unsorted_expected = np.empty(len(order))
+        unsorted_scores[order] = scores
+        unsorted_expected[order] = means
+        return unsorted_scores, unsorted_expected
+
+    @property
+    def nbytes(self):
+        arrays = (self.means, self.seconds, self.counts)
+        return sum(array.nbytes for array in arrays) + sum(len(str(category)) + 49 for category in self.slots) + 400
+
+    def summary(self):
+        """{category: {"mean", "std", "count"}} of the running statistics"""
+        std = np.sqrt(np.maximum(self.seconds - self.means ** 2, 0.0))
+        return {category: {"mean": round(float(self.means[slot]), 2), "std": round(float(std[slot]), 2),
+                           "count": int(self.counts[slot])}
+                for category, slot in self.slots.items()}
+
+def _categories(entries):
+    if isinstance(entries, LedgerEntries):
+        return entries.ledger.texts('category')
+    return [item.get('category') for item in entries]
+
+class AnomalyCache:
+    """Bounded LRU of per-user anomaly state that only scores entries appended since the last call"""
+
+    def __init__(self, max_users=ANOMALY_CACHE_SIZE, alpha=EWMA_ALPHA):
+        self.max_users = max_users
+        self.alpha = alpha
+        self._states = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._states)
+
+    @property
+    def nbytes(self):
+        return sum(state.nbytes for state in list(self._states.values()))
+
+    def shrink(self, max_bytes):
+        """Drop least recently used users until at most max_bytes remain"""
+        with self._lock:
+            total = sum(state.nbytes for state in self._states.values())
+            while self._states and total > max_bytes:
+                _, evicted = self._states.popitem(last=False)
+                total -= evicted.nbytes
+
+    def sync(self, user_key, expense_data, rescore=False):
+        """(state, positions of newly scored entries, their z-scores, their expected amounts)
+
+        When expense_data extends the list seen last time, only the appended
+        entries are scored; otherwise every entry is scored from scratch in
+        date order.
+        """
+        categories = _categories(expense_data)
+        days, amounts = entry_columns(expense_data)
+        rows = entry_rows(days, amounts, np.fromiter(map(hash, categories), dtype=np.int64, count=len(categories)))
+        with self._lock:
+            state = self._states.get(user_key) if user_key is not None else None
+            seen = state.source.update(rows) if state is not None else 0
+            if seen and not rescore:
+                positions = np.arange(seen, len(expense_data))
+                self._states.move_to_end(user_key)
+            else:
+                # First call, rescore, or an earlier entry was edited or removed
+                state = AnomalyState(self.alpha)
+                state.source.update(rows)
+                positions = np.argsort(days, kind='stable')
+                if user_key is not None:
+                    self._states[user_key] = state
+                    if len(self._states) > self.max_users:
+                        self._states.popitem(last=False)
+
+            scores, expected = state.score_batch([categories[position] for position in positions],
+                                                 amounts[positions])
+            return state, positions, scores, expected
@@ -1,39 +1,81 @@
-from flask import Flask, request, jsonify
+from flask import Flask, request, jsonify, redirect
 from flask_cors import CORS
-import pandas as pd
 import numpy as np
-from sklearn.ensemble import RandomForestRegressor, GradientBoostingRegressor
+from sklearn.ensemble import GradientBoostingRegressor
 from sklearn.cluster import KMeans
 from sklearn.preprocessing import StandardScaler
-import joblib
 import os
 import json
-from datetime import datetime, timedelta
 import random
 import glob
+import calendar
+import functools
+import hashlib
+import multiprocessing
+import time
+from concurrent.futures import ProcessPoolExecutor
+from model_store import ModelRegistry, publish_model, MODELS_DIR
+import tax_engine
+import savings_simulation
+from scenarios import ScenarioBaseline, ScenarioError
+from seasonality import TrackerCache, LOW_INCOME_THRESHOLD
+from anomaly import AnomalyCache, ANOMALY_Z_THRESHOLD
+from rollups import get_rollups, content_hash, rollup_cache
+from datasets import DatasetStore, VersionConflict
+from categorizer import fill_missing_categories, MAX_CATEGORIZE_ENTRIES
+from results_store import ResultStore, PRECOMPUTED_REQUEST_FIELDS
+from compression import CompressionMiddleware
+from features import calendar_features, entry_columns
+from forecast_router import ForecastRouter, main_category, candidate_models, CATEGORY_MODEL_PREFIX
+from admission import AdmissionController, AdmissionMiddleware, limit_threads
+from cluster import Cluster, FORWARDED_HEADER
+from memory import MemoryAccountant, RouteMemoryProfiler, MemoryMiddleware, pickled_size
+from sketches import (user_metrics, expense_metric, category_cohort, personality_cohort, cohort_label, ordinal,
+                      ALL_USERS, MIN_COHORT_USERS)
 
 app = Flask(__name__)
 CORS(app)  # Enable CORS for all routes
+app.wsgi_app = CompressionMiddleware(app.wsgi_app)  # gzip/zstd/br request bodies and responses
 
 # Load sample data or pre-trained models if available
 # For demo purposes, we'll generate synthetic data
 
 def load_or_generate_models():
     """Load pre-trained models or generate new ones with sample data"""
-    models = {}
+    models = ModelRegistry(MODELS_DIR)
     
     # Check if models exist
-    if os.path.exists('models/income_forecaster.joblib'):
-        models['income_forecaster'] = joblib.load('models/income_forecaster.joblib')
-        models['expense_analyzer'] = joblib.load('models/expense_analyzer.joblib')
+    if models.load('income_forecaster') is not None:
+        models.load('expense_analyzer')
+        models.load('income_forecaster_multi_tenant')
+        models.load('cohort_sketches')
+        models.load('expense_categorizer')
         print("Loaded pre-trained models")
     else:
-        print("No pre-trained models found. Will train on request.")
+        print("No pre-trained models found. Serving fallback forecasts until models are trained.")
     
     return models
 
-# Initialize models
+# How long a request waits for a stored model to be loaded before it is
+# answered with the next model down instead
+MODEL_BUILD_TIMEOUT = float(os.environ.get('MODEL_BUILD_TIMEOUT', '5'))
+
+# Seasonality state per user for /api/low-income-preparation
+seasonality_trackers = TrackerCache()
+
+# Running expense statistics per user and category for /api/expense-anomalies
+anomaly_states = AnomalyCache()
+
+# Uploaded ledgers that analysis requests can refer to by datasetId
+dataset_store = DatasetStore()
+
+# Results precomputed by batch_score.py, served when PRECOMPUTED_RESULTS names their store
+PRECOMPUTED_RESULTS = os.environ.get('PRECOMPUTED_RESULTS')
+precomputed_results = ResultStore(PRECOMPUTED_RESULTS) if PRECOMPUTED_RESULTS else None
+
+# Initialize models and pick up newly published versions without a restart
 models = load_or_generate_models()
+models.start_watching(float(os.environ.get('MODEL_WATCH_INTERVAL', '5')))
 
 # Helper function to load category-specific test data
 def load_category_test_data(category):
@@ -88,92 +130,269 @@ def get_test_data():
     return jsonify(data)
 
 # Helper functions for data processing
-def preprocess_financial_data(data):
-    """Convert incoming JSON data to pandas DataFrame and preprocess"""
-    df = pd.DataFrame(data)
-    
-    # Handle dates
-    if 'date' in df.columns:
-        df['date'] = pd.to_datetime(df['date'])
-        df['day_of_week'] = df['date'].dt.dayofweek
-        df['day_of_month'] = df['date'].dt.day
-        df['month'] = df['date'].dt.month
-    
-    return df
-
 def train_income_forecast_model(data):
     """Train a model to forecast future income based on historical data"""
-    df = preprocess_financial_data(data)
+    days, target = entry_columns(data)
     
     # Basic features
-    features = df[['day_of_week', 'day_of_month', 'month']].values
-    target = df['amount'].values
+    features = calendar_features(days)
     
     # Train model
     model = GradientBoostingRegressor(n_estimators=100, random_state=42)
     model.fit(features, target)
     
-    # Save model
-    os.makedirs('models', exist_ok=True)
-    joblib.dump(model, 'models/income_forecaster.joblib')
-    
     return model
 
 def train_expense_analyzer(data):
     """Train a model to analyze expense patterns and identify areas for reduction"""
-    df = preprocess_financial_data(data)
+    _, amounts = entry_columns(data)
     
     # We'll use a simple clustering approach for expense categories
-    if len(df) > 5:  # Need some minimum amount of data
+    if len(amounts) > 5:  # Need some minimum amount of data
         scaler = StandardScaler()
         # Assume we have amount and category information
-        X = scaler.fit_transform(df[['amount']].values)
+        X = scaler.fit_transform(amounts.reshape(-1, 1))
         
         # Create clusters of expenses
-        model = KMeans(n_clusters=min(3, len(df)), random_state=42)
+        model = KMeans(n_clusters=min(3, len(amounts)), random_state=42)
         model.fit(X)
         
         # Save model
-        os.makedirs('models', exist_ok=True)
-        joblib.dump(model, 'models/expense_analyzer.joblib')
+        publish_model('expense_analyzer', model)
         return model
     return None
 
-@app.route('/api/forecast-income', methods=['POST'])
-def forecast_income():
-    """Endpoint to forecast income for upcoming months"""
-    data = request.json
+class WeekdayMeanForecaster:
+    """Average income per weekday; a cheap stand-in while the real forecaster is built"""
+    
+    def __init__(self, income_data):
+        days, amounts = entry_columns(income_data)
+        weekdays = calendar_features(days)[:, 0]
+        counts = np.bincount(weekdays, minlength=7)
+        self.overall_mean = float(amounts.mean())
+        self.weekday_means = np.where(counts > 0, np.bincount(weekdays, weights=amounts, minlength=7) / np.maximum(counts, 1),
+                                      self.overall_mean)
+    
+    def predict(self, features):
+        return self.weekday_means[np.asarray(features)[:, 0].astype(np.int64)]
+
+# Interactive, batch and training work run in separate lanes, each with its
+# own concurrency limit, wait queue and thread budget (see admission.py)
+admission = AdmissionController()
+
+def fit_user_forecaster(income_data):
+    """Background per-user model fit, under the batch lane's thread budget"""
+    with limit_threads(admission['batch'].threads):
+        return train_income_forecast_model(income_data)
+
+# Ids of users with a data file are rescanned at most this often (seconds)
+KNOWN_USERS_INTERVAL = 60
+_known_users = (0.0, frozenset())  # (monotonic time of the scan, user ids)
+
+def known_user(user_id):
+    """Whether user_id has a data file; only those users get a model of their own"""
+    global _known_users
+    scanned_at, user_ids = _known_users
+    now = time.monotonic()
+    if now - scanned_at > KNOWN_USERS_INTERVAL:
+        user_ids = frozenset(os.path.basename(path)[len("user_"):-len("_data.json")]
+                             for path in glob.glob("data/user_*_data.json"))
+        _known_users = (now, user_ids)
+    return str(user_id) in user_ids
+
+# Picks the user, category or global income model per request; per-user
+# models are fitted in the background, never inside a request
+forecast_router = ForecastRouter(models, fit=fit_user_forecaster, fallback=WeekdayMeanForecaster,
+                                 load_timeout=MODEL_BUILD_TIMEOUT, is_known=known_user)
+
+# Models that can be dropped under memory pressure; they are reloaded from the store on demand
+RELOADABLE_MODEL_PREFIXES = ('income_forecaster_user_', 'expense_analyzer_user_', CATEGORY_MODEL_PREFIX)
+_model_sizes = {}  # (name, version) -> pickled bytes, computed once per loaded version
+
+def model_memory(reloadable=None):
+    """{name: approximate bytes} of loaded models, optionally only the (non-)reloadable ones"""
+    global _model_sizes
+    loaded = models.loaded()
+    # Forget versions that are no longer loaded, whichever models were asked for
+    _model_sizes = {key: size for key, size in list(_model_sizes.items()) if loaded.get(key[0]) == key[1]}
+    sizes = {}
+    for name, version in loaded.items():
+        if reloadable is not None and name.startswith(RELOADABLE_MODEL_PREFIXES) != reloadable:
+            continue
+        key = (name, version)
+        if key not in _model_sizes:
+            model = models.get(name)
+            _model_sizes[key] = pickled_size(model) if model is not None else 0
+        sizes[name] = _model_sizes[key]
+    return sizes
+
+def unload_models(max_bytes):
+    """Unload reloadable models, largest first, until they take at most max_bytes"""
+    sizes = model_memory(reloadable=True)
+    total = sum(sizes.values())
+    for name in sorted(sizes, key=sizes.get, reverse=True):
+        if total <= max_bytes:
+            break
+        if models.unload(name):
+            total -= sizes[name]
+
+# Memory accounting for /api/memory; caches are listed cheapest-to-rebuild first
+memory_accountant = MemoryAccountant()
+memory_accountant.register('rollups', lambda: rollup_cache().nbytes, rollup_cache().shrink, priority=0,
+                           items=lambda: len(rollup_cache()))
+memory_accountant.register('datasets', lambda: dataset_store.nbytes, dataset_store.shrink, priority=1,
+                           items=lambda: dataset_store.cached_count)
+memory_accountant.register('user_models', lambda: sum(model_memory(reloadable=True).values()), unload_models,
+                           priority=2, items=lambda: len(model_memory(reloadable=True)))
+memory_accountant.register('seasonality_trackers', lambda: seasonality_trackers.nbytes, seasonality_trackers.shrink,
+                           priority=3, items=lambda: len(seasonality_trackers))
+memory_accountant.register('anomaly_states', lambda: anomaly_states.nbytes, anomaly_states.shrink, priority=4,
+                           items=lambda: len(anomaly_states))
+memory_accountant.register('shared_models', lambda: sum(model_memory(reloadable=False).values()),
+                           items=lambda: len(model_memory(reloadable=False)))
+memory_profiler = RouteMemoryProfiler()
+app.wsgi_app = MemoryMiddleware(app.wsgi_app, memory_accountant, memory_profiler)
+app.wsgi_app = AdmissionMiddleware(app.wsgi_app, admission)  # Sheds saturated lanes before any other work
+
+# Multi-node mode: each user's requests are served by the node that owns them
+# on the hash ring, so their models and cached state live on one node only
+cluster = Cluster.from_environ()
+
+# Routes that are not about one user, and are served by whichever node gets them
+UNROUTED_ROUTES = {'tax-batch'}
+
+def affinity_key(data):
+    """User a request belongs to (or its dataset, when only a datasetId is sent), or None"""
+    if not isinstance(data, dict):
+        return None
+    user_id = data.get('userId')
+    income_data = data.get('incomeData')
+    if user_id is None and isinstance(income_data, list) and income_data and isinstance(income_data[0], dict):
+        user_id = income_data[0].get('user_id')
+    return user_id if user_id is not None else data.get('datasetId')
+
+@app.before_request
+def route_to_owner():
+    """Forward or redirect a user's request to the node that owns the user"""
+    if cluster is None or request.method != 'POST' or FORWARDED_HEADER in request.headers:
+        return None
+    route = request.path[len('/api/'):]
+    if not request.path.startswith('/api/') or route not in ROUTE_HANDLERS or route in UNROUTED_ROUTES:
+        return None
+    
+    key = affinity_key(request.get_json(silent=True))
+    owner = cluster.owner(key) if key is not None else cluster.self_node
+    if owner == cluster.self_node:
+        cluster.served_locally()
+        return None
+    
+    path = request.full_path.rstrip('?')
+    if cluster.mode == 'redirect':
+        cluster.redirected()
+        return redirect(owner + path, code=307)  # 307 keeps the method and body
+    
+    forwarded = cluster.forward(owner, request.method, path, request.get_data(), request.headers.items())
+    if forwarded is None:
+        cluster.served_locally()  # The owner is unreachable; the shared directories let any node answer
+        return None
+    status, headers, body = forwarded
+    return app.response_class(body, status=status, headers=headers)
+
+def state_key(data, entries):
+    """Key of the incremental seasonality/anomaly state of a request: its dataset's, else its user's"""
+    return data.get('stateKey') or data.get('userId', entries[0].get('user_id'))
+
+def with_dataset(handler):
+    """Let an analysis handler take {"datasetId": ...} in place of the full income/expense payload"""
+    @functools.wraps(handler)
+    def resolved(data):
+        data = data or {}
+        dataset_id = data.get('datasetId')
+        if dataset_id is None:
+            return handler(data)
+        
+        dataset = dataset_store.get(dataset_id)
+        if dataset is None:
+            return {"error": f"Unknown dataset: {dataset_id}"}, 404
+        return handler({**data, **dataset.payload()})
+    return resolved
+
+# Models the precomputed routes read besides the forecaster ForecastRouter picks
+PRECOMPUTED_ROUTE_MODELS = {
+    'analyze-expenses': ('expense_categorizer', 'cohort_sketches')
+}
+
+def precomputed_version(route, user_id, income_data, expense_data):
+    """Version a route's result is stored under: the data version plus the published versions of its models
+    
+    Publishing a new version of any model the route reads (by /api/train-models
+    or a background fit) changes it, so results of older models are not served.
+    """
+    names = list(PRECOMPUTED_ROUTE_MODELS.get(route, ()))
+    if route == 'forecast-income':
+        names += candidate_models(user_id, income_data)
+    published = models.published()
+    model_versions = ','.join(f'{name}@{published.get(name, {}).get("version")}' for name in names).encode('utf-8')
+    return f'{content_hash(income_data, expense_data)}:{hashlib.blake2b(model_versions, digest_size=8).hexdigest()}'
+
+def with_precomputed(route):
+    """Answer from the precomputed results when they were computed from exactly this user's data and models
+    
+    Falls back to the live handler when there is no store, the request has
+    options beyond the ledgers, or the stored version differs.
+    """
+    def decorator(handler):
+        @functools.wraps(handler)
+        def resolved(data):
+            data = data or {}
+            if precomputed_results is not None and data.keys() <= PRECOMPUTED_REQUEST_FIELDS:
+                income_data = data.get('incomeData', [])
+                expense_data = data.get('expenseData', [])
+                user_id = data.get('userId', income_data[0].get('user_id') if len(income_data) else None)
+                if user_id is not None:
+                    payload = precomputed_results.get(user_id, route,
+                                                      precomputed_version(route, user_id, income_data, expense_data))
+                    if payload is not None:
+                        return payload, 200
+            return handler(data)
+        return resolved
+    return decorator
+
+@with_dataset
+@with_precomputed('forecast-income')
+def forecast_income_result(data):
+    """Forecast income for upcoming months; returns (payload, status)"""
     income_data = data.get('incomeData', [])
     
     if not income_data:
-        return jsonify({"error": "No income data provided"}), 400
+        return {"error": "No income data provided"}, 400
     
-    # Train or load model
-    if 'income_forecaster' not in models:
-        models['income_forecaster'] = train_income_forecast_model(income_data)
+    # Best model that already exists for this user
+    user_id = data.get('userId', income_data[0].get('user_id'))
+    forecaster, tier, model_name = forecast_router.route(user_id, income_data, data.get('category'))
     
     # Generate forecast for next 3 months
     forecast_months = 3
-    last_date = max([datetime.strptime(entry['date'], '%Y-%m-%d') for entry in income_data])
+    rollups = get_rollups(income_data, data.get('expenseData', []))
+    
+    forecast_dates = np.datetime64(rollups.income.last_date) + np.arange(1, forecast_months * 30 + 1)
+    features = calendar_features(forecast_dates)
     
+    # One prediction call for the whole horizon
     forecasts = []
-    for i in range(1, forecast_months * 30 + 1):
-        forecast_date = last_date + timedelta(days=i)
-        features = [[forecast_date.weekday(), forecast_date.day, forecast_date.month]]
+    try:
+        predicted_amounts = forecaster.predict(features)
         
-        # Make prediction
-        try:
-            predicted_amount = models['income_forecaster'].predict(features)[0]
-            
-            # Only include if it's a work day (simplified)
-            if forecast_date.weekday() < 5 and random.random() > 0.7:  # 30% chance of income on weekdays
+        # Only include work days (simplified); 30% chance of income on weekdays
+        for forecast_date, weekday, predicted_amount in zip(forecast_dates.tolist(), features[:, 0], predicted_amounts):
+            if weekday < 5 and random.random() > 0.7:
                 forecasts.append({
                     'date': forecast_date.strftime('%Y-%m-%d'),
                     'amount': round(max(0, predicted_amount), 2),
                     'source': 'Predicted Income'
                 })
-        except Exception as e:
-            print(f"Prediction error: {e}")
+    except Exception as e:
+        print(f"Prediction error: {e}")
     
     # Aggregate by month for summary
     monthly_forecast = {}
@@ -186,45 +405,55 @@ def forecast_income():
     # Format for response
     formatted_forecast = [{"month": k, "predicted_amount": round(v, 2)} for k, v in monthly_forecast.items()]
     
-    return jsonify({
+    return {
         "forecast": {
             "daily": forecasts,
             "monthly": formatted_forecast
-        }
-    })
+        },
+        "model": {"tier": tier, "name": model_name}
+    }, 200
 
-@app.route('/api/analyze-expenses', methods=['POST'])
-def analyze_expenses():
-    """Endpoint to analyze expenses and provide reduction recommendations"""
-    data = request.json
+@app.route('/api/forecast-income', methods=['POST'])
+def forecast_income():
+    """Endpoint to forecast income for upcoming months"""
+    payload, status = forecast_income_result(request.json)
+    return jsonify(payload), status
+
+@with_dataset
+@with_precomputed('analyze-expenses')
+def analyze_expenses_result(data):
+    """Analyze expenses and provide reduction recommendations; returns (payload, status)"""
     expense_data = data.get('expenseData', [])
     
     if not expense_data:
-        return jsonify({"error": "No expense data provided"}), 400
+        return {"error": "No expense data provided"}, 400
     
-    # Group expenses by category
-    expense_by_category = {}
-    for expense in expense_data:
-        category = expense.get('category', 'Uncategorized')
-        if category not in expense_by_category:
-            expense_by_category[category] = []
-        expense_by_category[category].append(expense)
+    # Expenses without a category are filed under the categorizer's prediction when it is confident
+    auto_categorized = 0
+    categorizer = models.get('expense_categorizer')
+    if categorizer is not None:
+        expense_data, auto_categorized = fill_missing_categories(categorizer, expense_data)
     
-    # Calculate metrics by category
+    # Calculate metrics by category from the dataset's cached rollups
+    rollups = get_rollups(data.get('incomeData', []), expense_data)
     category_metrics = {}
-    for category, expenses in expense_by_category.items():
-        total = sum(expense['amount'] for expense in expenses)
-        avg = total / len(expenses)
+    for category, (total, count) in rollups.expense.by_category().items():
         category_metrics[category] = {
             'total': round(total, 2),
-            'average': round(avg, 2),
-            'count': len(expenses)
+            'average': round(total / count, 2),
+            'count': count
         }
     
     # Identify top spending categories
     sorted_categories = sorted(category_metrics.items(), key=lambda x: x[1]['total'], reverse=True)
     top_categories = sorted_categories[:3]
     
+    # Where the user's monthly spending sits among their peers
+    sketches = models.get('cohort_sketches')
+    peers = {}
+    if sketches is not None:
+        peers = sketches.compare(user_metrics(data.get('incomeData', []), expense_data), peer_cohorts(data))
+    
     # Generate recommendations
     recommendations = []
     for category, metrics in top_categories:
@@ -240,27 +469,163 @@ def analyze_expenses():
                 'potential_savings': potential_savings,
                 'details': f"You spent ₹{metrics['total']} on {category} recently. Cutting this by {reduction_percent}% would save ₹{potential_savings}."
             })
+            
+            peer = peers.get(expense_metric(category))
+            if peer:
+                recommendations[-1]['peer_percentile'] = peer['percentile']
+                recommendations[-1]['details'] += f" You are in the {ordinal(peer['percentile'])} percentile for {category} among {cohort_label(peer['cohort'])}."
     
-    return jsonify({
+    return {
         "analysis": {
             "by_category": category_metrics,
-            "recommendations": recommendations
+            "recommendations": recommendations,
+            "auto_categorized": auto_categorized
         }
-    })
+    }, 200
 
-@app.route('/api/savings-plan', methods=['POST'])
-def savings_plan():
-    """Generate a personalized savings plan based on income and expenses"""
-    data = request.json
+@app.route('/api/analyze-expenses', methods=['POST'])
+def analyze_expenses():
+    """Endpoint to analyze expenses and provide reduction recommendations"""
+    payload, status = analyze_expenses_result(request.json)
+    return jsonify(payload), status
+
+@with_dataset
+def categorize_expenses_result(data):
+    """Predict the category of every posted expense from its title and description; returns (payload, status)"""
+    expense_data = data.get('expenseData', [])
+    
+    if not expense_data:
+        return {"error": "No expense data provided"}, 400
+    if len(expense_data) > MAX_CATEGORIZE_ENTRIES:
+        return {"error": f"At most {MAX_CATEGORIZE_ENTRIES} expenses can be categorized per request"}, 400
+    
+    categorizer = models.get('expense_categorizer')
+    if categorizer is None:
+        return {"error": "The expense categorizer has not been trained yet"}, 503
+    
+    # Columns in request order; low-confidence expenses are 'Uncategorized'
+    categories, confidence = categorizer.categorize(expense_data)
+    return {
+        "categories": categories,
+        "confidence": np.round(confidence.astype(np.float64), 3).tolist()
+    }, 200
+
+@app.route('/api/categorize-expenses', methods=['POST'])
+def categorize_expenses():
+    """Endpoint to categorize expenses that arrived without a category"""
+    payload, status = categorize_expenses_result(request.json)
+    return jsonify(payload), status
+
+@with_dataset
+def expense_anomalies_result(data):
+    """Flag expenses far above the user's running average for their category; returns (payload, status)
+    
+    Only expenses appended since the user's previous call are scored (all of
+    them on the first call, or with "rescore": true), so posting the growing
+    ledger after every new expense alerts on each expense once.
+    """
+    expense_data = data.get('expenseData', [])
+    
+    if not expense_data:
+        return {"error": "No expense data provided"}, 400
+    
+    try:
+        threshold = float(data.get('threshold', ANOMALY_Z_THRESHOLD))
+    except (TypeError, ValueError):
+        return {"error": "threshold must be a number"}, 400
+    state, positions, scores, expected = anomaly_states.sync(
+        state_key(data, expense_data), expense_data, rescore=bool(data.get('rescore')))
+    
+    anomalies = []
+    for index in np.flatnonzero(scores >= threshold):
+        anomalies.append({
+            **expense_data[int(positions[index])],
+            'anomaly_score': round(float(scores[index]), 2),
+            'expected_amount': round(float(expected[index]), 2)
+        })
+    
+    return {
+        "anomalies": anomalies,
+        "scored": len(positions),
+        "threshold": threshold,
+        "categories": state.summary()
+    }, 200
+
+@app.route('/api/expense-anomalies', methods=['POST'])
+def expense_anomalies():
+    """Endpoint to flag unusual expenses as they are added"""
+    payload, status = expense_anomalies_result(request.json)
+    return jsonify(payload), status
+
+def peer_cohorts(data):
+    """Cohorts of the requesting user, most specific first"""
+    cohorts = []
+    category = data.get('category') or main_category(data.get('incomeData', []))
+    if category:
+        cohorts.append(category_cohort(category))
+    if data.get('personality'):
+        cohorts.append(personality_cohort(data['personality']))
+    return cohorts
+
+@with_dataset
+def peer_comparison_result(data):
+    """Percentiles of a user's monthly income and spending among peers; returns (payload, status)
+    
+    Either posts the user's incomeData/expenseData (plus optional category and
+    personality), or asks for one {"cohort", "metric", "value"} directly.
+    """
+    sketches = models.get('cohort_sketches')
+    if sketches is None:
+        return {"error": "Peer benchmarks are not available; run train_models.py"}, 503
+    
+    if 'metric' in data:
+        try:
+            value = float(data.get('value', 0))
+        except (TypeError, ValueError):
+            return {"error": "value must be a number"}, 400
+        cohort = data.get('cohort', ALL_USERS)
+        if sketches.get(cohort, data['metric']) is None:
+            return {"error": f"Unknown cohort or metric: {cohort} {data['metric']}"}, 404
+        return {
+            "cohort": cohort,
+            "metric": data['metric'],
+            "value": data.get('value', 0),
+            "percentile": sketches.percentile(cohort, data['metric'], value),
+            "cohort_users": sketches.cohort_size(cohort)
+        }, 200
+    
+    income_data = data.get('incomeData', [])
+    expense_data = data.get('expenseData', [])
+    if not income_data and not expense_data:
+        return {"error": "Provide incomeData/expenseData, or a cohort, metric and value"}, 400
+    
+    cohorts = peer_cohorts(data)
+    return {
+        "cohorts": [{"cohort": cohort, "users": sketches.cohort_size(cohort)} for cohort in [*cohorts, ALL_USERS]],
+        "min_cohort_users": MIN_COHORT_USERS,
+        "comparison": sketches.compare(user_metrics(income_data, expense_data), cohorts)
+    }, 200
+
+@app.route('/api/peer-comparison', methods=['POST'])
+def peer_comparison():
+    """Endpoint to compare a user's monthly income and spending with their peers"""
+    payload, status = peer_comparison_result(request.json)
+    return jsonify(payload), status
+
+@with_dataset
+@with_precomputed('savings-plan')
+def savings_plan_result(data):
+    """Generate a personalized savings plan based on income and expenses; returns (payload, status)"""
     income_data = data.get('incomeData', [])
     expense_data = data.get('expenseData', [])
     
     if not income_data or not expense_data:
-        return jsonify({"error": "Both income and expense data are required"}), 400
+        return {"error": "Both income and expense data are required"}, 400
     
     # Calculate total income and expenses
-    total_income = sum(item['amount'] for item in income_data)
-    total_expenses = sum(item['amount'] for item in expense_data)
+    rollups = get_rollups(income_data, expense_data)
+    total_income = rollups.income.total
+    total_expenses = rollups.expense.total
     
     # Calculate current savings
     current_savings = total_income - total_expenses
@@ -279,11 +644,7 @@ def savings_plan():
     strategies = []
     
     # Add category-specific strategies based on the profile (from job category)
-    job_category = None
-    for item in income_data:
-        if 'category' in item:
-            job_category = item['category']
-            break
+    job_category = rollups.income.first_category
     
     # Basic strategy for everyone
     strategies.append({
@@ -324,52 +685,140 @@ def savings_plan():
             'difficulty': 'Easy'
         })
     
-    return jsonify({
-        "plan": {
-            "current_savings": round(current_savings, 2),
-            "current_savings_percent": round(current_savings_percent, 2),
-            "target_amount": round(target_savings, 2),
-            "target_percent": target_percent,
-            "savings_gap": round(savings_gap, 2),
-            "emergency_fund_target": round(emergency_fund_target, 2),
-            "months_to_emergency_fund": round(months_to_emergency_fund, 1),
-            "strategies": strategies
+    plan = {
+        "current_savings": round(current_savings, 2),
+        "current_savings_percent": round(current_savings_percent, 2),
+        "target_amount": round(target_savings, 2),
+        "target_percent": target_percent,
+        "savings_gap": round(savings_gap, 2),
+        "emergency_fund_target": round(emergency_fund_target, 2),
+        "months_to_emergency_fund": round(months_to_emergency_fund, 1),
+        "strategies": strategies
+    }
+    
+    # Optional Monte Carlo projection bootstrapped from the user's own months
+    if data.get('simulate'):
+        try:
+            paths = int(data.get('paths', savings_simulation.SIMULATION_PATHS))
+            horizon = int(data.get('horizonMonths', savings_simulation.SIMULATION_HORIZON_MONTHS))
+            start_balance = float(data.get('currentBalance', 0))
+            seed = data.get('seed')
+            seed = None if seed is None else int(seed)
+            target = data.get('emergencyFundTarget')
+            target = float(target) if target else None
+        except (TypeError, ValueError):
+            return {"error": "paths, horizonMonths, currentBalance, seed and emergencyFundTarget must be numbers"}, 400
+        if not (1 <= paths <= savings_simulation.MAX_SIMULATION_PATHS
+                and 1 <= horizon <= savings_simulation.MAX_SIMULATION_HORIZON_MONTHS):
+            return {"error": f"paths must be 1-{savings_simulation.MAX_SIMULATION_PATHS} and horizonMonths "
+                             f"1-{savings_simulation.MAX_SIMULATION_HORIZON_MONTHS}"}, 400
+        
+        months, monthly_income, monthly_expenses = savings_simulation.monthly_history(rollups)
+        if target is None:
+            # Default target: 3 months of the user's average monthly expenses
+            target = float(monthly_expenses.mean() * 3)
+        plan["simulation"] = savings_simulation.simulate_savings(
+            monthly_income, monthly_expenses, target, start_balance, paths=paths, horizon=horizon, seed=seed)
+    
+    return {"plan": plan}, 200
+
+@app.route('/api/savings-plan', methods=['POST'])
+def savings_plan():
+    """Generate a personalized savings plan based on income and expenses"""
+    payload, status = savings_plan_result(request.json)
+    return jsonify(payload), status
+
+@with_dataset
+def expense_scenarios_result(data):
+    """Evaluate many what-if scenarios of expense cuts and income changes at once; returns (payload, status)
+    
+    Each scenario is {"cuts": {category: percent}, "incomeChange": percent}
+    with an optional "id"; results are monthly and include the tax impact
+    under the requested (or default) regime.
+    """
+    income_data = data.get('incomeData', [])
+    expense_data = data.get('expenseData', [])
+    
+    if not income_data or not expense_data:
+        return {"error": "Both income and expense data are required"}, 400
+    
+    regime = data.get('taxRegime')
+    try:
+        slab_table = tax_engine.get_regime(regime)
+    except KeyError:
+        return {"error": f"Unknown tax regime: {regime}"}, 400
+    
+    rollups = get_rollups(income_data, expense_data)
+    months, _, _ = savings_simulation.monthly_history(rollups)
+    annual_income = tax_engine.annualize_total(rollups.income.total, rollups.income.first_date, rollups.income.last_date)
+    baseline = ScenarioBaseline.from_rollups(rollups, len(months), annual_income)
+    
+    scenarios = data.get('scenarios') or []
+    try:
+        cuts, income_change = baseline.parse(scenarios)
+    except ScenarioError as e:
+        return {"error": str(e)}, 400
+    
+    # Every scenario in one pass over the scenarios x categories matrix
+    results = baseline.evaluate(cuts, income_change, slab_table)
+    columns = {name: np.round(values, 2).tolist() for name, values in results.items()
+               if name not in ('months_to_emergency_fund', 'savings_by_category')}
+    months_to_fund = [None if np.isinf(value) else round(value, 1) for value in results['months_to_emergency_fund'].tolist()]
+    
+    evaluated = []
+    for row, scenario in enumerate(scenarios):
+        result = {name: values[row] for name, values in columns.items()}
+        result['months_to_emergency_fund'] = months_to_fund[row]
+        result['savings_by_category'] = {
+            category: round(float(results['savings_by_category'][row, baseline.category_index[category]]), 2)
+            for category in (scenario.get('cuts') or {})
         }
-    })
+        evaluated.append({"id": scenario.get('id', row), **result})
+    
+    base = baseline.baseline(slab_table)
+    return {
+        "regime": slab_table.key,
+        "history_months": len(months),
+        "baseline": {
+            **{name: round(float(value), 2) for name, value in base.items()
+               if name not in ('months_to_emergency_fund', 'savings_by_category')},
+            "months_to_emergency_fund": None if np.isinf(base['months_to_emergency_fund'])
+                                        else round(float(base['months_to_emergency_fund']), 1)
+        },
+        "scenarios": evaluated
+    }, 200
 
-@app.route('/api/tax-suggestions', methods=['POST'])
-def tax_suggestions():
-    """Provide personalized tax optimization suggestions"""
-    data = request.json
+@app.route('/api/expense-scenarios', methods=['POST'])
+def expense_scenarios():
+    """Endpoint to evaluate many expense-cut and income-change scenarios in one request"""
+    payload, status = expense_scenarios_result(request.json)
+    return jsonify(payload), status
+
+@with_dataset
+@with_precomputed('tax-suggestions')
+def tax_suggestions_result(data):
+    """Provide personalized tax optimization suggestions; returns (payload, status)"""
     income_data = data.get('incomeData', [])
     
     if not income_data:
-        return jsonify({"error": "Income data is required"}), 400
-    
-    # Calculate total income
-    total_income = sum(item['amount'] for item in income_data)
-    annual_income = total_income * (12 / len(income_data)) if len(income_data) > 0 else 0
-    
-    # Determine which tax bracket the user falls into (simplified for India 2024-25)
-    tax_liability = 0
-    if annual_income <= 300000:
-        tax_bracket = "No tax up to ₹3,00,000"
-        tax_liability = 0
-    elif annual_income <= 600000:
-        tax_bracket = "5% tax on income between ₹3,00,001 and ₹6,00,000"
-        tax_liability = (annual_income - 300000) * 0.05
-    elif annual_income <= 900000:
-        tax_bracket = "10% tax on income between ₹6,00,001 and ₹9,00,000"
-        tax_liability = 15000 + (annual_income - 600000) * 0.1
-    elif annual_income <= 1200000:
-        tax_bracket = "15% tax on income between ₹9,00,001 and ₹12,00,000"
-        tax_liability = 45000 + (annual_income - 900000) * 0.15
-    elif annual_income <= 1500000:
-        tax_bracket = "20% tax on income between ₹12,00,001 and ₹15,00,000"
-        tax_liability = 90000 + (annual_income - 1200000) * 0.2
-    else:
-        tax_bracket = "30% tax on income above ₹15,00,000"
-        tax_liability = 150000 + (annual_income - 1500000) * 0.3
+        return {"error": "Income data is required"}, 400
+    
+    # Look up the slab table for the requested regime
+    regime = data.get('taxRegime')
+    try:
+        slab_table = tax_engine.get_regime(regime)
+    except KeyError:
+        return {"error": f"Unknown tax regime: {regime}"}, 400
+    
+    # Estimate annual income from the period the entries cover
+    rollups = get_rollups(income_data, data.get('expenseData', []))
+    annual_income = tax_engine.annualize_total(rollups.income.total, rollups.income.first_date, rollups.income.last_date)
+    
+    # Determine which tax bracket the user falls into
+    tax_bracket = slab_table.labels[int(slab_table.slab_index(annual_income))]
+    tax_liability = float(slab_table.liability(annual_income))
+    regime_comparison = {key: round(float(liability), 2)
+                         for key, liability in tax_engine.compare_regimes([annual_income]).items()}
     
     # Generate tax optimization suggestions
     suggestions = []
@@ -388,11 +837,7 @@ def tax_suggestions():
     })
     
     # Job-specific tax suggestions
-    job_category = None
-    for item in income_data:
-        if 'category' in item:
-            job_category = item['category']
-            break
+    job_category = rollups.income.first_category
     
     if job_category == 'Food Delivery':
         suggestions.append({
@@ -413,51 +858,87 @@ def tax_suggestions():
             'potential_savings': round(annual_income * 0.01, 2)
         })
     
-    return jsonify({
+    return {
         "tax_analysis": {
             "annual_income_estimate": round(annual_income, 2),
             "tax_bracket": tax_bracket,
-            "estimated_tax_liability": round(tax_liability, 2)
+            "estimated_tax_liability": round(tax_liability, 2),
+            "regime": slab_table.key,
+            "regime_comparison": regime_comparison
         },
         "tax_suggestions": suggestions
-    })
+    }, 200
 
-@app.route('/api/low-income-preparation', methods=['POST'])
-def low_income_preparation():
-    """Provide strategies for handling seasonal low-income periods"""
-    data = request.json
+@app.route('/api/tax-suggestions', methods=['POST'])
+def tax_suggestions():
+    """Provide personalized tax optimization suggestions"""
+    payload, status = tax_suggestions_result(request.json)
+    return jsonify(payload), status
+
+def tax_batch_result(data):
+    """Score many workers under several tax regimes at once; returns (payload, status)
+    
+    Accepts precomputed "annualIncomes" and/or "workers" with their own
+    "incomeData", plus an optional list of "regimes" (default: all).
+    """
+    try:
+        ids, incomes = tax_engine.batch_incomes(data)
+    except tax_engine.TaxInputError as e:
+        return {"error": str(e)}, 400
+    
+    tables, _ = tax_engine.get_tax_tables()
+    regimes = data.get('regimes') or list(tables)
+    if not isinstance(regimes, list) or not all(isinstance(regime, str) for regime in regimes):
+        return {"error": "regimes must be a list of regime names"}, 400
+    unknown = [regime for regime in regimes if regime not in tables]
+    if unknown:
+        return {"error": f"Unknown tax regime: {', '.join(unknown)}"}, 400
+    
+    # One vectorized pass per regime over every income
+    liabilities = np.vstack([tables[regime].liability(incomes) for regime in regimes])
+    best = liabilities.argmin(axis=0)
+    
+    results = []
+    for column, worker_id in enumerate(ids):
+        results.append({
+            "id": worker_id,
+            "annual_income": round(float(incomes[column]), 2),
+            "liabilities": {regime: round(float(liabilities[row, column]), 2) for row, regime in enumerate(regimes)},
+            "best_regime": regimes[best[column]]
+        })
+    
+    return {
+        "regimes": regimes,
+        "results": results,
+        "totals": {regime: round(float(liabilities[row].sum()), 2) for row, regime in enumerate(regimes)}
+    }, 200
+
+@app.route('/api/tax-batch', methods=['POST'])
+def tax_batch():
+    """Endpoint to compute tax liability for many workers and regimes in one request"""
+    payload, status = tax_batch_result(request.json)
+    return jsonify(payload), status
+
+@with_dataset
+@with_precomputed('low-income-preparation')
+def low_income_preparation_result(data):
+    """Provide strategies for handling seasonal low-income periods; returns (payload, status)"""
     income_data = data.get('incomeData', [])
     expense_data = data.get('expenseData', [])
     
     if not income_data or not expense_data:
-        return jsonify({"error": "Both income and expense data are required"}), 400
-    
-    # Calculate monthly income to identify low periods
-    monthly_income = {}
-    for item in income_data:
-        month = item['date'][:7]  # Get YYYY-MM
-        if month not in monthly_income:
-            monthly_income[month] = 0
-        monthly_income[month] += item['amount']
-    
-    # Calculate average monthly income
-    avg_monthly_income = sum(monthly_income.values()) / len(monthly_income) if monthly_income else 0
-    
-    # Identify low-income months (below 80% of average)
-    low_income_months = []
-    for month, income in monthly_income.items():
-        if income < (avg_monthly_income * 0.8):
-            low_income_months.append(month)
-    
-    # Calculate monthly expenses
-    monthly_expenses = {}
-    for item in expense_data:
-        month = item['date'][:7]  # Get YYYY-MM
-        if month not in monthly_expenses:
-            monthly_expenses[month] = 0
-        monthly_expenses[month] += item['amount']
+        return {"error": "Both income and expense data are required"}, 400
+    
+    # Per-calendar-month income statistics, updated only with entries added since the last call
+    tracker = seasonality_trackers.sync(state_key(data, income_data), income_data)
+    
+    # Average monthly income and low-income months (below 80% of average)
+    avg_monthly_income = tracker.average_monthly_income()
+    low_income_months = tracker.low_income_months(LOW_INCOME_THRESHOLD)
     
     # Calculate average monthly expenses
+    rollups = get_rollups(income_data, expense_data)
+    monthly_expenses = rollups.expense.monthly_totals()
     avg_monthly_expenses = sum(monthly_expenses.values()) / len(monthly_expenses) if monthly_expenses else 0
     
     # Calculate recommended emergency fund (3 months of expenses)
@@ -482,11 +963,7 @@ def low_income_preparation():
     })
     
     # Job-specific strategies
-    job_category = None
-    for item in income_data:
-        if 'category' in item:
-            job_category = item['category']
-            break
+    job_category = rollups.income.first_category
     
     if job_category == 'Food Delivery':
         strategies.append({
@@ -528,54 +1005,198 @@ def low_income_preparation():
             'timeline': 'Medium-term'
         })
     
-    # Pattern-based strategies
-    if low_income_months:
-        # Check if low-income months follow a seasonal pattern
-        low_income_month_numbers = [int(month.split('-')[1]) for month in low_income_months]
-        if set(low_income_month_numbers) & {5, 6, 7}:  # Summer months
-            strategies.append({
-                'title': 'Summer Income Planning',
-                'description': 'Your income tends to drop during summer months. Plan additional work or savings for May-July',
-                'impact': 'High',
-                'timeline': 'Annual'
-            })
-        elif set(low_income_month_numbers) & {1, 2}:  # Winter months
-            strategies.append({
-                'title': 'Winter Income Planning',
-                'description': 'Your income tends to drop during winter months. Plan additional work or savings for January-February',
-                'impact': 'High',
-                'timeline': 'Annual'
-            })
+    # Pattern-based strategies from the calendar months that are low year after year
+    risk_months = tracker.seasonal_risk_months(LOW_INCOME_THRESHOLD)
+    if risk_months:
+        month_names = ', '.join(calendar.month_name[month] for month in risk_months)
+        if set(risk_months) & {5, 6, 7}:  # Summer months
+            title = 'Summer Income Planning'
+        elif set(risk_months) & {1, 2}:  # Winter months
+            title = 'Winter Income Planning'
+        else:
+            title = 'Seasonal Income Planning'
+        strategies.append({
+            'title': title,
+            'description': f'Your income tends to drop in {month_names}. Plan additional work or savings for those months',
+            'impact': 'High',
+            'timeline': 'Annual'
+        })
     
-    return jsonify({
+    return {
         "income_analysis": {
             "average_monthly_income": round(avg_monthly_income, 2),
             "average_monthly_expenses": round(avg_monthly_expenses, 2),
             "low_income_months": low_income_months,
-            "emergency_fund_target": round(emergency_fund_target, 2)
+            "emergency_fund_target": round(emergency_fund_target, 2),
+            "seasonal_risk_months": risk_months,
+            "seasonal_profile": tracker.seasonal_profile()
         },
         "strategies": strategies
-    })
+    }, 200
 
-@app.route('/api/train-models', methods=['GET'])
-def train_models_endpoint():
-    """Endpoint to trigger model training"""
+@app.route('/api/low-income-preparation', methods=['POST'])
+def low_income_preparation():
+    """Provide strategies for handling seasonal low-income periods"""
+    payload, status = low_income_preparation_result(request.json)
+    return jsonify(payload), status
+
+def create_dataset_result(data):
+    """Store a worker's full ledger for later delta updates; returns (payload, status)"""
+    data = data or {}
+    income_data = data.get('incomeData', [])
+    expense_data = data.get('expenseData', [])
+    
+    if not income_data and not expense_data:
+        return {"error": "Income or expense data is required"}, 400
+    
+    dataset = dataset_store.create(income_data, expense_data)
+    return dataset.summary(), 201
+
+def dataset_delta_result(data):
+    """Apply new or edited entries to a stored dataset; returns (payload, status)
+    
+    Entries whose id matches a stored entry replace it, the rest are appended.
+    The delta must name the version it was computed against ("baseVersion");
+    a stale version gets 409 with the current one so the client can resync.
+    """
+    data = data or {}
+    dataset_id = data.get('datasetId')
+    base_version = data.get('baseVersion')
+    
+    if dataset_id is None or not isinstance(base_version, int):
+        return {"error": "datasetId and an integer baseVersion are required"}, 400
+    
+    try:
+        dataset = dataset_store.apply_delta(dataset_id, base_version,
+                                            data.get('incomeData', []), data.get('expenseData', []))
+    except KeyError:
+        return {"error": f"Unknown dataset: {dataset_id}"}, 404
+    except VersionConflict as e:
+        return {"error": "Version conflict", "datasetId": dataset_id, "version": e.current_version}, 409
+    
+    return dataset.summary(), 200
+
+@app.route('/api/datasets', methods=['POST'])
+def create_dataset():
+    """Endpoint to upload a ledger once and get a dataset id and version"""
+    payload, status = create_dataset_result(request.json)
+    return jsonify(payload), status
+
+@app.route('/api/datasets/delta', methods=['POST'])
+def dataset_delta():
+    """Endpoint to post only appended or edited entries against a dataset version"""
+    payload, status = dataset_delta_result(request.json)
+    return jsonify(payload), status
+
+@app.route('/api/datasets/<dataset_id>', methods=['GET'])
+def get_dataset(dataset_id):
+    """Endpoint to look up the current version of a dataset"""
+    dataset = dataset_store.get(dataset_id)
+    if dataset is None:
+        return jsonify({"error": f"Unknown dataset: {dataset_id}"}), 404
+    return jsonify(dataset.summary())
+
+# Retraining runs in a process of its own, so it never holds the GIL that
+# serving threads need; the process is started on the first retrain
+_training_pool = None
+
+def training_pool():
+    global _training_pool
+    if _training_pool is None:
+        _training_pool = ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context('spawn'))
+    return _training_pool
+
+def train_models_result(data=None, isolated=True):
+    """Run the training pipeline within the training lane's core budget; returns (payload, status)
+    
+    With isolated, training runs in the dedicated training process; callers
+    that already are one (async_app.py) pass isolated=False.
+    """
     try:
         # Import the train_models module
         import train_models
         
         # Execute the training function
-        train_models.save_data_and_train_models()
+        threads = admission['training'].threads
+        if isolated:
+            training_pool().submit(train_models.train_within_budget, threads).result()
+        else:
+            train_models.train_within_budget(threads)
+        
+        # Swap the freshly published versions in without waiting for the watcher
+        models.refresh()
         
-        return jsonify({
+        return {
             "status": "success",
             "message": "Models trained successfully"
-        })
+        }, 200
     except Exception as e:
-        return jsonify({
+        return {
             "status": "error",
             "message": f"Error training models: {str(e)}"
-        }), 500
+        }, 500
+
+@app.route('/api/train-models', methods=['GET'])
+def train_models_endpoint():
+    """Endpoint to trigger model training"""
+    payload, status = train_models_result()
+    return jsonify(payload), status
+
+@app.route('/api/memory', methods=['GET'])
+def memory_report():
+    """Endpoint reporting process memory, cache and model sizes, budgets and sampled allocation profiles"""
+    report = memory_accountant.report()
+    report["models"] = model_memory()
+    report["profiling"] = memory_profiler.report()
+    return jsonify(report)
+
+@app.route('/api/memory/profile', methods=['POST'])
+def memory_profile():
+    """Endpoint to set the share of requests traced with tracemalloc (0 turns profiling off)"""
+    data = request.json or {}
+    try:
+        sample_rate = float(data.get('sampleRate', 0))
+    except (TypeError, ValueError):
+        return jsonify({"error": "sampleRate must be a number between 0 and 1"}), 400
+    if not 0 <= sample_rate <= 1:
+        return jsonify({"error": "sampleRate must be a number between 0 and 1"}), 400
+    memory_profiler.sample_rate = sample_rate
+    if data.get('reset'):
+        memory_profiler.routes.clear()
+    return jsonify(memory_profiler.report())
+
+@app.route('/api/cluster', methods=['GET'])
+def cluster_report():
+    """Endpoint reporting this node's view of the cluster, and the owner of ?userId= if given"""
+    if cluster is None:
+        return jsonify({"enabled": False})
+    
+    report = dict(cluster.report(), enabled=True)
+    user_id = request.args.get('userId')
+    if user_id is not None:
+        report["owner"] = cluster.owner(user_id)
+    return jsonify(report)
+
+@app.route('/api/admission', methods=['GET'])
+def admission_report():
+    """Endpoint reporting each lane's limits, current load and admitted/shed counts"""
+    return jsonify(admission.report())
+
+# Route logic by API path, shared by the Flask routes and the async server
+ROUTE_HANDLERS = {
+    'forecast-income': forecast_income_result,
+    'analyze-expenses': analyze_expenses_result,
+    'categorize-expenses': categorize_expenses_result,
+    'expense-anomalies': expense_anomalies_result,
+    'peer-comparison': peer_comparison_result,
+    'savings-plan': savings_plan_result,
+    'expense-scenarios': expense_scenarios_result,
+    'tax-suggestions': tax_suggestions_result,
+    'tax-batch': tax_batch_result,
+    'low-income-preparation': low_income_preparation_result,
+    'datasets': create_dataset_result,
+    'datasets/delta': dataset_delta_result
+}
 
 if __name__ == '__main__':
     app.run(debug=True) 
\ No newline at end of file
@@ -0,0 +1,74 @@
+import hashlib
+
+import numpy as np
+
+def entry_rows(days, amounts, *columns):
+    """One int64 row per entry of its date, amount and any extra per-entry columns
+
+    The array is row-major, so the first n entries are a prefix of its bytes
+    and a digest of them is a prefix of the digest of the whole list.
+    """
+    return np.ascontiguousarray(np.column_stack([
+        days.astype(np.int64),
+        amounts.astype(np.float64).view(np.int64),
+        *columns
+    ]), dtype=np.int64)
+
+class AppendDetector:
+    """Tells whether a caller's entry list only grew since the last call
+
+    Keeps the length and a blake2b digest of the rows seen last time. The
+    list counts as appended to when those rows are still its prefix, so an
+    entry edited, removed or reordered anywhere (not only the last one) makes
+    the caller rebuild instead of serving stale statistics. Checking costs
+    one hash over the rows, far less than re-applying them.
+    """
+    __slots__ = ('length', 'digest')
+
+    def __init__(self):
+        self.length = 0
+        self.digest = None
+
+    def update(self, rows):
+        """Number of leading rows already seen (0 when the list was not only appended to); then remember rows"""
+        split = self.length if 0 < self.length <= len(rows) else 0
+        digest = hashlib.blake2b(rows[:split], digest_size=16)
+        seen = split if split and digest.digest() == self.digest else 0
+        digest.update(rows[split:])
+        self.length, self.digest = len(rows), digest.digest()
+        return seen
+
+class TailDetector:
+    """AppendDetector that only hashes the last rows it saw, so checking costs O(tail)
+
+    Keeps the length and a blake2b digest of the last `tail` rows seen last
+    time. The list counts as appended to when it is at least as long and
+    those rows are unchanged at the same positions. An edit further back
+    than the tail goes unnoticed, which suits statistics that are cheap to
+    be slightly off but costly to rebuild on every call.
+    """
+    __slots__ = ('tail', 'length', 'digest')
+
+    def __init__(self, tail=8):
+        self.tail = tail
+        self.length = 0
+        self.digest = None
+
+    def window(self, length):
+        """Index of the first of length entries whose rows update() needs"""
+        return max(min(self.length, length) - self.tail, 0)
+
+    def update(self, rows, length):
+        """Number of leading entries already seen (0 when the list was not only appended to); then remember its tail
+
+        rows are those of entries window(length) to length - 1.
+        """
+        start = length - len(rows)
+        seen = 0
+        if 0 < self.length <= length:
+            checked = rows[max(self.length - self.tail, 0) - start:self.length - start]
+            if hashlib.blake2b(checked, digest_size=16).digest() == self.digest:
+                seen = self.length
+        self.length = length
+        self.digest = hashlib.blake2b(rows[max(len(rows) - self.tail, 0):], digest_size=16).digest()
+        return seen
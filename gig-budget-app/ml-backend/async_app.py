@@ -0,0 +1,215 @@
+"""Async serving mode for the ML backend
+
+Serves the same routes as app.py from one asyncio event loop. Request bodies
+are handed as raw bytes to a pool of worker processes, which parse them, run
+the route logic from app.py and serialize the response. CPU-bound forecasting
+and aggregation therefore never block the loop, and cheap endpoints like
+/api/test-data stay responsive while forecasts are running.
+
+Compared with app.py (served by Flask/WSGI, alone or in a cluster):
+- Compression: request bodies are decoded and responses compressed in the
+  pool workers (_run_route) instead of by CompressionMiddleware.
+- Admission: one bound on the requests queued or running in the pool
+  (ASYNC_MAX_PENDING, 503 beyond it) replaces the per-lane limits of
+  AdmissionMiddleware.
+- Not applied: MemoryMiddleware accounting and profiling, and cluster
+  routing (route_to_owner), so run app.py behind CLUSTER_NODES for a
+  multi-node deployment. /api/memory, /api/cluster and /api/admission are
+  not served.
+
+Run with: python async_app.py [--host 127.0.0.1] [--port 5000]
+"""
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+from aiohttp import web
+
+import compression
+
+# Pool sizing. ASYNC_MAX_PENDING bounds the requests queued or running in the
+# prediction pool; requests beyond it are rejected with 503 instead of piling up.
+ASYNC_WORKERS = int(os.environ.get('ASYNC_WORKERS', os.cpu_count() or 2))
+ASYNC_MAX_PENDING = int(os.environ.get('ASYNC_MAX_PENDING', ASYNC_WORKERS * 4))
+ASYNC_RETRY_AFTER = 1  # Seconds suggested to clients that were turned away
+
+def _run_route(route, body, content_encoding=None, accept_encoding=None):
+    """Runs in a pool process: decode and parse the body, run the route logic,
+    serialize the result and compress it for the client
+
+    Returns (body bytes, status, Content-Encoding or None).
+    """
+    import app as routes  # Loads the models once per worker process
+
+    if content_encoding and content_encoding != 'identity':
+        try:
+            body = compression.decode_body(body, content_encoding)
+        except compression.UnsupportedEncoding:
+            return _error_body(f'Unsupported Content-Encoding: {content_encoding}'), 415, None
+        except compression.BodyTooLarge:
+            return _error_body('Decoded request body is too large'), 413, None
+        except compression.DECODE_ERRORS as e:
+            return _error_body(f'Invalid {content_encoding} body: {e}'), 400, None
+
+    try:
+        data = json.loads(body) if body else None
+    except ValueError:
+        return _error_body('Request body is not valid JSON'), 400, None
+    payload, status = routes.ROUTE_HANDLERS[route](data)
+    text = json.dumps(payload).encode('utf-8')
+
+    response_encoding = compression.choose_encoding(accept_encoding)
+    if response_encoding and compression.should_compress('application/json', len(text)):
+        return compression.compress(text, response_encoding), status, response_encoding
+    return text, status, None
+
+def _error_body(message):
+    return json.dumps({"error": message}).encode('utf-8')
+
+def _preload():
+    """Runs in a pool process at startup so the first requests do not pay for loading models"""
+    import app  # noqa: F401
+
+def _train_models():
+    """Runs in the training process"""
+    import app as routes
+
+    payload, status = routes.train_models_result(isolated=False)  # This already is the training process
+    return json.dumps(payload), status
+
+def _load_test_data(category):
+    """Runs in a thread: the category lookup reads files from data/"""
+    import app as routes
+
+    return json.dumps(routes.load_category_test_data(category))
+
+class BoundedPool:
+    """Process pool that refuses work once max_pending tasks are queued or running"""
+
+    def __init__(self, max_workers, max_pending):
+        context = multiprocessing.get_context('spawn')
+        self.executor = ProcessPoolExecutor(max_workers=max_workers, mp_context=context)
+        self.max_pending = max_pending
+        self.pending = 0
+
+    async def submit(self, fn, *args):
+        """Run fn(*args) in the pool, or return None when the pool is saturated"""
+        if self.pending >= self.max_pending:
+            return None
+        self.pending += 1
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self.executor, fn, *args)
+        finally:
+            self.pending -= 1
+
+    def warm_up(self, workers):
+        """Start the worker processes and import the app in each of them"""
+        for _ in range(workers):
+            self.executor.submit(_preload)
+
+    def shutdown(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+def _json_response(text, status=200):
+    return web.Response(text=text, status=status, content_type='application/json')
+
+def _encoded_json_response(body, status, content_encoding):
+    response = web.Response(body=body, status=status, content_type='application/json')
+    if content_encoding:
+        response.headers['Content-Encoding'] = content_encoding
+        response.headers['Vary'] = 'Accept-Encoding'
+    return response
+
+def _busy_response():
+    return web.json_response(
+        {"error": "Server is busy, please retry"},
+        status=503,
+        headers={'Retry-After': str(ASYNC_RETRY_AFTER)}
+    )
+
+async def get_test_data(request):
+    """Endpoint to get test data for a specific category"""
+    category = request.query.get('category', 'Food Delivery')
+    return _json_response(await asyncio.to_thread(_load_test_data, category))
+
+async def get_dataset(request):
+    """Endpoint to look up the current version of a dataset"""
+    import app as routes
+
+    dataset_id = request.match_info['dataset_id']
+    dataset = await asyncio.to_thread(routes.dataset_store.get, dataset_id)
+    if dataset is None:
+        return web.json_response({"error": f"Unknown dataset: {dataset_id}"}, status=404)
+    return web.json_response(dataset.summary())
+
+def _offloaded_route(route):
+    """Handler that runs one of app.ROUTE_HANDLERS in the prediction pool"""
+    async def handler(request):
+        body = await request.read()
+        result = await request.app['prediction_pool'].submit(
+            _run_route, route, body,
+            request.headers.get('Content-Encoding', '').strip().lower(),
+            request.headers.get('Accept-Encoding')
+        )
+        if result is None:
+            return _busy_response()
+        return _encoded_json_response(*result)
+    return handler
+
+async def train_models_endpoint(request):
+    """Endpoint to trigger model training in the dedicated training process"""
+    result = await request.app['training_pool'].submit(_train_models)
+    if result is None:
+        return web.json_response({"status": "error", "message": "Training is already running"}, status=409)
+    return _json_response(*result)
+
+async def preflight(request):
+    """CORS preflight for any API route"""
+    return web.Response()
+
+@web.middleware
+async def cors_middleware(request, handler):
+    """Allow cross-origin calls from the frontend, like flask_cors does for app.py"""
+    response = await handler(request)
+    response.headers['Access-Control-Allow-Origin'] = '*'
+    if request.method == 'OPTIONS':
+        response.headers['Access-Control-Allow-Methods'] = 'GET, POST, OPTIONS'
+        response.headers['Access-Control-Allow-Headers'] = request.headers.get('Access-Control-Request-Headers', '*')
+    return response
+
+async def _start_pools(server):
+    server['prediction_pool'] = BoundedPool(ASYNC_WORKERS, ASYNC_MAX_PENDING)
+    server['prediction_pool'].warm_up(ASYNC_WORKERS)
+    server['training_pool'] = BoundedPool(1, 1)  # Training never competes for prediction workers
+
+async def _stop_pools(server):
+    server['prediction_pool'].shutdown()
+    server['training_pool'].shutdown()
+
+def create_app():
+    """Build the aiohttp application with the same routes as app.py"""
+    import app as routes
+
+    # Bodies stay compressed until a pool worker decodes them (see _run_route)
+    server = web.Application(middlewares=[cors_middleware], handler_args={'auto_decompress': False})
+    server.router.add_get('/api/test-data', get_test_data)
+    for route in routes.ROUTE_HANDLERS:
+        server.router.add_post(f'/api/{route}', _offloaded_route(route))
+    server.router.add_get('/api/train-models', train_models_endpoint)
+    server.router.add_get('/api/datasets/{dataset_id}', get_dataset)
+    server.router.add_route('OPTIONS', '/api/{tail:.*}', preflight)
+
+    server.on_startup.append(_start_pools)
+    server.on_cleanup.append(_stop_pools)
+    return server
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Serve the ML backend from an asyncio event loop')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=5000)
+    args = parser.parse_args()
+
+    web.run_app(create_app(), host=args.host, port=args.port)
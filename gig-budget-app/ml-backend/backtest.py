@@ -0,0 +1,292 @@
+"""Rolling-origin backtest of the income forecasters on every user file
+
+Each cutoff is a calendar date (the latest income date in the data minus
+k * --horizon-days, for k = 1..--cutoffs). Every backend is fitted on the
+income entries up to the cutoff and predicts the amount of each entry in
+the --horizon-days after it, so all backends are scored on the same windows.
+Predictions are made on the dates income actually arrived rather than on
+randomly sampled work days, which makes reruns give the same numbers.
+
+MAE is per income entry; MAPE compares predicted and actual income over
+each user's window. Fit and predict times are wall seconds per call. Fits
+are spread over a process pool: per-user backends in shards of users,
+population backends (fitted on every user at once) one cutoff per task.
+
+Run with: python backtest.py [--data-dir data] [--cutoffs 3] [--horizon-days 30] [--workers N]
+"""
+import argparse
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+
+import train_models
+from features import calendar_features, entry_columns
+from forecast_router import MIN_FIT_ENTRIES, main_category
+from multi_tenant import MultiTenantForecaster
+
+HORIZON_DAYS = 30
+N_CUTOFFS = 3
+
+# Users per task for the per-user backends
+SHARD_USERS = 25
+
+PERSONALITIES = {personality["name"]: personality for personality in train_models.USER_PERSONALITIES}
+
+def load_user(path):
+    with open(path, 'r') as f:
+        user_data = json.load(f)
+    profile = user_data.get('userData', {})
+    income_data = user_data.get('incomeData', [])
+    days, amounts = entry_columns(income_data)
+    return {
+        "user_id": profile.get('id', path),
+        "income_data": income_data,
+        "days": days,
+        "amounts": amounts,
+        "rates": MultiTenantForecaster.profile_rates(PERSONALITIES.get(profile.get('personality')))
+    }
+
+_loaded = {}  # path -> user, so a pool process reads each file once
+
+def load_users(paths):
+    for path in paths:
+        if path not in _loaded:
+            _loaded[path] = load_user(path)
+    return [_loaded[path] for path in paths]
+
+def split_at(user, cutoff, horizon_days):
+    """(history up to the cutoff, boolean mask of the entries in the window after it)"""
+    history = user['days'] <= cutoff
+    window = ~history & (user['days'] <= cutoff + horizon_days)
+    income_data = [item for item, keep in zip(user['income_data'], history) if keep]
+    return dict(user, income_data=income_data, days=user['days'][history], amounts=user['amounts'][history]), window
+
+class MeanForecaster:
+    """Baseline: every entry is predicted at the user's mean entry amount"""
+
+    def __init__(self, amounts):
+        self.mean = float(np.mean(amounts))
+
+    def predict(self, features):
+        return np.full(len(features), self.mean)
+
+# Per-user backends: fit(history) -> model with predict(calendar features) or predict_dates(dates)
+def fit_user_model(history):
+    return train_models.train_income_forecast_model(history['income_data'])
+
+def fit_mean(history):
+    return MeanForecaster(history['amounts'])
+
+# Lag and rolling-mean features; windows longer than train_models.HISTORY_GAP_DAYS
+# predict their later days without them
+def fit_history_model(history):
+    return train_models.train_income_history_model(history['income_data'])
+
+# Population backends: fit(histories) -> model; forecaster(model, history) -> model with predict(features)
+def fit_global(histories, max_rows=train_models.GLOBAL_MAX_TRAINING_ROWS):
+    """The global forecaster, fitted on a uniform sample of every user's history"""
+    features = np.vstack([calendar_features(history['days']) for history in histories])
+    amounts = np.concatenate([history['amounts'] for history in histories])
+    if len(amounts) > max_rows:
+        rows = np.random.default_rng(42).choice(len(amounts), max_rows, replace=False)
+        features, amounts = features[rows], amounts[rows]
+    return train_models.GradientBoostingRegressor(**train_models.INCOME_MODEL_PARAMS).fit(features, amounts)
+
+def fit_category(histories):
+    """{category: forecaster} fitted on every user's entries of that gig category"""
+    features, amounts, categories = [], [], []
+    for history in histories:
+        features.append(calendar_features(history['days']))
+        amounts.append(history['amounts'])
+        categories.extend(item.get('category') for item in history['income_data'])
+    features, amounts = np.vstack(features), np.concatenate(amounts)
+    categories = np.array(categories, dtype=object)
+    models = {}
+    for category in set(categories) - {None}:
+        rows = categories == category
+        models[category] = train_models.GradientBoostingRegressor(**train_models.INCOME_MODEL_PARAMS)
+        models[category].fit(features[rows], amounts[rows])
+    return models
+
+def fit_multi_tenant(histories):
+    return MultiTenantForecaster().fit(histories)
+
+def global_forecaster(model, history):
+    return model
+
+def category_forecaster(models, history):
+    return models.get(main_category(history['income_data']))
+
+def multi_tenant_forecaster(model, history):
+    return model.for_user(history['user_id'])
+
+USER_BACKENDS = {
+    'user': fit_user_model,
+    'history': fit_history_model,
+    'mean': fit_mean
+}
+POPULATION_BACKENDS = {
+    'global': (fit_global, global_forecaster),
+    'category': (fit_category, category_forecaster),
+    'multi_tenant': (fit_multi_tenant, multi_tenant_forecaster)
+}
+BACKENDS = (*USER_BACKENDS, *POPULATION_BACKENDS)
+
+def _timed(function, *args):
+    started = time.perf_counter()
+    result = function(*args)
+    return result, time.perf_counter() - started
+
+def evaluate(backend, cutoff, paths, horizon_days=HORIZON_DAYS, min_entries=MIN_FIT_ENTRIES):
+    """Runs in a pool process: (windows, fit seconds, predict seconds) of one backend at one cutoff
+
+    A window is (user_id, entries, absolute error sum, actual total, predicted total).
+    """
+    cutoff = np.datetime64(cutoff, 'D')
+    users = load_users(paths)
+    splits = [split_at(user, cutoff, horizon_days) for user in users]
+    scored = [(user, history, window) for user, (history, window) in zip(users, splits)
+              if len(history['days']) >= min_entries and window.any()]
+
+    fit_seconds, forecasters = [], []
+    if backend in USER_BACKENDS:
+        for _, history, _ in scored:
+            model, seconds = _timed(USER_BACKENDS[backend], history)
+            fit_seconds.append(seconds)
+            forecasters.append(model)
+    else:
+        fit, forecaster = POPULATION_BACKENDS[backend]
+        # Every user with history is fitted on, including those not scored at this cutoff
+        model, seconds = _timed(fit, [history for history, _ in splits if len(history['days'])])
+        fit_seconds.append(seconds)
+        forecasters = [forecaster(model, history) for _, history, _ in scored]
+
+    windows, predict_seconds = [], []
+    for (user, _, window), model in zip(scored, forecasters):
+        if model is None:
+            continue  # No model covers this user (e.g. no gig category)
+        if hasattr(model, 'predict_dates'):
+            predicted, seconds = _timed(model.predict_dates, user['days'][window])  # Needs the dates themselves
+        else:
+            predicted, seconds = _timed(model.predict, calendar_features(user['days'][window]))
+        predict_seconds.append(seconds)
+        actual = user['amounts'][window]
+        windows.append((user['user_id'], len(actual), float(np.abs(predicted - actual).sum()),
+                        float(actual.sum()), float(predicted.sum())))
+    return windows, fit_seconds, predict_seconds
+
+def choose_cutoffs(paths, n_cutoffs=N_CUTOFFS, horizon_days=HORIZON_DAYS):
+    """Cutoff dates stepping back from the latest income date, oldest first"""
+    last = max(user['days'].max() for user in load_users(paths) if len(user['days']))
+    return [str(last - k * horizon_days) for k in range(n_cutoffs, 0, -1)]
+
+def summarize(results):
+    """{backend: metrics} from {(backend, cutoff): (windows, fit seconds, predict seconds)}"""
+    summary = {}
+    for backend in BACKENDS:
+        windows, fits, predicts, by_cutoff = [], [], [], {}
+        for (name, cutoff), (cutoff_windows, fit_seconds, predict_seconds) in sorted(results.items()):
+            if name != backend:
+                continue
+            windows.extend(cutoff_windows)
+            fits.extend(fit_seconds)
+            predicts.extend(predict_seconds)
+            by_cutoff[cutoff] = _errors(cutoff_windows)
+        if not fits:
+            continue
+        summary[backend] = dict(
+            _errors(windows),
+            fits=len(fits),
+            fit_seconds=sum(fits),
+            mean_fit_ms=1000 * float(np.mean(fits)),
+            mean_predict_ms=1000 * float(np.mean(predicts)) if predicts else None,
+            by_cutoff=by_cutoff
+        )
+    return summary
+
+def _errors(windows):
+    if not windows:
+        return {"windows": 0, "entries": 0, "mae": None, "mape": None}
+    _, entries, abs_errors, actual, predicted = (np.array(column) for column in zip(*windows))
+    positive = actual > 0
+    return {
+        "windows": len(windows),
+        "entries": int(entries.sum()),
+        "mae": float(abs_errors.sum() / entries.sum()),
+        "mape": float(np.mean(np.abs(predicted[positive] - actual[positive]) / actual[positive]) * 100)
+    }
+
+def run(data_dir='data', n_cutoffs=N_CUTOFFS, horizon_days=HORIZON_DAYS, backends=BACKENDS, workers=None,
+        min_entries=MIN_FIT_ENTRIES):
+    """Backtest every backend at every cutoff; returns (cutoffs, summary)"""
+    paths = list(train_models.iter_user_data_files(data_dir))
+    cutoffs = choose_cutoffs(paths, n_cutoffs, horizon_days)
+    if workers is None:
+        workers = os.cpu_count() or 2
+
+    # Population fits are the longest tasks, so they are queued first
+    tasks = [(backend, cutoff, paths) for backend in backends if backend in POPULATION_BACKENDS for cutoff in cutoffs]
+    shards = [paths[start:start + SHARD_USERS] for start in range(0, len(paths), SHARD_USERS)]
+    tasks += [(backend, cutoff, shard) for backend in backends if backend in USER_BACKENDS
+              for cutoff in cutoffs for shard in shards]
+    print(f"Backtesting {', '.join(backends)} on {len(paths)} users at cutoffs {', '.join(cutoffs)} "
+          f"({len(tasks)} tasks on {workers or 'no'} worker processes)...")
+
+    results = {}
+
+    def collect(backend, cutoff, result):
+        windows, fit_seconds, predict_seconds = results.setdefault((backend, cutoff), ([], [], []))
+        windows.extend(result[0])
+        fit_seconds.extend(result[1])
+        predict_seconds.extend(result[2])
+
+    if workers:
+        with ProcessPoolExecutor(workers) as pool:
+            futures = {pool.submit(evaluate, *task, horizon_days, min_entries): task for task in tasks}
+            for future in as_completed(futures):
+                backend, cutoff, _ = futures[future]
+                collect(backend, cutoff, future.result())
+    else:
+        for backend, cutoff, task_paths in tasks:
+            collect(backend, cutoff, evaluate(backend, cutoff, task_paths, horizon_days, min_entries))
+    return cutoffs, summarize(results)
+
+def main():
+    parser = argparse.ArgumentParser(description='Rolling-origin backtest of the income forecasters')
+    parser.add_argument('--data-dir', default='data')
+    parser.add_argument('--cutoffs', type=int, default=N_CUTOFFS, help='Forecast origins, one horizon apart')
+    parser.add_argument('--horizon-days', type=int, default=HORIZON_DAYS)
+    parser.add_argument('--backends', default=','.join(BACKENDS), help='Comma-separated backends to evaluate')
+    parser.add_argument('--workers', type=int, default=None, help='Worker processes (0 runs in this process)')
+    parser.add_argument('--output', help='Also write the full results, per cutoff, to this JSON file')
+    args = parser.parse_args()
+
+    backends = tuple(args.backends.split(','))
+    unknown = set(backends) - set(BACKENDS)
+    if unknown:
+        parser.error(f"Unknown backends: {', '.join(sorted(unknown))} (choose from {', '.join(BACKENDS)})")
+
+    started = time.perf_counter()
+    cutoffs, summary = run(args.data_dir, args.cutoffs, args.horizon_days, backends, args.workers)
+    elapsed = time.perf_counter() - started
+
+    print(f"\n{'backend':<14}{'windows':>9}{'entries':>9}{'MAE':>10}{'MAPE %':>9}{'fits':>7}"
+          f"{'fit ms':>10}{'predict ms':>12}")
+    for backend, metrics in summary.items():
+        mae = f"{metrics['mae']:.1f}" if metrics['mae'] is not None else '-'
+        mape = f"{metrics['mape']:.1f}" if metrics['mape'] is not None else '-'
+        predict = f"{metrics['mean_predict_ms']:.2f}" if metrics['mean_predict_ms'] is not None else '-'
+        print(f"{backend:<14}{metrics['windows']:>9}{metrics['entries']:>9}{mae:>10}{mape:>9}{metrics['fits']:>7}"
+              f"{metrics['mean_fit_ms']:>10.1f}{predict:>12}")
+    print(f"\nBacktest took {elapsed:.1f}s wall time")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({"cutoffs": cutoffs, "horizon_days": args.horizon_days, "backends": summary}, f, indent=2)
+        print(f"Results written to {args.output}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,120 @@
+"""Precompute every analysis for every user file
+
+Runs the forecast, expense analysis, savings plan, tax and low-income route
+logic from app.py on each user's data file and stores the payloads in a
+ResultStore keyed by user and version (the content hash of their ledgers
+plus the published versions of the models each route reads). Users are
+sharded across a process pool that loads the models once per process; the
+parent process is the only writer to the store.
+
+Serve the results with: PRECOMPUTED_RESULTS=results/precomputed.sqlite python app.py
+
+Run with: python batch_score.py [--data-dir data] [--store results/precomputed.sqlite] [--workers N]
+"""
+import argparse
+import json
+import os
+import random
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+os.environ.setdefault('MODEL_WATCH_INTERVAL', '0')  # Batch workers never need to pick up new models
+
+from results_store import ResultStore, PRECOMPUTED_ROUTES
+
+DEFAULT_STORE = os.path.join('results', 'precomputed.sqlite')
+
+# Users written to the store per transaction
+WRITE_BATCH_USERS = 100
+
+def list_user_files(data_dir):
+    return [os.path.join(data_dir, file) for file in sorted(os.listdir(data_dir))
+            if file.startswith('user_') and file.endswith('_data.json')]
+
+def _preload():
+    """Runs in a pool process at startup so models are loaded once per process"""
+    import app  # noqa: F401
+
+def score_user(path, routes=PRECOMPUTED_ROUTES):
+    """Runs in a pool process: (user_id, {route: (version, payload)}, {route: error})"""
+    import app
+
+    with open(path, 'r') as f:
+        user_data = json.load(f)
+    income_data = user_data.get('incomeData', [])
+    expense_data = user_data.get('expenseData', [])
+    user_id = user_data.get('userData', {}).get('id')
+    if user_id is None and income_data:
+        user_id = income_data[0].get('user_id')
+
+    # The same body the dashboard posts, so the version matches live requests
+    body = {"incomeData": income_data, "expenseData": expense_data, "userId": user_id}
+    results, errors = {}, {}
+    for route in routes:
+        random.seed(f'{user_id}:{route}')  # Reruns on unchanged data give the same results
+        try:
+            payload, status = app.ROUTE_HANDLERS[route](body)
+        except Exception as e:
+            errors[route] = str(e)
+            continue
+        if status == 200:
+            results[route] = (app.precomputed_version(route, user_id, income_data, expense_data), payload)
+        else:
+            errors[route] = payload.get('error', f'HTTP {status}')
+    return user_id, results, errors
+
+def run(data_dir='data', store_path=DEFAULT_STORE, workers=None, routes=PRECOMPUTED_ROUTES):
+    """Score every user file into the store; returns (users scored, users with errors)"""
+    paths = list_user_files(data_dir)
+    store = ResultStore(store_path)
+    if workers is None:
+        workers = os.cpu_count() or 2
+    print(f"Scoring {len(paths)} users on {workers or 'no'} worker processes...")
+
+    scored = failed = 0
+    pending = []
+
+    def collect(results):
+        nonlocal scored, failed
+        for user_id, payloads, errors in results:
+            if user_id is None:
+                failed += 1
+                continue
+            pending.extend((user_id, route, version, payload) for route, (version, payload) in payloads.items())
+            scored += 1
+            if errors:
+                failed += 1
+                print(f"  User {user_id}: {errors}")
+            if scored % WRITE_BATCH_USERS == 0:
+                store.put_many(pending)
+                pending.clear()
+
+    args = [routes] * len(paths)
+    if workers:
+        # Several chunks per worker so a slow shard does not hold up the rest
+        chunksize = max(1, len(paths) // (workers * 4))
+        with ProcessPoolExecutor(workers, initializer=_preload) as pool:
+            collect(pool.map(score_user, paths, args, chunksize=chunksize))
+    else:
+        collect(map(score_user, paths, args))
+    store.put_many(pending)
+    return scored, failed
+
+def main():
+    parser = argparse.ArgumentParser(description='Precompute every analysis for every user in the data directory')
+    parser.add_argument('--data-dir', default='data')
+    parser.add_argument('--store', default=DEFAULT_STORE, help='SQLite file the results are written to')
+    parser.add_argument('--workers', type=int, default=None, help='Worker processes (0 runs in this process)')
+    parser.add_argument('--routes', default=','.join(PRECOMPUTED_ROUTES), help='Comma-separated routes to precompute')
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    scored, failed = run(args.data_dir, args.store, args.workers, tuple(args.routes.split(',')))
+    elapsed = time.perf_counter() - started
+
+    rows, users, payload_bytes = ResultStore(args.store).stats()
+    print(f"Scored {scored} users in {elapsed:.1f}s ({scored / elapsed:.1f} users/s), {failed} with errors")
+    print(f"Store {args.store}: {rows} results for {users} users, {payload_bytes / 1024:.1f} KB of payloads")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,96 @@
+"""Bandwidth/latency trade-off of compressing request and response bodies
+
+For every user file in data/, takes the request body the dashboard posts
+(incomeData + expenseData) and the /api/forecast-income response, and
+compresses both with each available encoding and level. Reports the
+compression ratio, encode/decode time, and the end-to-end time to move each
+body over a few link speeds (encode + transfer + decode), next to sending it
+uncompressed.
+
+Run with: python benchmark_compression.py [--repeat 5] [--links 1,10,100]
+"""
+import argparse
+import json
+import os
+import random
+import time
+
+import compression
+
+# Levels to compare per encoding: fast, default, strong
+LEVELS = {
+    'gzip': [1, 6, 9],
+    'deflate': [6],
+    'zstd': [1, 3, 9, 19],
+    'br': [1, 4, 9, 11],
+}
+
+def load_bodies(data_dir='data'):
+    """{kind: [body bytes]} of request and response bodies built from the user files"""
+    import app  # Route logic for the response bodies
+
+    request_bodies, response_bodies = [], []
+    for file in sorted(os.listdir(data_dir)):
+        if not (file.startswith('user_') and file.endswith('_data.json')):
+            continue
+        with open(os.path.join(data_dir, file), 'r') as f:
+            user_data = json.load(f)
+        body = {"incomeData": user_data['incomeData'], "expenseData": user_data['expenseData']}
+        request_bodies.append(json.dumps(body).encode('utf-8'))
+
+        random.seed(0)
+        payload, _ = app.forecast_income_result(body)
+        response_bodies.append(json.dumps(payload).encode('utf-8'))
+    return {'request': request_bodies, 'forecast response': response_bodies}
+
+def best_time(fn, repeat):
+    best = float('inf')
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - started)
+    return best
+
+def measure(bodies, encoding, level, repeat):
+    """(original bytes, compressed bytes, encode s, decode s) summed over bodies"""
+    original = compressed = encode = decode = 0
+    for body in bodies:
+        packed = compression.compress(body, encoding, level)
+        original += len(body)
+        compressed += len(packed)
+        encode += best_time(lambda: compression.compress(body, encoding, level), repeat)
+        decode += best_time(lambda: compression.decode_body(packed, encoding), repeat)
+    return original, compressed, encode, decode
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare compression encodings on real ledgers')
+    parser.add_argument('--repeat', type=int, default=5, help='Timing repetitions (best is kept)')
+    parser.add_argument('--links', default='1,10,100', help='Link speeds in Mbit/s')
+    args = parser.parse_args()
+    links = [float(speed) for speed in args.links.split(',')]
+
+    print("Encodings available:", ', '.join(compression.CODECS))
+    for kind, bodies in load_bodies().items():
+        per_body = sum(len(body) for body in bodies) / len(bodies)
+        print(f"\n=== {kind}: {len(bodies)} bodies, {per_body / 1024:.1f} KB average ===")
+        header = f"{'encoding':<10}{'level':>6}{'ratio':>8}{'KB/body':>9}{'enc ms':>8}{'dec ms':>8}"
+        print(header + ''.join(f"{f'{speed:g}Mb ms':>10}" for speed in links))
+
+        def row(name, level, original, size, encode, decode):
+            cells = f"{name:<10}{level:>6}{original / size:>8.2f}{size / len(bodies) / 1024:>9.1f}" \
+                    f"{encode / len(bodies) * 1000:>8.2f}{decode / len(bodies) * 1000:>8.2f}"
+            for speed in links:
+                transfer = size * 8 / (speed * 1e6)
+                cells += f"{(encode + transfer + decode) / len(bodies) * 1000:>10.1f}"
+            print(cells)
+
+        original = sum(len(body) for body in bodies)
+        row('identity', '-', original, original, 0.0, 0.0)
+        for encoding, levels in LEVELS.items():
+            if encoding not in compression.CODECS:
+                continue
+            for level in levels:
+                row(encoding, level, *measure(bodies, encoding, level, args.repeat))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,70 @@
+"""Measure bytes per entry of a ledger held as dicts vs. the columnar Ledger
+
+Builds a ledger of --rows expense and income entries by replaying the
+generated user files (each row is a fresh dict, as json.load produces) and
+reports the traced memory of both representations.
+
+Run with: python benchmark_ledger_memory.py [--rows 1000000]
+"""
+import argparse
+import gc
+import json
+import os
+import time
+import tracemalloc
+
+from ledger import Ledger
+
+def load_template_entries(data_dir='data'):
+    """Serialized entries from every user file, used as templates for the big ledger"""
+    templates = []
+    for file in sorted(os.listdir(data_dir)):
+        if file.startswith('user_') and file.endswith('_data.json'):
+            with open(os.path.join(data_dir, file), 'r') as f:
+                user_data = json.load(f)
+            templates.extend(user_data['incomeData'])
+            templates.extend(user_data['expenseData'])
+    return json.dumps(templates)
+
+def build_dict_ledger(templates_json, rows):
+    """rows fresh dict entries, parsed from JSON like a request body would be"""
+    entries = []
+    while len(entries) < rows:
+        entries.extend(json.loads(templates_json))
+    del entries[rows:]
+    return entries
+
+def traced(build):
+    """(result, bytes still allocated by build, seconds)"""
+    gc.collect()
+    tracemalloc.start()
+    started = time.perf_counter()
+    result = build()
+    elapsed = time.perf_counter() - started
+    gc.collect()
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, current, elapsed
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare ledger memory per entry')
+    parser.add_argument('--rows', type=int, default=1000000)
+    args = parser.parse_args()
+
+    templates_json = load_template_entries()
+
+    entries, dict_bytes, dict_seconds = traced(lambda: build_dict_ledger(templates_json, args.rows))
+    ledger, ledger_bytes, ledger_seconds = traced(lambda: Ledger.from_entries(entries))
+
+    assert ledger.record(len(ledger) - 1) == entries[-1]
+
+    print(f"Rows: {len(entries):,}")
+    print(f"{'representation':<22}{'total MB':>10}{'bytes/entry':>13}{'build s':>9}")
+    print(f"{'list of dicts':<22}{dict_bytes / 1e6:>10.1f}{dict_bytes / len(entries):>13.1f}{dict_seconds:>9.2f}")
+    print(f"{'Ledger':<22}{ledger_bytes / 1e6:>10.1f}{ledger_bytes / len(entries):>13.1f}{ledger_seconds:>9.2f}")
+    print(f"  of which arrays: {ledger.nbytes / len(entries):.1f} bytes/entry, "
+          f"text tables: {sum(len(table) for table in ledger.text_tables.values())} strings")
+    print(f"Reduction: {dict_bytes / ledger_bytes:.1f}x")
+
+if __name__ == '__main__':
+    main()
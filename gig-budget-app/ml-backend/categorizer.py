@@ -0,0 +1,210 @@
+import itertools
+import re
+
+import numpy as np
+from scipy import sparse
+from scipy.special import expit
+from sklearn.linear_model import SGDClassifier
+from sklearn.preprocessing import normalize
+from sklearn.utils import murmurhash3_32
+
+from ledger import LedgerEntries, MISSING
+
+# Words, word pairs and the character 3-5-grams of each word of an expense's
+# title and description are hashed into one n_features-wide space, so there
+# is no vocabulary to hold in memory or to grow with new merchants.
+CATEGORIZER_PARAMS = {
+    "n_features": 2 ** 20,
+    "char_ngrams": (3, 5),
+    "alpha": 1e-4,
+    "max_iter": 50,
+    "random_state": 42
+}
+
+# Predictions below this confidence (the top category's share of the
+# one-vs-rest probabilities) leave an expense uncategorized
+MIN_CONFIDENCE = 0.25
+UNCATEGORIZED = 'Uncategorized'
+
+# Most expenses categorized in one request
+MAX_CATEGORIZE_ENTRIES = 100000
+
+# Hashed features of this many distinct words and word pairs are memoized;
+# expense texts reuse a small vocabulary, so most lookups hit
+TOKEN_CACHE_SIZE = 100000
+
+_TOKEN = re.compile(r'\w+')
+
+# Digits are all hashed as 0: order numbers and dates say nothing about the
+# category, and would otherwise make almost every word new
+_DIGITS = str.maketrans('123456789', '000000000')
+
+def expense_text(item):
+    return f"{item.get('title') or ''} {item.get('description') or ''}"
+
+def _unique_texts(entries):
+    """(distinct texts, index of each entry's text); ledger-backed entries are read from their text columns"""
+    if isinstance(entries, LedgerEntries):
+        free_text = entries.ledger.free_text
+        texts = (f"{title or ''} {description or ''}"
+                 for title, description in zip(free_text['title'], free_text['description']))
+    else:
+        texts = map(expense_text, entries)
+    positions = {}
+    inverse = np.fromiter((positions.setdefault(text, len(positions)) for text in texts),
+                          dtype=np.int64, count=len(entries))
+    return list(positions), inverse
+
+class NgramHasher:
+    """Hashing vectorizer over words, word pairs and per-word character n-grams
+
+    The hashed feature indices of each distinct word (its own and those of
+    its padded character n-grams) are computed once and reused, so turning
+    texts into rows costs a regex and some dict lookups per text.
+    """
+
+    def __init__(self, n_features, char_ngrams):
+        self.n_features = n_features
+        self.char_ngrams = tuple(char_ngrams)
+        self._cache = {}
+
+    def __getstate__(self):
+        return {"n_features": self.n_features, "char_ngrams": self.char_ngrams}
+
+    def __setstate__(self, state):
+        self.__dict__.update(state, _cache={})
+
+    def _remember(self, key, features):
+        if len(self._cache) >= TOKEN_CACHE_SIZE:
+            self._cache.clear()
+        self._cache[key] = features
+        return features
+
+    def _word_features(self, word):
+        padded, n_features = f' {word} ', self.n_features
+        low, high = self.char_ngrams
+        ngrams = [f'w:{word}'] + [padded[start:start + n] for n in range(low, high + 1)
+                                  for start in range(len(padded) - n + 1)]
+        return [murmurhash3_32(ngram, positive=True) % n_features for ngram in ngrams]
+
+    def transform(self, texts):
+        """CSR matrix of unit-normalized feature counts, one row per text"""
+        cache = self._cache
+        chunks, lengths = [], [0] * len(texts)
+        for position, text in enumerate(texts):
+            words = _TOKEN.findall(text.lower().translate(_DIGITS))
+            length = 0
+            for word in words:
+                features = cache.get(word)
+                if features is None:
+                    features = self._remember(word, self._word_features(word))
+                chunks.append(features)
+                length += len(features)
+            for pair in zip(words, words[1:]):
+                features = cache.get(pair)
+                if features is None:
+                    features = self._remember(pair, [murmurhash3_32(f'p:{pair[0]} {pair[1]}', positive=True)
+                                                     % self.n_features])
+                chunks.append(features)
+                length += len(features)
+            lengths[position] = length
+
+        indptr = np.zeros(len(texts) + 1, dtype=np.int64)
+        np.cumsum(lengths, out=indptr[1:])
+        indices = np.fromiter(itertools.chain.from_iterable(chunks), dtype=np.int32, count=int(indptr[-1]))
+        matrix = sparse.csr_matrix((np.ones(len(indices), dtype=np.float32), indices, indptr),
+                                   shape=(len(texts), self.n_features))
+        matrix.sum_duplicates()
+        return normalize(matrix)
+
+class ExpenseCategorizer:
+    """Linear classifier from an expense's free text to its category
+
+    The fitted weights are kept as a sparse (features x categories) matrix
+    holding only the features seen in training, so scoring a whole batch
+    is one sparse matrix product, and the model takes a few hundred KB.
+    """
+
+    def __init__(self, params=None, min_confidence=MIN_CONFIDENCE):
+        self.params = dict(CATEGORIZER_PARAMS if params is None else params)
+        self.min_confidence = min_confidence
+        self.hasher = NgramHasher(self.params["n_features"], self.params["char_ngrams"])
+        self.classes = np.empty(0, dtype=object)
+        self.weights = None  # Sparse (n_features x classes)
+        self.intercept = None
+
+    def vectorize(self, texts):
+        return self.hasher.transform(texts)
+
+    def fit(self, texts, categories, sample_weight=None):
+        if sample_weight is not None:
+            # Relative weights; raw repeat counts would scale the effective learning rate with them
+            sample_weight = np.asarray(sample_weight, dtype=np.float64) / np.mean(sample_weight)
+        classifier = SGDClassifier(loss='log_loss', alpha=self.params["alpha"], max_iter=self.params["max_iter"],
+                                   tol=None, random_state=self.params["random_state"])
+        classifier.fit(self.vectorize(texts), np.asarray(categories, dtype=object), sample_weight=sample_weight)
+
+        coef = classifier.coef_ if len(classifier.classes_) > 2 else np.vstack([-classifier.coef_, classifier.coef_])
+        intercept = classifier.intercept_ if len(classifier.classes_) > 2 else \
+            np.concatenate([-classifier.intercept_, classifier.intercept_])
+        self.classes = classifier.classes_
+        # Features never seen in training keep a weight of exactly zero, so the
+        # weights are very sparse; CSC keeps their memory proportional to that
+        self.weights = sparse.csc_matrix(coef.T.astype(np.float32))
+        self.weights.eliminate_zeros()
+        self.intercept = intercept.astype(np.float32)
+        return self
+
+    def predict_texts(self, texts):
+        """(category index, confidence) per text; confidence is 0 for texts with no word seen in training"""
+        products = self.vectorize(texts) @ self.weights
+        scores = products.toarray() + self.intercept
+        # One-vs-rest probabilities, normalized as SGDClassifier.predict_proba does
+        probabilities = expit(scores)
+        probabilities /= np.maximum(probabilities.sum(axis=1, keepdims=True), np.finfo(np.float32).tiny)
+        best = probabilities.argmax(axis=1)
+        confidence = probabilities[np.arange(len(best)), best]
+        # Without any known feature the scores are the intercepts alone, which say nothing about the text
+        return best, np.where(products.getnnz(axis=1) > 0, confidence, 0.0)
+
+    def categorize(self, entries):
+        """(category per entry, confidence per entry); low-confidence entries are UNCATEGORIZED
+
+        Entries that share a title and description are scored once.
+        """
+        texts, inverse = _unique_texts(entries)
+        if not texts:
+            return [], np.empty(0)
+        best, confidence = self.predict_texts(texts)
+        labels = np.where(confidence >= self.min_confidence, self.classes[best], UNCATEGORIZED)
+        return labels[inverse].tolist(), confidence[inverse]
+
+    @property
+    def nbytes(self):
+        return self.weights.data.nbytes + self.weights.indices.nbytes + self.weights.indptr.nbytes + \
+            self.intercept.nbytes + sum(len(str(category)) + 49 for category in self.classes)
+
+def missing_category_rows(expense_data):
+    """Positions of the expenses that have no category"""
+    if isinstance(expense_data, LedgerEntries):
+        return np.flatnonzero(expense_data.ledger.text_codes['category'] == MISSING)
+    return np.array([row for row, item in enumerate(expense_data) if not item.get('category')], dtype=np.int64)
+
+def fill_missing_categories(categorizer, expense_data):
+    """(expense_data with confidently predicted categories filled in, number of entries filled)
+
+    Returns expense_data itself when every expense already has a category.
+    """
+    missing = missing_category_rows(expense_data)
+    if not len(missing):
+        return expense_data, 0
+    uncategorized = [expense_data[row] for row in missing]
+    categories, _ = categorizer.categorize(uncategorized)
+
+    filled = list(expense_data)
+    count = 0
+    for row, item, category in zip(missing, uncategorized, categories):
+        if category != UNCATEGORIZED:
+            filled[row] = dict(item, category=category)
+            count += 1
+    return filled, count
@@ -0,0 +1,163 @@
+import bisect
+import hashlib
+import http.client
+import os
+import threading
+import time
+from urllib.parse import urlsplit
+
+# Multi-node mode. CLUSTER_NODES lists the base URL of every node (e.g.
+# "http://10.0.0.1:5000,http://10.0.0.2:5000") and CLUSTER_SELF is this
+# node's entry. Every node must be given the same list, and point MODELS_DIR,
+# DATASETS_DIR and PRECOMPUTED_RESULTS at the same shared directory, so any
+# node can serve any user and only the caches are per node.
+CLUSTER_NODES = [node.strip().rstrip('/') for node in os.environ.get('CLUSTER_NODES', '').split(',') if node.strip()]
+CLUSTER_SELF = os.environ.get('CLUSTER_SELF', '').rstrip('/')
+
+# "forward": proxy the request to the owner and relay its response.
+# "redirect": answer 307 with the owner's URL, so the client resends it there.
+CLUSTER_MODE = os.environ.get('CLUSTER_MODE', 'forward')
+
+CLUSTER_VNODES = int(os.environ.get('CLUSTER_VNODES', '160'))  # Ring points per node
+CLUSTER_FORWARD_TIMEOUT = float(os.environ.get('CLUSTER_FORWARD_TIMEOUT', '30'))
+CLUSTER_RETRY_AFTER = 10  # Seconds a node that failed a forward is served around
+
+# Set on forwarded requests; the receiving node serves them itself, so a
+# request is forwarded at most once even while two nodes disagree on the ring
+FORWARDED_HEADER = 'X-Cluster-Forwarded'
+
+# Hop-by-hop headers and the ones http.client sets itself
+_SKIPPED_HEADERS = frozenset({'connection', 'keep-alive', 'transfer-encoding', 'content-length', 'host',
+                              'accept-encoding', 'content-encoding'})
+
+def _point(key):
+    return int.from_bytes(hashlib.blake2b(key.encode('utf-8'), digest_size=8).digest(), 'big')
+
+class HashRing:
+    """Consistent-hash ring of nodes
+
+    Each node is hashed to vnodes points on a 64-bit ring and a key belongs
+    to the first point at or after its own hash. Adding or removing a node
+    only moves the keys between its points and their predecessors, about
+    1/N of them, so the other nodes keep their users and warm caches.
+    """
+
+    def __init__(self, nodes, vnodes=CLUSTER_VNODES):
+        self.nodes = sorted(set(nodes))
+        self.vnodes = vnodes
+        points = sorted((_point(f'{node}#{replica}'), node) for node in self.nodes for replica in range(vnodes))
+        self._points = [point for point, _ in points]
+        self._owners = [node for _, node in points]
+
+    def __len__(self):
+        return len(self.nodes)
+
+    def owner(self, key, skip=()):
+        """Node owning key; nodes in skip are passed over for the next one on the ring"""
+        if not self._points:
+            return None
+        start = bisect.bisect_left(self._points, _point(str(key)))
+        for offset in range(len(self._points)):
+            node = self._owners[(start + offset) % len(self._points)]
+            if node not in skip:
+                return node
+        return None
+
+class Cluster:
+    """This node's view of the ring, and forwarding of requests to the owner node"""
+
+    def __init__(self, nodes, self_node, mode=CLUSTER_MODE, vnodes=CLUSTER_VNODES, timeout=CLUSTER_FORWARD_TIMEOUT):
+        if self_node not in nodes:
+            raise ValueError(f"CLUSTER_SELF {self_node!r} is not one of CLUSTER_NODES")
+        if mode not in ('forward', 'redirect'):
+            raise ValueError(f"CLUSTER_MODE must be 'forward' or 'redirect', not {mode!r}")
+        self.ring = HashRing(nodes, vnodes)
+        self.self_node = self_node
+        self.mode = mode
+        self.timeout = timeout
+        self.stats = {"local": 0, "forwarded": 0, "redirected": 0, "forward_failures": 0}
+        self._down = {}  # node -> time it failed
+        self._local = threading.local()  # Per-thread keep-alive connections to the other nodes
+
+    @classmethod
+    def from_environ(cls):
+        """The configured cluster, or None when this node runs on its own"""
+        if len(CLUSTER_NODES) < 2:
+            return None
+        return cls(CLUSTER_NODES, CLUSTER_SELF)
+
+    def owner(self, key):
+        """Owner of key, skipping nodes that recently failed a forward"""
+        now = time.monotonic()
+        down = {node for node, failed_at in list(self._down.items()) if now - failed_at < CLUSTER_RETRY_AFTER}
+        return self.ring.owner(key, skip=down - {self.self_node})
+
+    def _count(self, outcome):
+        self.stats[outcome] += 1
+
+    def served_locally(self):
+        self._count('local')
+
+    def redirected(self):
+        self._count('redirected')
+
+    def _connection(self, node):
+        connections = getattr(self._local, 'connections', None)
+        if connections is None:
+            connections = self._local.connections = {}
+        connection = connections.get(node)
+        if connection is None:
+            parts = urlsplit(node)
+            connection_class = http.client.HTTPSConnection if parts.scheme == 'https' else http.client.HTTPConnection
+            connection = connections[node] = connection_class(parts.netloc, timeout=self.timeout)
+        return connection
+
+    def _drop_connection(self, node):
+        connection = self._local.connections.pop(node, None)
+        if connection is not None:
+            connection.close()
+
+    def forward(self, node, method, path, body, headers):
+        """(status, headers, body) of the request replayed on node, or None if it could not be reached
+
+        A request on a reused keep-alive connection that the node has closed
+        is retried once on a new connection.
+        """
+        headers = {name: value for name, value in headers if name.lower() not in _SKIPPED_HEADERS}
+        headers[FORWARDED_HEADER] = self.self_node
+        for attempt in range(2):
+            connection = self._connection(node)
+            try:
+                connection.request(method, path, body=body, headers=headers)
+                response = connection.getresponse()
+                payload = response.read()
+            except (http.client.RemoteDisconnected, ConnectionResetError, BrokenPipeError) as e:
+                self._drop_connection(node)
+                if attempt == 0:
+                    continue
+                error = e
+            except (OSError, http.client.HTTPException) as e:
+                self._drop_connection(node)
+                error = e
+            else:
+                self._down.pop(node, None)
+                self._count('forwarded')
+                response_headers = [(name, value) for name, value in response.getheaders()
+                                    if name.lower() not in _SKIPPED_HEADERS]
+                return response.status, response_headers, payload
+            break
+
+        print(f"Forwarding to {node} failed ({error}); serving locally for {CLUSTER_RETRY_AFTER}s")
+        self._down[node] = time.monotonic()
+        self._count('forward_failures')
+        return None
+
+    def report(self):
+        now = time.monotonic()
+        return {
+            "self": self.self_node,
+            "mode": self.mode,
+            "nodes": self.ring.nodes,
+            "down": sorted(node for node, failed_at in self._down.items() if now - failed_at < CLUSTER_RETRY_AFTER),
+            "requests": dict(self.stats)
+        }
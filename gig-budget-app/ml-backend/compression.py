@@ -0,0 +1,201 @@
+import io
+import json
+import os
+import zlib
+
+from werkzeug.wsgi import get_input_stream
+
+try:
+    import zstandard
+except ImportError:  # zstd is optional; gzip/deflate always work
+    zstandard = None
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Responses smaller than this are sent as-is; compressing them costs more than it saves
+COMPRESSION_MIN_BYTES = int(os.environ.get('COMPRESSION_MIN_BYTES', '1024'))
+
+# Levels trade CPU for size: gzip 1-9, zstd 1-19, brotli quality 0-11
+GZIP_LEVEL = int(os.environ.get('GZIP_LEVEL', '6'))
+ZSTD_LEVEL = int(os.environ.get('ZSTD_LEVEL', '3'))
+BROTLI_QUALITY = int(os.environ.get('BROTLI_QUALITY', '4'))
+
+# Server preference when a client accepts several encodings equally
+COMPRESSION_PREFERENCE = os.environ.get('COMPRESSION_PREFERENCE', 'zstd,br,gzip,deflate').split(',')
+
+# Upper bound on a decoded request body, so a small compressed upload cannot expand without limit
+MAX_DECODED_BODY_BYTES = int(os.environ.get('MAX_DECODED_BODY_BYTES', str(64 * 1024 * 1024)))
+
+CHUNK_SIZE = 64 * 1024
+COMPRESSIBLE_TYPES = ('application/json', 'text/')
+
+class BodyTooLarge(Exception):
+    """A request body decoded to more than MAX_DECODED_BODY_BYTES"""
+
+class UnsupportedEncoding(Exception):
+    """A request used a Content-Encoding this server cannot decode"""
+
+def _compress_gzip(data, level=None):
+    compressor = zlib.compressobj(GZIP_LEVEL if level is None else level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    return compressor.compress(data) + compressor.flush()
+
+def _compress_deflate(data, level=None):
+    return zlib.compress(data, GZIP_LEVEL if level is None else level)
+
+def _compress_zstd(data, level=None):
+    return zstandard.ZstdCompressor(level=ZSTD_LEVEL if level is None else level).compress(data)
+
+def _compress_brotli(data, level=None):
+    return brotli.compress(data, quality=BROTLI_QUALITY if level is None else level)
+
+def _zlib_chunks(stream, wbits):
+    decompressor = zlib.decompressobj(wbits)
+    while True:
+        chunk = stream.read(CHUNK_SIZE)
+        if not chunk:
+            break
+        # Bound each output piece; input that did not fit is kept in unconsumed_tail
+        while chunk:
+            yield decompressor.decompress(chunk, CHUNK_SIZE)
+            chunk = decompressor.unconsumed_tail
+    yield decompressor.flush()
+    if not decompressor.eof:
+        raise EOFError('compressed body is truncated')
+
+def _zstd_chunks(stream):
+    reader = zstandard.ZstdDecompressor().stream_reader(stream, read_across_frames=True)
+    while True:
+        chunk = reader.read(CHUNK_SIZE)
+        if not chunk:
+            break
+        yield chunk
+
+def _brotli_chunks(stream):
+    decompressor = brotli.Decompressor()
+    while True:
+        chunk = stream.read(CHUNK_SIZE)
+        if not chunk:
+            break
+        yield decompressor.process(chunk)
+    if not decompressor.is_finished():
+        raise EOFError('compressed body is truncated')
+
+# Content-Encoding name -> (compress(data, level), decoded chunks of a stream)
+CODECS = {
+    'gzip': (_compress_gzip, lambda stream: _zlib_chunks(stream, 16 + zlib.MAX_WBITS)),
+    'deflate': (_compress_deflate, lambda stream: _zlib_chunks(stream, zlib.MAX_WBITS)),
+}
+DECODE_ERRORS = (zlib.error, EOFError)
+if zstandard is not None:
+    CODECS['zstd'] = (_compress_zstd, _zstd_chunks)
+    DECODE_ERRORS += (zstandard.ZstdError,)
+if brotli is not None:
+    CODECS['br'] = (_compress_brotli, _brotli_chunks)
+    DECODE_ERRORS += (brotli.error,)
+
+def compress(data, encoding, level=None):
+    return CODECS[encoding][0](data, level)
+
+def decode_stream(stream, encoding, max_bytes=MAX_DECODED_BODY_BYTES):
+    """Decompress a readable stream chunk by chunk, stopping once max_bytes is exceeded"""
+    if encoding not in CODECS:
+        raise UnsupportedEncoding(encoding)
+    output = io.BytesIO()
+    for chunk in CODECS[encoding][1](stream):
+        output.write(chunk)
+        if output.tell() > max_bytes:
+            raise BodyTooLarge()
+    return output.getvalue()
+
+def decode_body(body, encoding, max_bytes=MAX_DECODED_BODY_BYTES):
+    return decode_stream(io.BytesIO(body), encoding, max_bytes)
+
+def choose_encoding(accept_encoding):
+    """Best supported encoding for an Accept-Encoding header, or None"""
+    accepted = {}
+    for part in (accept_encoding or '').split(','):
+        name, _, params = part.strip().partition(';')
+        quality = 1.0
+        params = params.strip()
+        if params.startswith('q='):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        if name:
+            accepted[name.strip().lower()] = quality
+
+    candidates = [name for name in COMPRESSION_PREFERENCE
+                  if name in CODECS and accepted.get(name, accepted.get('*', 0)) > 0]
+    if not candidates:
+        return None
+    return max(candidates, key=lambda name: accepted.get(name, accepted.get('*', 0)))
+
+def should_compress(content_type, size, min_bytes=COMPRESSION_MIN_BYTES):
+    return size >= min_bytes and content_type is not None and content_type.startswith(COMPRESSIBLE_TYPES)
+
+class CompressionMiddleware:
+    """WSGI middleware: decodes compressed request bodies and compresses large responses
+
+    Request bodies with a Content-Encoding the server supports are decoded
+    before Flask sees them (413 past MAX_DECODED_BODY_BYTES, 415 for other
+    encodings). Responses of at least COMPRESSION_MIN_BYTES are encoded with
+    the best encoding the client accepts.
+    """
+
+    def __init__(self, wsgi_app, min_bytes=COMPRESSION_MIN_BYTES):
+        self.wsgi_app = wsgi_app
+        self.min_bytes = min_bytes
+
+    def __call__(self, environ, start_response):
+        encoding = environ.get('HTTP_CONTENT_ENCODING', '').strip().lower()
+        if encoding and encoding != 'identity':
+            try:
+                body = decode_stream(get_input_stream(environ), encoding)
+            except UnsupportedEncoding:
+                return self._error(start_response, '415 Unsupported Media Type', f'Unsupported Content-Encoding: {encoding}')
+            except BodyTooLarge:
+                return self._error(start_response, '413 Payload Too Large', 'Decoded request body is too large')
+            except DECODE_ERRORS as e:
+                return self._error(start_response, '400 Bad Request', f'Invalid {encoding} body: {e}')
+            environ['wsgi.input'] = io.BytesIO(body)
+            environ['CONTENT_LENGTH'] = str(len(body))
+            del environ['HTTP_CONTENT_ENCODING']
+
+        response_encoding = choose_encoding(environ.get('HTTP_ACCEPT_ENCODING'))
+        if response_encoding is None:
+            return self.wsgi_app(environ, start_response)
+
+        captured = {}
+
+        def capture(status, headers, exc_info=None):
+            captured['status'], captured['headers'] = status, headers
+            return lambda data: captured.setdefault('written', []).append(data)
+
+        app_iter = self.wsgi_app(environ, capture)
+        try:
+            chunks = list(app_iter)
+            body = b''.join(captured.get('written', []) + chunks)
+        finally:
+            if hasattr(app_iter, 'close'):
+                app_iter.close()
+
+        headers = [(name, value) for name, value in captured['headers'] if name.lower() != 'content-length']
+        header_names = {name.lower(): value for name, value in headers}
+        if should_compress(header_names.get('content-type'), len(body), self.min_bytes) \
+                and 'content-encoding' not in header_names:
+            body = compress(body, response_encoding)
+            headers.append(('Content-Encoding', response_encoding))
+            headers.append(('Vary', 'Accept-Encoding'))
+        headers.append(('Content-Length', str(len(body))))
+        start_response(captured['status'], headers)
+        return [body]
+
+    @staticmethod
+    def _error(start_response, status, message):
+        body = json.dumps({"error": message}).encode('utf-8')
+        start_response(status, [('Content-Type', 'application/json'), ('Content-Length', str(len(body)))])
+        return [body]
@@ -0,0 +1,284 @@
+import json
+import os
+import re
+import shutil
+import tempfile
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+import numpy as np
+
+from ledger import Ledger, LedgerEntries
+
+# Every version of a dataset is an immutable file under DATASETS_DIR/<id>/;
+# the newest ones are also kept in memory, bounded by count and bytes
+DATASETS_DIR = os.environ.get('DATASETS_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'datasets'))
+DATASET_CACHE_SIZE = int(os.environ.get('DATASET_CACHE_SIZE', '256'))
+DATASET_CACHE_MAX_BYTES = int(os.environ.get('DATASET_CACHE_MAX_BYTES', str(128 * 1024 * 1024)))
+KEEP_DATASET_VERSIONS = 2
+
+# Datasets not read or written for DATASET_TTL seconds are deleted from disk.
+# Access refreshes the directory's mtime (at most once per DATASET_TOUCH_INTERVAL
+# per process), and uploads sweep the directory at most every DATASET_SWEEP_INTERVAL.
+DATASET_TTL = int(os.environ.get('DATASET_TTL', str(24 * 3600)))
+DATASET_TOUCH_INTERVAL = 60
+DATASET_SWEEP_INTERVAL = 300
+
+_DATASET_ID = re.compile(r'^[0-9a-f]{32}$')
+_VERSION_FILE = re.compile(r'^(\d{8})\.npz$')
+
+class VersionConflict(Exception):
+    """A delta was posted against a version that is no longer the latest"""
+
+    def __init__(self, current_version):
+        super().__init__(f'dataset is at version {current_version}')
+        self.current_version = current_version
+
+class Dataset:
+    """One version of a worker's income and expense ledgers"""
+
+    def __init__(self, dataset_id, version, income, expense, edits=0):
+        self.dataset_id = dataset_id
+        self.version = version
+        self.income = income
+        self.expense = expense
+        self.edits = edits  # Number of versions that changed existing entries rather than appending
+
+    @property
+    def key(self):
+        return f'{self.dataset_id}@{self.version}'
+
+    @property
+    def nbytes(self):
+        return self.income.nbytes + self.expense.nbytes
+
+    def payload(self):
+        """Request fields the analysis handlers read, backed by the stored ledgers"""
+        return {
+            "incomeData": LedgerEntries(self.income, key=f'{self.key}/income'),
+            "expenseData": LedgerEntries(self.expense, key=f'{self.key}/expense'),
+            # Incremental seasonality and anomaly state follows appends; an edit starts afresh.
+            # The request keeps its own userId for model routing and precomputed results.
+            "stateKey": f'dataset:{self.dataset_id}:{self.edits}'
+        }
+
+    def summary(self):
+        return {
+            "datasetId": self.dataset_id,
+            "version": self.version,
+            "incomeCount": len(self.income),
+            "expenseCount": len(self.expense)
+        }
+
+    def with_delta(self, income_data, expense_data):
+        """Next version: entries whose id is already present replace it, the rest are appended"""
+        income, income_edited = _merge(self.income, income_data)
+        expense, expense_edited = _merge(self.expense, expense_data)
+        edits = self.edits + (1 if income_edited or expense_edited else 0)
+        return Dataset(self.dataset_id, self.version + 1, income, expense, edits)
+
+def _merge(ledger, entries):
+    """(ledger with entries applied, whether any existing entry was replaced)"""
+    if not entries:
+        return ledger, False
+
+    rows_by_id = {entry_id: row for row, entry_id in enumerate(ledger.row_ids()) if entry_id is not None}
+    replaced_rows, replacements, appended = [], [], []
+    for item in entries:
+        row = rows_by_id.get(item.get('id'))
+        if row is None:
+            appended.append(item)
+        else:
+            replaced_rows.append(row)
+            replacements.append(item)
+
+    if replacements:
+        ledger = ledger.with_rows_replaced(replaced_rows, replacements)
+    if appended:
+        ledger = Ledger.concat([ledger, Ledger.from_entries(appended)])
+    return ledger, bool(replacements)
+
+class DatasetStore:
+    """Datasets on disk with an LRU of recent versions in memory
+
+    Versions are written once and never modified, so several processes can
+    share one directory: the first writer of version N+1 wins and any other
+    delta against version N gets a VersionConflict. Datasets idle for longer
+    than ttl seconds are swept; a client using one gets a 404 and uploads again.
+    """
+
+    def __init__(self, directory=DATASETS_DIR, max_cached=DATASET_CACHE_SIZE, max_bytes=DATASET_CACHE_MAX_BYTES,
+                 ttl=DATASET_TTL):
+        self.directory = directory
+        self.max_cached = max_cached
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.nbytes = 0
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+        self._touched = {}  # dataset id -> monotonic time its mtime was last refreshed by this process
+        self._last_sweep = time.monotonic()
+
+    def _dataset_dir(self, dataset_id):
+        if not isinstance(dataset_id, str) or not _DATASET_ID.match(dataset_id):
+            raise KeyError(dataset_id)
+        return os.path.join(self.directory, dataset_id)
+
+    def _version_path(self, dataset_id, version):
+        return os.path.join(self._dataset_dir(dataset_id), f'{version:08d}.npz')
+
+    def latest_version(self, dataset_id):
+        """Newest version on disk, or None for an unknown dataset"""
+        try:
+            names = os.listdir(self._dataset_dir(dataset_id))
+        except (FileNotFoundError, KeyError):
+            return None
+        versions = [int(match.group(1)) for match in map(_VERSION_FILE.match, names) if match]
+        return max(versions) if versions else None
+
+    def create(self, income_data, expense_data):
+        self.sweep()
+        dataset = Dataset(uuid.uuid4().hex, 1, Ledger.from_entries(income_data), Ledger.from_entries(expense_data))
+        os.makedirs(self._dataset_dir(dataset.dataset_id), exist_ok=True)
+        self._write(dataset)
+        self._remember(dataset)
+        return dataset
+
+    def _touch(self, dataset_id):
+        """Mark a dataset as recently used, for the sweep of every process sharing the directory"""
+        now = time.monotonic()
+        if now - self._touched.get(dataset_id, 0.0) < DATASET_TOUCH_INTERVAL:
+            return
+        self._touched[dataset_id] = now
+        try:
+            os.utime(self._dataset_dir(dataset_id))
+        except FileNotFoundError:
+            pass
+
+    def sweep(self, force=False):
+        """Delete datasets unused for ttl seconds; runs at most every DATASET_SWEEP_INTERVAL unless forced
+
+        Returns the number of datasets deleted.
+        """
+        now = time.monotonic()
+        if self.ttl <= 0 or (not force and now - self._last_sweep < DATASET_SWEEP_INTERVAL):
+            return 0
+        self._last_sweep = now
+        self._touched = {dataset_id: touched for dataset_id, touched in self._touched.items()
+                         if now - touched < self.ttl}
+        try:
+            names = os.listdir(self.directory)
+        except FileNotFoundError:
+            return 0
+
+        expired_before = time.time() - self.ttl
+        removed = 0
+        for dataset_id in filter(_DATASET_ID.match, names):
+            path = os.path.join(self.directory, dataset_id)
+            try:
+                if os.stat(path).st_mtime >= expired_before:
+                    continue
+            except FileNotFoundError:
+                continue
+            shutil.rmtree(path, ignore_errors=True)
+            removed += 1
+            with self._lock:
+                evicted = self._cache.pop(dataset_id, None)
+                if evicted is not None:
+                    self.nbytes -= evicted.nbytes
+        if removed:
+            print(f"Swept {removed} datasets idle for more than {self.ttl}s")
+        return removed
+
+    def get(self, dataset_id):
+        """Latest version of a dataset, or None if it does not exist"""
+        version = self.latest_version(dataset_id)
+        if version is None:
+            return None
+        self._touch(dataset_id)
+        with self._lock:
+            dataset = self._cache.get(dataset_id)
+            if dataset is not None and dataset.version == version:
+                self._cache.move_to_end(dataset_id)
+                return dataset
+        try:
+            dataset = self._read(dataset_id, version)
+        except FileNotFoundError:
+            return self.get(dataset_id)  # Pruned by a newer write in between; read that one
+        self._remember(dataset)
+        return dataset
+
+    def apply_delta(self, dataset_id, base_version, income_data, expense_data):
+        """Write the next version; raises KeyError or VersionConflict"""
+        current = self.get(dataset_id)
+        if current is None:
+            raise KeyError(dataset_id)
+        if current.version != base_version:
+            raise VersionConflict(current.version)
+
+        dataset = current.with_delta(income_data, expense_data)
+        if not self._write(dataset):
+            raise VersionConflict(self.latest_version(dataset_id))
+        self._remember(dataset)
+        self._prune(dataset_id, dataset.version)
+        return dataset
+
+    def _write(self, dataset):
+        """Publish a version file; False if another writer already created it"""
+        arrays = {**dataset.income.to_arrays('income_'), **dataset.expense.to_arrays('expense_')}
+        arrays['meta'] = np.array(json.dumps({"edits": dataset.edits}))
+
+        directory = self._dataset_dir(dataset.dataset_id)
+        fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                np.savez(f, **arrays)
+                f.flush()
+                os.fsync(f.fileno())
+            # link() fails if the version exists, which makes the publish a compare-and-set
+            os.link(tmp_path, self._version_path(dataset.dataset_id, dataset.version))
+            return True
+        except FileExistsError:
+            return False
+        finally:
+            os.remove(tmp_path)
+
+    def _read(self, dataset_id, version):
+        with np.load(self._version_path(dataset_id, version)) as arrays:
+            meta = json.loads(str(arrays['meta']))
+            return Dataset(dataset_id, version, Ledger.from_arrays(arrays, 'income_'),
+                           Ledger.from_arrays(arrays, 'expense_'), meta['edits'])
+
+    def _prune(self, dataset_id, version):
+        """Drop the version that just fell out of the retained window"""
+        stale = version - KEEP_DATASET_VERSIONS
+        if stale >= 1:
+            try:
+                os.remove(self._version_path(dataset_id, stale))
+            except FileNotFoundError:
+                pass
+
+    @property
+    def cached_count(self):
+        """Datasets currently held in memory"""
+        return len(self._cache)
+
+    def shrink(self, max_bytes):
+        """Drop least recently used datasets from memory (not from disk) until at most max_bytes remain"""
+        with self._lock:
+            while self._cache and self.nbytes > max_bytes:
+                _, evicted = self._cache.popitem(last=False)
+                self.nbytes -= evicted.nbytes
+
+    def _remember(self, dataset):
+        with self._lock:
+            previous = self._cache.pop(dataset.dataset_id, None)
+            if previous is not None:
+                self.nbytes -= previous.nbytes
+            self._cache[dataset.dataset_id] = dataset
+            self.nbytes += dataset.nbytes
+            while self._cache and (len(self._cache) > self.max_cached or self.nbytes > self.max_bytes):
+                _, evicted = self._cache.popitem(last=False)
+                self.nbytes -= evicted.nbytes
@@ -0,0 +1,121 @@
+"""Compare the multi-tenant income forecaster with one model per user
+
+Generates a population of workers with train_models' generators, holds out
+the last --holdout-days of each worker's income, and fits both designs on
+the rest. Reports holdout accuracy (MAE/RMSE per entry), model bytes on disk
+and in memory, load time, fit time and the latency of one 90-day forecast.
+
+Run with: python evaluate_multi_tenant.py [--users 60] [--months 12]
+"""
+import argparse
+import io
+import random
+import time
+import tracemalloc
+
+import joblib
+import numpy as np
+
+import train_models
+from features import calendar_features, parse_dates
+from multi_tenant import MultiTenantForecaster
+
+FORECAST_DAYS = 90
+
+def generate_population(users, months, first_user_id=1000):
+    """[{"user_id", "income_data", "rates"}] for generated workers"""
+    population = []
+    for user_id in range(first_user_id, first_user_id + users):
+        random.seed(user_id)
+        population.append({
+            "user_id": user_id,
+            "income_data": train_models.generate_realistic_gig_income(months=months, user_id=user_id),
+            "rates": MultiTenantForecaster.profile_rates(train_models.get_user_personality(user_id))
+        })
+    return population
+
+def split_holdout(population, holdout_days):
+    """(training users, {user_id: holdout entries}) split at each user's last date - holdout_days"""
+    training, holdout = [], {}
+    for user in population:
+        days = parse_dates([item['date'] for item in user['income_data']])
+        cutoff = days.max() - holdout_days
+        training.append(dict(user, income_data=[item for item, day in zip(user['income_data'], days) if day <= cutoff]))
+        holdout[user['user_id']] = [item for item, day in zip(user['income_data'], days) if day > cutoff]
+    return training, holdout
+
+def serialize(model):
+    buffer = io.BytesIO()
+    joblib.dump(model, buffer)
+    return buffer.getvalue()
+
+def load_cost(blobs):
+    """(seconds, traced bytes) to load every serialized model"""
+    tracemalloc.start()
+    started = time.perf_counter()
+    loaded = [joblib.load(io.BytesIO(blob)) for blob in blobs]
+    elapsed = time.perf_counter() - started
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del loaded
+    return elapsed, current
+
+def errors(predictions, holdout):
+    residuals = np.concatenate([predictions[user_id] - np.array([item['amount'] for item in entries])
+                                for user_id, entries in holdout.items() if len(entries)])
+    return float(np.abs(residuals).mean()), float(np.sqrt((residuals ** 2).mean()))
+
+def forecast_latency(predict, repeat=20):
+    """Median seconds of one FORECAST_DAYS-day prediction call"""
+    horizon = calendar_features(np.datetime64('2025-01-01') + np.arange(FORECAST_DAYS))
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        predict(horizon)
+        timings.append(time.perf_counter() - started)
+    return float(np.median(timings))
+
+def main():
+    parser = argparse.ArgumentParser(description='Evaluate the multi-tenant forecaster against per-user models')
+    parser.add_argument('--users', type=int, default=60)
+    parser.add_argument('--months', type=int, default=12)
+    parser.add_argument('--holdout-days', type=int, default=60)
+    args = parser.parse_args()
+
+    print(f"Generating {args.users} workers with {args.months} months of income...")
+    training, holdout = split_holdout(generate_population(args.users, args.months), args.holdout_days)
+    rows = sum(len(user['income_data']) for user in training)
+    print(f"  {rows} training entries, {sum(len(entries) for entries in holdout.values())} holdout entries")
+
+    results = {}
+
+    # One model per user
+    started = time.perf_counter()
+    per_user = {user['user_id']: train_models.train_income_forecast_model(user['income_data']) for user in training}
+    fit_seconds = time.perf_counter() - started
+    blobs = [serialize(model) for model in per_user.values()]
+    predictions = {user_id: per_user[user_id].predict(calendar_features([item['date'] for item in entries]))
+                   for user_id, entries in holdout.items() if len(entries)}
+    sample_user = training[0]['user_id']
+    results['per-user models'] = (errors(predictions, holdout), fit_seconds, blobs,
+                                  forecast_latency(per_user[sample_user].predict))
+
+    # One shared model plus per-user biases
+    started = time.perf_counter()
+    shared = MultiTenantForecaster().fit(training)
+    fit_seconds = time.perf_counter() - started
+    predictions = {user_id: shared.predict(user_id, [item['date'] for item in entries])
+                   for user_id, entries in holdout.items() if len(entries)}
+    results['multi-tenant'] = (errors(predictions, holdout), fit_seconds, [serialize(shared)],
+                               forecast_latency(shared.for_user(sample_user).predict))
+
+    print(f"\n{'design':<18}{'MAE':>9}{'RMSE':>9}{'files':>7}{'disk KB':>10}{'memory KB':>11}"
+          f"{'load ms':>9}{'fit s':>8}{'90d predict ms':>16}")
+    for name, ((mae, rmse), fit_seconds, blobs, latency) in results.items():
+        load_seconds, memory = load_cost(blobs)
+        disk = sum(len(blob) for blob in blobs)
+        print(f"{name:<18}{mae:>9.1f}{rmse:>9.1f}{len(blobs):>7}{disk / 1024:>10.1f}{memory / 1024:>11.1f}"
+              f"{load_seconds * 1000:>9.1f}{fit_seconds:>8.2f}{latency * 1000:>16.2f}")
+
+if __name__ == '__main__':
+    main()
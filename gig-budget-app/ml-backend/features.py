@@ -0,0 +1,123 @@
+import numpy as np
+
+# Calendar features are looked up by day ordinal (days since 1970-01-01) in a
+# table built once at import; dates outside the table are computed directly
+CALENDAR_START = np.datetime64('2000-01-01')
+CALENDAR_END = np.datetime64('2100-01-01')
+
+# Column order of calendar_features; the income forecaster is trained on these
+CALENDAR_COLUMNS = ('day_of_week', 'day_of_month', 'month')
+
+# Default history features: daily income N days before, and the mean daily
+# income over the N days before (the day itself is never included)
+LAGS = (1, 7, 28)
+WINDOWS = (7, 28)
+
+def _compute_calendar(days):
+    """[day_of_week (Monday=0), day_of_month, month] for datetime64[D] values"""
+    months = days.astype('datetime64[M]')
+    return np.column_stack([
+        (days.astype(np.int64) + 3) % 7,  # 1970-01-01 was a Thursday
+        (days - months).astype(np.int64) + 1,
+        months.astype(np.int64) % 12 + 1
+    ])
+
+_CALENDAR_OFFSET = CALENDAR_START.astype(np.int64)
+_CALENDAR = _compute_calendar(np.arange(CALENDAR_START, CALENDAR_END)).astype(np.int8)
+
+def parse_dates(dates):
+    """ISO 'YYYY-MM-DD' strings (or datetime64 values) as a datetime64[D] array
+
+    numpy parses the fixed ISO format directly; it is faster than
+    pd.to_datetime at every input size, and much faster on small payloads.
+    """
+    if isinstance(dates, np.ndarray) and np.issubdtype(dates.dtype, np.datetime64):
+        return dates.astype('datetime64[D]')
+    return np.array([value[:10] for value in dates], dtype='datetime64[D]')
+
+def calendar_features(dates):
+    """Integer matrix of CALENDAR_COLUMNS for ISO date strings or datetime64 days"""
+    days = parse_dates(dates)
+    ordinals = days.astype(np.int64) - _CALENDAR_OFFSET
+    in_table = (ordinals >= 0) & (ordinals < len(_CALENDAR))
+    if in_table.all():
+        return _CALENDAR[ordinals].astype(np.int64)
+
+    features = np.empty((len(days), len(CALENDAR_COLUMNS)), dtype=np.int64)
+    features[in_table] = _CALENDAR[ordinals[in_table]]
+    features[~in_table] = _compute_calendar(days[~in_table])
+    return features
+
+def entry_columns(entries):
+    """(datetime64[D] dates, float64 amounts) of income or expense entries, without pandas"""
+    ledger = getattr(entries, 'ledger', None)  # A ledger.LedgerEntries view
+    if ledger is not None:
+        return ledger.days, ledger.amounts
+    days = parse_dates([item['date'] for item in entries])
+    amounts = np.fromiter((item['amount'] for item in entries), dtype=np.float64, count=len(entries))
+    return days, amounts
+
+def daily_series(days, amounts, start=None, end=None):
+    """(every day from start to end, total amount on each day), zero on days without entries"""
+    days = parse_dates(days)
+    start = days.min() if start is None else np.datetime64(start, 'D')
+    end = days.max() if end is None else np.datetime64(end, 'D')
+    calendar = np.arange(start, end + 1)
+    offsets = (days - start).astype(np.int64)
+    inside = (offsets >= 0) & (offsets < len(calendar))
+    totals = np.bincount(offsets[inside], weights=np.asarray(amounts, dtype=np.float64)[inside],
+                         minlength=len(calendar))
+    return calendar, totals
+
+def lag_features(series, lags=LAGS):
+    """Matrix whose column j is series shifted by lags[j] (NaN where there is no history)"""
+    series = np.asarray(series, dtype=np.float64)
+    features = np.full((len(series), len(lags)), np.nan)
+    for column, lag in enumerate(lags):
+        if lag < len(series):
+            features[lag:, column] = series[:-lag]
+    return features
+
+def rolling_means(series, windows=WINDOWS):
+    """Matrix whose column j is the mean of the windows[j] values before each position
+
+    Uses one cumulative sum, so every window costs O(n) regardless of its
+    length. Positions with less history average what there is; the first
+    position is NaN.
+    """
+    series = np.asarray(series, dtype=np.float64)
+    cumulative = np.concatenate([[0.0], np.cumsum(series)])
+    positions = np.arange(len(series))
+    features = np.empty((len(series), len(windows)))
+    for column, window in enumerate(windows):
+        starts = np.maximum(positions - window, 0)
+        counts = positions - starts
+        with np.errstate(invalid='ignore', divide='ignore'):
+            features[:, column] = (cumulative[positions] - cumulative[starts]) / counts
+    return features
+
+def history_features(days, amounts, at=None, gap=0, lags=LAGS, windows=WINDOWS):
+    """Lag and rolling-mean features of the daily income series, on each of the `at` days
+
+    `at` defaults to the entry days themselves. With a gap, the features of a
+    day are those of the day `gap` days earlier, so a model trained on them can
+    forecast up to `gap` days past the last entry. Anything that would need
+    income after the last entry, or before the first, is NaN. Returns a
+    (len(at), len(lags) + len(windows)) matrix.
+    """
+    days = parse_dates(days)
+    at = days if at is None else parse_dates(at)
+    features = np.full((len(at), len(lags) + len(windows)), np.nan)
+    if len(days) == 0 or len(at) == 0:
+        return features
+
+    # Known totals, then NaN up to the last requested day, which keeps unknown income out of every feature
+    calendar, totals = daily_series(days, amounts)
+    end = max(calendar[-1], at.max() - gap)
+    series = np.concatenate([totals, np.full(int((end - calendar[-1]).astype(np.int64)), np.nan)])
+    per_day = np.hstack([lag_features(series, lags), rolling_means(series, windows)])
+
+    positions = (at - calendar[0]).astype(np.int64) - gap
+    known = positions >= 0
+    features[known] = per_day[positions[known]]
+    return features
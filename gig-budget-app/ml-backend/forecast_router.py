@@ -0,0 +1,190 @@
+import hashlib
+import os
+import queue
+import re
+import threading
+from collections import Counter
+
+import numpy as np
+
+from appends import entry_rows
+from features import entry_columns
+from model_store import build_lock
+
+GLOBAL_MODEL = 'income_forecaster'
+MULTI_TENANT_MODEL = 'income_forecaster_multi_tenant'
+CATEGORY_MODEL_PREFIX = 'income_forecaster_category_'
+USER_MODEL_PREFIX = 'income_forecaster_user_'
+
+# Per-user fits waiting in the background queue; when it is full new users are
+# not queued, keep being served by a shared model and are retried later
+MAX_QUEUED_FITS = int(os.environ.get('MAX_QUEUED_FITS', '64'))
+
+# Users with fewer income entries, or entries spanning fewer days, are not
+# worth a model of their own yet
+MIN_FIT_ENTRIES = 10
+MIN_FIT_DAYS = 28
+
+# A user's model is refitted once their income entries grew by this share
+# since it was fitted, or changed without growing (edits, removals)
+REFIT_GROWTH = 0.25
+
+_SAFE_USER_ID = re.compile(r'^[A-Za-z0-9_-]{1,64}$')
+
+def user_model_name(user_id):
+    return f'{USER_MODEL_PREFIX}{user_id}'
+
+def category_model_name(category):
+    """Model name for a gig category such as "Food Delivery" (income_forecaster_category_food_delivery)"""
+    return CATEGORY_MODEL_PREFIX + re.sub(r'[^a-z0-9]+', '_', category.lower()).strip('_')
+
+def main_category(income_data):
+    """Most common gig category of a user's income entries, or None"""
+    counts = Counter(item.get('category') for item in income_data)
+    counts.pop(None, None)
+    return counts.most_common(1)[0][0] if counts else None
+
+def income_fingerprint(income_data):
+    """Digest of the (date, amount) of every income entry a user model is fitted on"""
+    return hashlib.blake2b(entry_rows(*entry_columns(income_data)), digest_size=16).hexdigest()
+
+def fit_metadata(income_data):
+    """Manifest metadata of a user model: how many entries it was fitted on, and their fingerprint"""
+    return {"entries": len(income_data), "income_fingerprint": income_fingerprint(income_data)}
+
+def _model_user_id(user_id):
+    """user_id if it can name a model file, else None"""
+    if isinstance(user_id, bool):
+        return None
+    if isinstance(user_id, int) or (isinstance(user_id, str) and _SAFE_USER_ID.match(user_id)):
+        return user_id
+    return None
+
+def candidate_models(user_id, income_data, category=None):
+    """Names of the stored models ForecastRouter.route may serve this user from, most specific first"""
+    names = []
+    model_user_id = _model_user_id(user_id)
+    if model_user_id is not None:
+        names.append(user_model_name(model_user_id))
+    names.append(MULTI_TENANT_MODEL)
+    category = category or main_category(income_data)
+    if category:
+        names.append(category_model_name(category))
+    names.append(GLOBAL_MODEL)
+    return names
+
+class ForecastRouter:
+    """Serves the most specific income forecaster that already exists
+
+    Tries, in order: the user's own model, the multi-tenant model when it was
+    trained on the user, the model for the user's gig category, the global
+    model, and finally fallback(income_data). Known users (is_known(user_id))
+    with enough history and no model of their own, or one fitted on data that
+    has since changed, are queued for a background fit, so requests never
+    wait for training.
+    """
+
+    def __init__(self, registry, fit, fallback, load_timeout=None, max_queued=MAX_QUEUED_FITS,
+                 min_fit_entries=MIN_FIT_ENTRIES, is_known=None):
+        self.registry = registry
+        self.fit = fit
+        self.fallback = fallback
+        self.load_timeout = load_timeout
+        self.min_fit_entries = min_fit_entries
+        self.is_known = is_known or (lambda user_id: False)
+        self.fits_completed = 0
+        self.fits_failed = 0
+        self._queue = queue.Queue(max_queued)
+        self._pending = set()
+        self._lock = threading.Lock()
+        self._worker = None
+
+    def _load(self, name):
+        """A stored model (loaded once for all concurrent callers), or None if it cannot be had in time"""
+        if not self.registry.available(name):
+            return None
+        return self.registry.get_or_build(name, timeout=self.load_timeout, fallback=lambda: None)
+
+    def route(self, user_id, income_data, category=None):
+        """(forecaster, tier, model name); tier is user, multi_tenant, category, global or fallback"""
+        model_user_id = _model_user_id(user_id)
+        if model_user_id is not None:
+            name = user_model_name(model_user_id)
+            model = self._load(name)
+            if model is not None:
+                if self._outdated(name, income_data):
+                    self.schedule_fit(model_user_id, income_data)
+                return model, 'user', name
+
+        multi_tenant = self.registry.get(MULTI_TENANT_MODEL)
+        if multi_tenant is not None:
+            if multi_tenant.knows(user_id):
+                return multi_tenant.for_user(user_id), 'multi_tenant', MULTI_TENANT_MODEL
+        elif model_user_id is not None:
+            # The shared model replaces per-user ones; they are only fitted without it
+            self.schedule_fit(model_user_id, income_data)
+
+        category = category or main_category(income_data)
+        if category:
+            name = category_model_name(category)
+            model = self._load(name)
+            if model is not None:
+                return model, 'category', name
+
+        model = self._load(GLOBAL_MODEL)
+        if model is not None:
+            return model, 'global', GLOBAL_MODEL
+
+        return self.fallback(income_data), 'fallback', None
+
+    def _outdated(self, name, income_data):
+        """Whether a user model was fitted on data that has since grown by REFIT_GROWTH or changed"""
+        entry = self.registry.published().get(name, {})
+        fitted = entry.get("entries")
+        if fitted is None:
+            return False  # Fitted before sizes were recorded; retrained by train_models.py
+        if len(income_data) > fitted:
+            return len(income_data) >= fitted * (1 + REFIT_GROWTH)
+        return income_fingerprint(income_data) != entry.get("income_fingerprint")
+
+    def fittable(self, user_id, income_data):
+        """Whether a user is known and has enough history for a model of their own"""
+        if len(income_data) < self.min_fit_entries or not self.is_known(user_id):
+            return False
+        days, _ = entry_columns(income_data)
+        return int((days.max() - days.min()).astype(np.int64)) >= MIN_FIT_DAYS
+
+    def schedule_fit(self, user_id, income_data):
+        """Queue a background fit of the user's own model; False if it was not queued"""
+        if not self.fittable(user_id, income_data):
+            return False
+        with self._lock:
+            if user_id in self._pending:
+                return False
+            try:
+                self._queue.put_nowait((user_id, income_data))
+            except queue.Full:
+                return False
+            self._pending.add(user_id)
+            if self._worker is None:
+                self._worker = threading.Thread(target=self._run, name='user-model-fits', daemon=True)
+                self._worker.start()
+        return True
+
+    def _run(self):
+        while True:
+            user_id, income_data = self._queue.get()
+            name = user_model_name(user_id)
+            try:
+                # Another process (or node) fitting this user's model already covers this one
+                with build_lock(name, self.registry.models_dir) as locked:
+                    if locked and (name not in self.registry.published() or self._outdated(name, income_data)):
+                        self.registry.publish(name, self.fit(income_data), fit_metadata(income_data))
+                        self.fits_completed += 1
+            except Exception as e:
+                self.fits_failed += 1
+                print(f"Error fitting income model for user {user_id}: {e}")
+            finally:
+                with self._lock:
+                    self._pending.discard(user_id)
+                self._queue.task_done()
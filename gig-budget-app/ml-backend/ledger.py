@@ -0,0 +1,292 @@
+import json
+from collections.abc import Sequence
+
+import numpy as np
+
+from features import parse_dates
+
+# Numeric columns and the dtype they are stored as. Amounts are kept as
+# integer paise, which is exact for 2-decimal rupee amounts and 4 bytes.
+NUMERIC_FIELDS = {
+    'id': np.int32,
+    'user_id': np.int32,
+}
+# Low-cardinality text fields, stored as int32 codes into a per-ledger table
+TEXT_FIELDS = ('category', 'source', 'paymentMethod')
+# Free text, which repeats less; kept as object arrays
+FREE_TEXT_FIELDS = ('title', 'description')
+MISSING = -1  # Code/value used when an entry does not have a field
+
+def _encode(values, table=None):
+    """(int32 codes of values into table, table) where table is a list extended with new strings"""
+    table = [] if table is None else table
+    lookup = {value: code for code, value in enumerate(table)}
+    codes = np.fromiter((MISSING if value is None else lookup.setdefault(value, len(lookup))
+                         for value in values), dtype=np.int32, count=len(values))
+    table.extend(list(lookup)[len(table):])
+    return codes, table
+
+def _recode(codes, table, merged):
+    """codes into table, re-expressed as codes into merged (extended with table's new strings)"""
+    mapping, _ = _encode(table, merged)
+    recoded = np.full(len(codes), MISSING, dtype=np.int32)
+    present = codes != MISSING
+    recoded[present] = mapping[codes[present]]
+    return recoded
+
+def _free_text_column(values):
+    """Object array of values in which equal strings share one object"""
+    distinct = {}
+    column = np.empty(len(values), dtype=object)
+    column[:] = [None if value is None else distinct.setdefault(value, value) for value in values]
+    return column
+
+class Ledger:
+    """Columnar, memory-lean representation of income or expense entries
+
+    Every entry is one slot in a set of typed arrays: int32 date ordinals
+    (days since 1970-01-01), int32 paise amounts, int32 ids, int8 recurring
+    flags and int32 codes into per-ledger tables for low-cardinality text
+    fields, so each distinct category or source is stored once per ledger
+    and freed with it. Titles and descriptions are object arrays in which
+    repeated strings share one object. Dicts are only rebuilt, on demand,
+    when a response needs whole entries. Fields outside the known schema are
+    kept per row in a sparse dict.
+    """
+
+    def __init__(self, dates, amounts_paise, numeric, text_codes, text_tables, recurring, free_text, extras=None):
+        self.dates = dates
+        self.amounts_paise = amounts_paise
+        self.numeric = numeric
+        self.text_codes = text_codes
+        self.text_tables = text_tables  # field -> list of the distinct strings text_codes index
+        self.recurring = recurring
+        self.free_text = free_text
+        self.extras = extras or {}
+        self._text_nbytes = None
+
+    def __len__(self):
+        return len(self.dates)
+
+    @classmethod
+    def from_entries(cls, entries):
+        n = len(entries)
+        dates = parse_dates([item['date'] for item in entries]).astype(np.int32)
+
+        amounts = np.round(np.fromiter((item['amount'] for item in entries), dtype=np.float64, count=n) * 100)
+        amount_dtype = np.int32 if n == 0 or np.abs(amounts).max() < 2 ** 31 else np.int64
+        amounts_paise = amounts.astype(amount_dtype)
+
+        known = {'date', 'amount', 'recurring', *NUMERIC_FIELDS, *TEXT_FIELDS, *FREE_TEXT_FIELDS}
+        extras = {}
+        numeric = {}
+        for field, dtype in NUMERIC_FIELDS.items():
+            column = np.full(n, MISSING, dtype=dtype)
+            for row, item in enumerate(entries):
+                value = item.get(field)
+                if isinstance(value, int) and not isinstance(value, bool) and 0 <= value < 2 ** 31:
+                    column[row] = value
+                elif value is not None:
+                    extras.setdefault(row, {})[field] = value  # e.g. string ids from the frontend
+            numeric[field] = column
+
+        text_codes, text_tables = {}, {}
+        for field in TEXT_FIELDS:
+            text_codes[field], text_tables[field] = _encode([item.get(field) for item in entries])
+        free_text = {field: _free_text_column([item.get(field) for item in entries]) for field in FREE_TEXT_FIELDS}
+        recurring = np.fromiter((MISSING if item.get('recurring') is None else int(bool(item['recurring']))
+                                 for item in entries), dtype=np.int8, count=n)
+
+        for row, item in enumerate(entries):
+            if len(item) > len(known) or not known.issuperset(item):
+                unknown = {key: value for key, value in item.items() if key not in known}
+                if unknown:
+                    extras.setdefault(row, {}).update(unknown)
+
+        return cls(dates, amounts_paise, numeric, text_codes, text_tables, recurring, free_text, extras)
+
+    @classmethod
+    def concat(cls, ledgers):
+        """Append ledgers into a new one, merging their text tables"""
+        ledgers = [ledger for ledger in ledgers if len(ledger)]
+        if not ledgers:
+            return cls.from_entries([])
+        extras, offset = {}, 0
+        for ledger in ledgers:
+            extras.update({row + offset: values for row, values in ledger.extras.items()})
+            offset += len(ledger)
+        text_codes, text_tables = {}, {}
+        for field in TEXT_FIELDS:
+            table = text_tables[field] = list(ledgers[0].text_tables[field])
+            text_codes[field] = np.concatenate([ledgers[0].text_codes[field]] + [
+                _recode(ledger.text_codes[field], ledger.text_tables[field], table) for ledger in ledgers[1:]])
+        return cls(
+            np.concatenate([ledger.dates for ledger in ledgers]),
+            np.concatenate([ledger.amounts_paise for ledger in ledgers]),
+            {field: np.concatenate([ledger.numeric[field] for ledger in ledgers]) for field in NUMERIC_FIELDS},
+            text_codes,
+            text_tables,
+            np.concatenate([ledger.recurring for ledger in ledgers]),
+            {field: np.concatenate([ledger.free_text[field] for ledger in ledgers]) for field in FREE_TEXT_FIELDS},
+            extras
+        )
+
+    @property
+    def amounts(self):
+        """Amounts in rupees as float64"""
+        return self.amounts_paise / 100.0
+
+    @property
+    def days(self):
+        return self.dates.astype('datetime64[D]')
+
+    def texts(self, field):
+        """Values of one text field (None where missing)"""
+        if field in self.free_text:
+            return self.free_text[field].tolist()
+        table = self.text_tables[field]
+        return [None if code == MISSING else table[code] for code in self.text_codes[field].tolist()]
+
+    def record(self, row):
+        """Materialize one entry as a dict, with the same keys it was built from"""
+        item = {}
+        for field in NUMERIC_FIELDS:
+            value = self.numeric[field][row]
+            if value != MISSING:
+                item[field] = int(value)
+        item['date'] = str(self.dates[row].astype('datetime64[D]'))
+        item['amount'] = int(self.amounts_paise[row]) / 100
+        for field in TEXT_FIELDS:
+            code = int(self.text_codes[field][row])
+            if code != MISSING:
+                item[field] = self.text_tables[field][code]
+        for field in FREE_TEXT_FIELDS:
+            value = self.free_text[field][row]
+            if value is not None:
+                item[field] = value
+        if self.recurring[row] != MISSING:
+            item['recurring'] = bool(self.recurring[row])
+        item.update(self.extras.get(row, {}))
+        return item
+
+    def with_rows_replaced(self, rows, entries):
+        """New ledger with the given rows replaced by entries (same order)"""
+        replacement = Ledger.from_entries(entries)
+        amount_dtype = np.promote_types(self.amounts_paise.dtype, replacement.amounts_paise.dtype)
+
+        ledger = Ledger(
+            self.dates.copy(),
+            self.amounts_paise.astype(amount_dtype),
+            {field: column.copy() for field, column in self.numeric.items()},
+            {field: codes.copy() for field, codes in self.text_codes.items()},
+            {field: list(table) for field, table in self.text_tables.items()},
+            self.recurring.copy(),
+            {field: texts.copy() for field, texts in self.free_text.items()},
+            dict(self.extras)
+        )
+        rows = np.asarray(rows, dtype=np.int64)
+        ledger.dates[rows] = replacement.dates
+        ledger.amounts_paise[rows] = replacement.amounts_paise
+        ledger.recurring[rows] = replacement.recurring
+        for field in NUMERIC_FIELDS:
+            ledger.numeric[field][rows] = replacement.numeric[field]
+        for field in TEXT_FIELDS:
+            ledger.text_codes[field][rows] = _recode(replacement.text_codes[field], replacement.text_tables[field],
+                                                     ledger.text_tables[field])
+        for field in FREE_TEXT_FIELDS:
+            ledger.free_text[field][rows] = replacement.free_text[field]
+        for offset, row in enumerate(rows.tolist()):
+            ledger.extras.pop(row, None)
+            if offset in replacement.extras:
+                ledger.extras[row] = replacement.extras[offset]
+        return ledger
+
+    def row_ids(self):
+        """Entry id of every row (from the id column or, for non-integer ids, the extras)"""
+        ids = self.numeric['id'].tolist()
+        for row, values in self.extras.items():
+            if 'id' in values:
+                ids[row] = values['id']
+        return [None if value == MISSING else value for value in ids]
+
+    def to_arrays(self, prefix):
+        """Arrays for np.savez; text tables are compacted to the strings still in use"""
+        arrays = {
+            f'{prefix}dates': self.dates,
+            f'{prefix}amounts_paise': self.amounts_paise,
+            f'{prefix}recurring': self.recurring,
+            f'{prefix}extras': np.array(json.dumps({str(row): values for row, values in self.extras.items()}))
+        }
+        for field in NUMERIC_FIELDS:
+            arrays[f'{prefix}{field}'] = self.numeric[field]
+        for field in TEXT_FIELDS:
+            local, table = _encode(self.texts(field))
+            arrays[f'{prefix}{field}_codes'] = local
+            arrays[f'{prefix}{field}_table'] = np.array(json.dumps(table))
+        for field in FREE_TEXT_FIELDS:
+            table = {}
+            local = np.fromiter((table.setdefault(value, len(table)) for value in self.free_text[field]),
+                                dtype=np.int32, count=len(self))
+            arrays[f'{prefix}{field}_codes'] = local
+            arrays[f'{prefix}{field}_table'] = np.array(json.dumps(list(table)))
+        return arrays
+
+    @classmethod
+    def from_arrays(cls, arrays, prefix):
+        """Inverse of to_arrays"""
+        text_codes, text_tables = {}, {}
+        for field in TEXT_FIELDS:
+            table = json.loads(str(arrays[f'{prefix}{field}_table']))
+            codes = arrays[f'{prefix}{field}_codes'].astype(np.int32)
+            if None in table:  # Files written before per-ledger tables stored missing values in the table
+                codes, table = _encode([table[code] for code in codes.tolist()])
+            text_codes[field], text_tables[field] = codes, table
+        free_text = {}
+        for field in FREE_TEXT_FIELDS:
+            table = _free_text_column(json.loads(str(arrays[f'{prefix}{field}_table'])))
+            free_text[field] = table[arrays[f'{prefix}{field}_codes']]
+        return cls(
+            arrays[f'{prefix}dates'],
+            arrays[f'{prefix}amounts_paise'],
+            {field: arrays[f'{prefix}{field}'] for field in NUMERIC_FIELDS},
+            text_codes,
+            text_tables,
+            arrays[f'{prefix}recurring'],
+            free_text,
+            {int(row): values for row, values in json.loads(str(arrays[f'{prefix}extras'])).items()}
+        )
+
+    @property
+    def nbytes(self):
+        """Bytes held by this ledger's arrays, text tables and free text"""
+        if self._text_nbytes is None:
+            distinct = {id(value): value for texts in self.free_text.values() for value in texts if value is not None}
+            strings = [*distinct.values(), *(value for table in self.text_tables.values() for value in table)]
+            self._text_nbytes = sum(len(value) + 49 for value in strings)
+        arrays = [self.dates, self.amounts_paise, self.recurring, *self.numeric.values(), *self.text_codes.values(),
+                  *self.free_text.values()]
+        return sum(array.nbytes for array in arrays) + self._text_nbytes + 200 * len(self.extras)
+
+class LedgerEntries(Sequence):
+    """Read-only list view of a Ledger that builds entry dicts only when they are accessed
+
+    Lets route logic written against lists of dicts run on a stored Ledger;
+    len() and truthiness are O(1) and code that only needs aggregates never
+    materializes a single entry.
+    """
+
+    def __init__(self, ledger, key=None):
+        self.ledger = ledger
+        self.key = key  # Identifies the ledger's contents (e.g. dataset id and version) for caches
+
+    def __len__(self):
+        return len(self.ledger)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self.ledger.record(row) for row in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError('ledger index out of range')
+        return self.ledger.record(index)
@@ -0,0 +1,290 @@
+"""Concurrent load test for the ML backend
+
+Starts the backend locally (Flask or the async server), then runs N client
+processes that replay the dashboard's call pattern from
+src/services/aiPredictionService.ts. Each of the five insight calls fetches
+/api/test-data and then POSTs the ledger to its analysis endpoint.
+Ledgers come from train_models' generators with a mix of history lengths,
+so payload sizes vary like they do across real workers.
+
+By default each ledger is uploaded once to /api/datasets and the analysis
+calls send only its {"datasetId"}, as the dashboard does; --mode payload
+posts the full ledger with every call instead.
+
+Reports throughput, latency percentiles and error rate per route, plus the
+server's CPU and RSS over time.
+
+Run with: python load_test.py --clients 8 --duration 30 [--server async] [--mode payload]
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import random
+import subprocess
+import sys
+import threading
+import time
+
+import numpy as np
+import requests
+
+try:
+    import psutil
+except ImportError:  # Fall back to /proc (Linux only)
+    psutil = None
+
+import train_models
+
+# Dashboard call order, as in aiPredictionService.ts
+DASHBOARD_CALLS = [
+    'forecast-income',
+    'analyze-expenses',
+    'savings-plan',
+    'tax-suggestions',
+    'low-income-preparation'
+]
+
+# Months of history per generated worker; short and long ledgers are mixed
+HISTORY_MONTHS = [1, 3, 6, 12, 24]
+
+SERVER_COMMANDS = {
+    'flask': lambda port: [sys.executable, '-c', f"import app; app.app.run(port={port}, threaded=True)"],
+    'async': lambda port: [sys.executable, 'async_app.py', '--port', str(port)]
+}
+
+def generate_payloads(count, seed=7):
+    """Ledgers of generated workers with varying history length"""
+    random.seed(seed)
+    payloads = []
+    for i in range(count):
+        user_id = 1000 + i
+        months = HISTORY_MONTHS[i % len(HISTORY_MONTHS)]
+        income_data = train_models.generate_realistic_gig_income(months=months, user_id=user_id)
+        expense_data = train_models.generate_expenses(income_data, user_id=user_id)
+        payloads.append({
+            "category": income_data[0]["category"],
+            "months": months,
+            "body": json.dumps({"incomeData": income_data, "expenseData": expense_data})
+        })
+    return payloads
+
+def upload_datasets(base_url, payloads):
+    """Store each ledger once and replace its request body with a reference to the dataset"""
+    for payload in payloads:
+        response = requests.post(f"{base_url}/datasets", data=payload["body"],
+                                 headers={'Content-Type': 'application/json'}, timeout=60)
+        response.raise_for_status()
+        payload["body"] = json.dumps({"datasetId": response.json()["datasetId"]})
+
+def run_client(args):
+    """One simulated dashboard user; returns [(route, started_at, latency, ok)]"""
+    base_url, payloads, deadline, seed = args
+    rng = random.Random(seed)
+    session = requests.Session()
+    headers = {'Content-Type': 'application/json'}
+    records = []
+
+    def timed(route, send):
+        started = time.time()
+        try:
+            ok = send().status_code == 200
+        except requests.RequestException:
+            ok = False
+        records.append((route, started, time.time() - started, ok))
+
+    while time.time() < deadline:
+        payload = rng.choice(payloads)
+        for call in DASHBOARD_CALLS:
+            timed('test-data', lambda: session.get(
+                f"{base_url}/test-data", params={'category': payload["category"]}, timeout=60))
+            timed(call, lambda: session.post(
+                f"{base_url}/{call}", data=payload["body"], headers=headers, timeout=60))
+            if time.time() >= deadline:
+                break
+
+    return records
+
+def _process_tree(pid):
+    """pid and all of its descendants (the async server runs pool workers)"""
+    if psutil is not None:
+        try:
+            root = psutil.Process(pid)
+            return [pid] + [child.pid for child in root.children(recursive=True)]
+        except psutil.NoSuchProcess:
+            return []
+
+    parents = {}
+    for entry in os.listdir('/proc'):
+        if entry.isdigit():
+            try:
+                with open(f'/proc/{entry}/stat') as f:
+                    parents[int(entry)] = int(f.read().rsplit(')', 1)[1].split()[1])
+            except (OSError, IndexError, ValueError):
+                pass
+    tree, frontier = [pid], [pid]
+    while frontier:
+        frontier = [child for child, parent in parents.items() if parent in frontier]
+        tree.extend(frontier)
+    return tree
+
+def _cpu_seconds_and_rss(pid):
+    """(user+system CPU seconds, RSS bytes) of one process"""
+    if psutil is not None:
+        process = psutil.Process(pid)
+        times = process.cpu_times()
+        return times.user + times.system, process.memory_info().rss
+
+    with open(f'/proc/{pid}/stat') as f:
+        fields = f.read().rsplit(')', 1)[1].split()
+    ticks = os.sysconf('SC_CLK_TCK')
+    page_size = os.sysconf('SC_PAGE_SIZE')
+    return (int(fields[11]) + int(fields[12])) / ticks, int(fields[21]) * page_size
+
+class ResourceSampler(threading.Thread):
+    """Samples CPU% and RSS of the server process tree at a fixed interval"""
+
+    def __init__(self, pid, interval=1.0):
+        super().__init__(daemon=True)
+        self.pid = pid
+        self.interval = interval
+        self.samples = []  # (elapsed_seconds, cpu_percent, rss_bytes)
+        self._stop_event = threading.Event()
+
+    def _totals(self):
+        cpu, rss = 0.0, 0
+        for pid in _process_tree(self.pid):
+            try:
+                process_cpu, process_rss = _cpu_seconds_and_rss(pid)
+            except Exception:
+                continue  # Process exited between listing and sampling
+            cpu += process_cpu
+            rss += process_rss
+        return cpu, rss
+
+    def run(self):
+        start = last_time = time.time()
+        last_cpu, _ = self._totals()
+        while not self._stop_event.wait(self.interval):
+            now = time.time()
+            cpu, rss = self._totals()
+            self.samples.append((now - start, 100 * (cpu - last_cpu) / (now - last_time), rss))
+            last_cpu, last_time = cpu, now
+
+    def stop(self):
+        self._stop_event.set()
+        self.join()
+
+def start_server(kind, port):
+    """Start the backend and wait until it answers"""
+    env = dict(os.environ, MODEL_WATCH_INTERVAL='0')
+    server = subprocess.Popen(SERVER_COMMANDS[kind](port), env=env,
+                              stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    base_url = f"http://127.0.0.1:{port}/api"
+    for _ in range(120):
+        if server.poll() is not None:
+            raise RuntimeError(f"{kind} server exited with code {server.returncode}")
+        try:
+            requests.get(f"{base_url}/test-data", timeout=1)
+            return server, base_url
+        except requests.RequestException:
+            time.sleep(0.5)
+    server.terminate()
+    raise RuntimeError(f"{kind} server did not start on port {port}")
+
+def summarize(records, wall_time):
+    """Per-route and overall throughput, latency percentiles and error rate"""
+    by_route = {}
+    for route, _, latency, ok in records:
+        by_route.setdefault(route, []).append((latency, ok))
+
+    summary = {}
+    for route, results in list(by_route.items()) + [('ALL', [(r[2], r[3]) for r in records])]:
+        latencies = np.array([latency for latency, _ in results]) * 1000
+        errors = sum(1 for _, ok in results if not ok)
+        summary[route] = {
+            "requests": len(results),
+            "throughput_rps": round(len(results) / wall_time, 2),
+            "error_rate": round(errors / len(results), 4) if results else 0,
+            "p50_ms": round(float(np.percentile(latencies, 50)), 2),
+            "p95_ms": round(float(np.percentile(latencies, 95)), 2),
+            "p99_ms": round(float(np.percentile(latencies, 99)), 2)
+        }
+    return summary
+
+def print_report(summary, samples, args):
+    print(f"\n=== {args.server} server, {args.mode} mode, {args.clients} clients, {args.duration}s ===")
+    print(f"{'route':<24}{'requests':>9}{'req/s':>9}{'errors':>9}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+    for route, stats in summary.items():
+        print(f"{route:<24}{stats['requests']:>9}{stats['throughput_rps']:>9}{stats['error_rate']:>9.2%}"
+              f"{stats['p50_ms']:>10}{stats['p95_ms']:>10}{stats['p99_ms']:>10}")
+
+    print("\nServer resources:")
+    print(f"{'t (s)':>7}{'CPU %':>9}{'RSS MB':>10}")
+    for elapsed, cpu, rss in samples:
+        print(f"{elapsed:>7.1f}{cpu:>9.1f}{rss / 1024 / 1024:>10.1f}")
+
+def main():
+    parser = argparse.ArgumentParser(description='Load test the ML backend with realistic dashboard traffic')
+    parser.add_argument('--clients', type=int, default=8, help='Number of client processes')
+    parser.add_argument('--duration', type=float, default=30, help='Seconds to generate load for')
+    parser.add_argument('--server', choices=sorted(SERVER_COMMANDS), default='flask')
+    parser.add_argument('--port', type=int, default=5050)
+    parser.add_argument('--url', help='Use an already running server at this /api base URL instead')
+    parser.add_argument('--payloads', type=int, default=20, help='Number of distinct generated workers')
+    parser.add_argument('--mode', choices=['dataset', 'payload'], default='dataset',
+                        help='Send a stored datasetId (default) or the full ledger with every call')
+    parser.add_argument('--sample-interval', type=float, default=1.0)
+    parser.add_argument('--output', help='Also write the results as JSON to this file')
+    args = parser.parse_args()
+
+    print(f"Generating {args.payloads} worker ledgers...")
+    payloads = generate_payloads(args.payloads)
+
+    server = None
+    if args.url:
+        base_url = args.url.rstrip('/')
+    else:
+        print(f"Starting {args.server} server on port {args.port}...")
+        server, base_url = start_server(args.server, args.port)
+
+    if args.mode == 'dataset':
+        print(f"Uploading {len(payloads)} datasets...")
+        try:
+            upload_datasets(base_url, payloads)
+        except Exception:
+            if server:
+                server.terminate()
+            raise
+
+    sampler = ResourceSampler(server.pid, args.sample_interval) if server else None
+    try:
+        if sampler:
+            sampler.start()
+        started = time.time()
+        deadline = started + args.duration
+        client_args = [(base_url, payloads, deadline, seed) for seed in range(args.clients)]
+        with multiprocessing.Pool(args.clients) as pool:
+            records = [record for client in pool.map(run_client, client_args) for record in client]
+        wall_time = time.time() - started
+    finally:
+        if sampler:
+            sampler.stop()
+        if server:
+            server.terminate()
+            server.wait()
+
+    samples = sampler.samples if sampler else []
+    summary = summarize(records, wall_time)
+    print_report(summary, samples, args)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({
+                "config": vars(args),
+                "routes": summary,
+                "resources": [{"t": t, "cpu_percent": cpu, "rss_bytes": rss} for t, cpu, rss in samples]
+            }, f, indent=2)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,273 @@
+import gc
+import os
+import pickle
+import random
+import sys
+import threading
+import time
+import tracemalloc
+from collections import deque
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+MB = 1024 * 1024
+
+# Evictable caches (rollups, datasets, per-user models, trackers) are shrunk
+# once their accounted bytes exceed MEMORY_CACHE_BUDGET_MB, down to
+# EVICT_TO_FRACTION of it. When the process's resident size exceeds
+# MEMORY_SOFT_LIMIT_MB (0 disables), caches are halved until it drops below,
+# so the process gives memory back before the OOM killer takes it.
+MEMORY_CACHE_BUDGET = int(os.environ.get('MEMORY_CACHE_BUDGET_MB', '256')) * MB
+MEMORY_SOFT_LIMIT = int(os.environ.get('MEMORY_SOFT_LIMIT_MB', '0')) * MB
+MEMORY_CHECK_INTERVAL = float(os.environ.get('MEMORY_CHECK_INTERVAL', '1'))
+EVICT_TO_FRACTION = 0.8
+SOFT_LIMIT_ROUNDS = 4  # Halvings tried per check before giving up
+
+# Opt-in allocation profiling: this share of requests is traced with tracemalloc
+MEMORY_PROFILE_SAMPLE_RATE = float(os.environ.get('MEMORY_PROFILE_SAMPLE_RATE', '0'))
+PROFILE_FRAMES = 1  # Traceback depth recorded per allocation
+PROFILE_TOP_LINES = 10
+PROFILE_POLL_INTERVAL = 0.002  # Seconds between checks for a new peak during a traced request
+
+def process_memory():
+    """(resident bytes, peak resident bytes) of this process; None where the platform cannot tell"""
+    rss = peak = None
+    try:
+        with open('/proc/self/statm', 'r') as f:
+            rss = int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, AttributeError):
+        pass
+    if resource is not None:
+        maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        peak = maxrss if sys.platform == 'darwin' else maxrss * 1024  # Bytes on macOS, KB on Linux
+    return rss, peak
+
+class _ByteCounter:
+    def __init__(self):
+        self.size = 0
+
+    def write(self, data):
+        self.size += memoryview(data).nbytes  # Large buffers are written as PickleBuffer objects
+
+def pickled_size(obj):
+    """Bytes obj serializes to; a close estimate of the memory of array-heavy objects such as models"""
+    counter = _ByteCounter()
+    pickle.dump(obj, counter, protocol=pickle.HIGHEST_PROTOCOL)
+    return counter.size
+
+def release_freed_memory():
+    """Collect garbage and ask glibc to hand freed heap pages back to the OS"""
+    gc.collect()
+    try:
+        import ctypes
+        ctypes.CDLL('libc.so.6').malloc_trim(0)
+    except (OSError, AttributeError):
+        pass
+
+class MemoryAccountant:
+    """Named memory components with their sizes and, for caches, a way to shrink them
+
+    size() returns a component's approximate bytes; evict(max_bytes), when
+    given, shrinks it to at most max_bytes. Under pressure, components are
+    shrunk in ascending priority, so cheap-to-rebuild caches go first.
+    """
+
+    def __init__(self, cache_budget=MEMORY_CACHE_BUDGET, soft_limit=MEMORY_SOFT_LIMIT,
+                 check_interval=MEMORY_CHECK_INTERVAL):
+        self.cache_budget = cache_budget
+        self.soft_limit = soft_limit
+        self.check_interval = check_interval
+        self.evictions = deque(maxlen=20)
+        self._components = {}
+        self._lock = threading.Lock()
+        self._last_check = 0.0
+
+    def register(self, name, size, evict=None, priority=0, items=None):
+        self._components[name] = (size, evict, priority, items)
+
+    def _evictable(self):
+        return sorted(((name, size, evict) for name, (size, evict, priority, _) in self._components.items() if evict),
+                      key=lambda component: self._components[component[0]][2])
+
+    def sizes(self):
+        return {name: size() for name, (size, _, _, _) in self._components.items()}
+
+    def enforce(self, force=False):
+        """Shrink caches if over budget; checks at most once per check_interval unless forced"""
+        now = time.monotonic()
+        if not force and now - self._last_check < self.check_interval:
+            return
+        if not self._lock.acquire(blocking=False):
+            return  # Another thread is already enforcing
+        try:
+            self._last_check = now
+            self._enforce_cache_budget()
+            if self.soft_limit:
+                self._enforce_soft_limit()
+        finally:
+            self._lock.release()
+
+    def _enforce_cache_budget(self):
+        components = self._evictable()
+        total = sum(size() for _, size, _ in components)
+        if total <= self.cache_budget:
+            return
+        excess = total - self.cache_budget * EVICT_TO_FRACTION
+        freed = {}
+        for name, size, evict in components:
+            if excess <= 0:
+                break
+            before = size()
+            evict(max(0, before - excess))
+            freed[name] = before - size()
+            excess -= freed[name]
+        release_freed_memory()
+        self._record('cache budget', freed)
+
+    def _enforce_soft_limit(self):
+        rss, _ = process_memory()
+        if rss is None or rss <= self.soft_limit:
+            return
+        freed = {}
+        for _ in range(SOFT_LIMIT_ROUNDS):
+            for name, size, evict in self._evictable():
+                before = size()
+                evict(before // 2)
+                freed[name] = freed.get(name, 0) + before - size()
+            release_freed_memory()
+            rss, _ = process_memory()
+            if rss <= self.soft_limit or not any(size() for _, size, _ in self._evictable()):
+                break
+        self._record('soft limit', freed, rss)
+
+    def _record(self, reason, freed, rss=None):
+        self.evictions.append({
+            "time": time.time(),
+            "reason": reason,
+            "freed_bytes": {name: int(bytes_) for name, bytes_ in freed.items() if bytes_},
+            "rss_after": rss
+        })
+        print(f"Memory {reason} exceeded; evicted {sum(freed.values()) / MB:.1f} MB from caches")
+
+    def report(self):
+        rss, peak = process_memory()
+        components = {}
+        for name, (size, evict, priority, items) in self._components.items():
+            components[name] = {"bytes": int(size()), "evictable": evict is not None}
+            if items is not None:
+                components[name]["items"] = items()
+        return {
+            "process": {"rss_bytes": rss, "peak_rss_bytes": peak},
+            "components": components,
+            "budgets": {
+                "cache_budget_bytes": self.cache_budget,
+                "cached_bytes": sum(component["bytes"] for component in components.values() if component["evictable"]),
+                "soft_limit_bytes": self.soft_limit or None
+            },
+            "evictions": list(self.evictions)
+        }
+
+class RouteMemoryProfiler:
+    """Samples requests with tracemalloc and attributes their peak allocations to source lines
+
+    Tracing runs only for the duration of a sampled request, one request at
+    a time (tracemalloc is process-wide), so every traced allocation belongs
+    to it. While it runs, a helper thread takes a snapshot whenever traced
+    memory reaches a new high, so temporaries that are freed before the
+    request returns are still attributed at their peak.
+    """
+
+    def __init__(self, sample_rate=MEMORY_PROFILE_SAMPLE_RATE, frames=PROFILE_FRAMES, top=PROFILE_TOP_LINES):
+        self.sample_rate = sample_rate
+        self.frames = frames
+        self.top = top
+        self.routes = {}  # route -> statistics
+        self._active = threading.Lock()
+        self._filters = [tracemalloc.Filter(False, tracemalloc.__file__), tracemalloc.Filter(False, __file__)]
+
+    def profile(self, route, handler):
+        """Run handler(), tracing it if this request is sampled"""
+        if self.sample_rate <= 0 or random.random() >= self.sample_rate or not self._active.acquire(blocking=False):
+            return handler()
+        started_tracing = not tracemalloc.is_tracing()
+        try:
+            if started_tracing:
+                tracemalloc.start(self.frames)
+            tracemalloc.clear_traces()
+            tracemalloc.reset_peak()
+
+            peak = {"bytes": 0, "snapshot": None}
+            done = threading.Event()
+            watcher = threading.Thread(target=self._watch_peak, args=(peak, done), daemon=True)
+            watcher.start()
+            started = time.perf_counter()
+            try:
+                return handler()
+            finally:
+                elapsed = time.perf_counter() - started
+                done.set()
+                watcher.join()
+                current, traced_peak = tracemalloc.get_traced_memory()
+                if peak["snapshot"] is None or current >= peak["bytes"]:
+                    peak["snapshot"] = tracemalloc.take_snapshot()
+                self._record(route, traced_peak, peak["snapshot"], elapsed)
+        finally:
+            if started_tracing:
+                tracemalloc.stop()
+            self._active.release()
+
+    def _watch_peak(self, peak, done):
+        while not done.wait(PROFILE_POLL_INTERVAL):
+            current, _ = tracemalloc.get_traced_memory()
+            # Only re-snapshot on a clearly higher peak; snapshots are not free
+            if current > peak["bytes"] * 1.1 + 64 * 1024:
+                peak["snapshot"] = tracemalloc.take_snapshot()
+                peak["bytes"] = current
+
+    def _record(self, route, traced_peak, snapshot, elapsed):
+        stats = self.routes.setdefault(route, {"samples": 0, "max_peak_bytes": 0, "total_peak_bytes": 0})
+        stats["samples"] += 1
+        stats["total_peak_bytes"] += traced_peak
+        stats["mean_peak_bytes"] = stats["total_peak_bytes"] // stats["samples"]
+        if traced_peak >= stats["max_peak_bytes"]:
+            lines = snapshot.filter_traces(self._filters).statistics('lineno')[:self.top]
+            stats["max_peak_bytes"] = traced_peak
+            stats["max_peak_seconds"] = round(elapsed, 4)
+            stats["top_lines"] = [
+                {"line": f"{line.traceback[0].filename}:{line.traceback[0].lineno}", "bytes": line.size,
+                 "allocations": line.count}
+                for line in lines
+            ]
+
+    def report(self):
+        return {"sample_rate": self.sample_rate, "routes": self.routes}
+
+class MemoryMiddleware:
+    """WSGI middleware that profiles sampled /api/ requests and enforces memory budgets after each one"""
+
+    def __init__(self, app, accountant, profiler, skip=('/api/memory',)):
+        self.app = app
+        self.accountant = accountant
+        self.profiler = profiler
+        self.skip = skip
+
+    def __call__(self, environ, start_response):
+        path = environ.get('PATH_INFO', '')
+        try:
+            if path.startswith('/api/') and not path.startswith(self.skip):
+                return self.profiler.profile(path[len('/api/'):], lambda: self._buffered(environ, start_response))
+            return self.app(environ, start_response)
+        finally:
+            self.accountant.enforce()
+
+    def _buffered(self, environ, start_response):
+        """Run the app and materialize its body, so allocations made while producing it are traced"""
+        iterable = self.app(environ, start_response)
+        try:
+            return list(iterable)
+        finally:
+            if hasattr(iterable, 'close'):
+                iterable.close()
@@ -0,0 +1,387 @@
+import contextlib
+import json
+import os
+import tempfile
+import threading
+import uuid
+from datetime import datetime
+
+import joblib
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+# Versioned model artifacts live under models/versions/<name>/<version>.joblib.
+# models/manifest.json names the current version of every model. Artifacts and
+# the manifest are written to a temp file first and renamed into place, so a
+# reader never sees a partially written file. MODELS_DIR may be a directory
+# shared by several nodes; manifest updates are then serialized with a file lock.
+MODELS_DIR = os.environ.get('MODELS_DIR', 'models')
+MANIFEST_FILE = 'manifest.json'
+MANIFEST_LOCK_FILE = '.manifest.lock'
+BUILD_LOCKS_DIR = '.build-locks'
+VERSIONS_DIR = 'versions'
+KEEP_VERSIONS = 3  # Older versions are pruned, but not the ones a slow reader may still open
+
+_manifest_lock = threading.Lock()
+
+def atomic_write(path, write):
+    """Write a file through a temp file in the same directory and an atomic rename"""
+    directory = os.path.dirname(path) or '.'
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.tmp-')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            write(f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+@contextlib.contextmanager
+def _manifest_update(models_dir):
+    """Hold the manifest lock of this process and, where supported, of every process sharing models_dir"""
+    with _manifest_lock:
+        if fcntl is None:
+            yield
+            return
+        os.makedirs(models_dir, exist_ok=True)
+        with open(os.path.join(models_dir, MANIFEST_LOCK_FILE), 'a') as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+@contextlib.contextmanager
+def build_lock(name, models_dir=MODELS_DIR):
+    """Try to take the cross-process lock on building a model without waiting; yields whether it was taken
+
+    Lets one process fit a model while the others, on this node or another
+    one sharing models_dir, skip it instead of fitting it again.
+    """
+    if fcntl is None:
+        yield True
+        return
+    directory = os.path.join(models_dir, BUILD_LOCKS_DIR)
+    os.makedirs(directory, exist_ok=True)
+    with open(os.path.join(directory, f'{name}.lock'), 'a') as lock_file:
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            yield False
+            return
+        try:
+            yield True
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+def manifest_path(models_dir=MODELS_DIR):
+    return os.path.join(models_dir, MANIFEST_FILE)
+
+def read_manifest(models_dir=MODELS_DIR):
+    """Read the manifest, or an empty one if nothing has been published yet"""
+    try:
+        with open(manifest_path(models_dir), 'r') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {"models": {}}
+
+def new_version():
+    """Sortable, unique version id"""
+    return datetime.utcnow().strftime('%Y%m%dT%H%M%S%f') + '-' + uuid.uuid4().hex[:6]
+
+def _prune_versions(name, models_dir, current):
+    """Remove all but the newest KEEP_VERSIONS artifacts of a model, and never its current one"""
+    directory = os.path.join(models_dir, VERSIONS_DIR, name)
+    artifacts = sorted(f for f in os.listdir(directory) if f.endswith('.joblib'))
+    for file in artifacts[:-KEEP_VERSIONS]:
+        if f'{VERSIONS_DIR}/{name}/{file}' == current:
+            continue
+        try:
+            os.remove(os.path.join(directory, file))
+        except OSError:
+            pass
+
+def publish_models(named_models, models_dir=MODELS_DIR, metadata=None):
+    """Write new versions of several models and switch the manifest to them at once
+
+    Returns a dict of model name -> published version. The manifest is read,
+    updated and written back under _manifest_update, so concurrent publishes
+    from other threads, pool processes or nodes keep each other's entries.
+    """
+    entries = {}
+    for name, model in named_models.items():
+        version = new_version()
+        rel_path = f'{VERSIONS_DIR}/{name}/{version}.joblib'
+        atomic_write(os.path.join(models_dir, rel_path), lambda f, model=model: joblib.dump(model, f))
+        entries[name] = {
+            "version": version,
+            "path": rel_path,
+            "published_at": datetime.utcnow().isoformat() + 'Z'
+        }
+        entries[name].update((metadata or {}).get(name, {}))
+
+    with _manifest_update(models_dir):
+        manifest = read_manifest(models_dir)
+        manifest.setdefault("models", {}).update(entries)
+        payload = json.dumps(manifest, indent=2).encode('utf-8')
+        atomic_write(manifest_path(models_dir), lambda f: f.write(payload))
+        # Under the lock too, so a concurrent publish of the same model cannot
+        # prune the version this one just switched the manifest to
+        for name in entries:
+            _prune_versions(name, models_dir, manifest["models"][name]["path"])
+
+    return {name: entry["version"] for name, entry in entries.items()}
+
+def unpublish_models(names, models_dir=MODELS_DIR):
+    """Remove models from the manifest, so workers stop serving them; returns the names that were there
+
+    Their artifacts are left for readers that already opened them and are
+    pruned with the model's versions if it is published again.
+    """
+    with _manifest_update(models_dir):
+        manifest = read_manifest(models_dir)
+        removed = [name for name in names if manifest.get("models", {}).pop(name, None) is not None]
+        if removed:
+            payload = json.dumps(manifest, indent=2).encode('utf-8')
+            atomic_write(manifest_path(models_dir), lambda f: f.write(payload))
+    return removed
+
+def publish_model(name, model, models_dir=MODELS_DIR, metadata=None):
+    """Publish a single model; see publish_models"""
+    return publish_models({name: model}, models_dir, {name: metadata or {}})[name]
+
+def load_model(name, models_dir=MODELS_DIR, manifest=None):
+    """Return (version, model) for the current version of a model
+
+    Falls back to the unversioned models/<name>.joblib file written by older
+    releases, and returns (None, None) when the model does not exist.
+    """
+    if manifest is None:
+        manifest = read_manifest(models_dir)
+
+    entry = manifest.get("models", {}).get(name)
+    if entry:
+        return entry["version"], joblib.load(os.path.join(models_dir, entry["path"]))
+
+    legacy_path = os.path.join(models_dir, f'{name}.joblib')
+    if os.path.exists(legacy_path):
+        return 'legacy', joblib.load(legacy_path)
+
+    return None, None
+
+class _Flight:
+    """Outcome of one in-progress build, shared by every caller waiting on it"""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+class SingleFlight:
+    """Run at most one build per key at a time; concurrent callers share its result
+
+    The build runs on its own thread, so every caller (including the one that
+    started it) can give up after a bounded wait while the build finishes in
+    the background for whoever asks next.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._flights = {}  # key -> _Flight
+
+    def _run(self, key, flight, fn):
+        try:
+            flight.result = fn()
+        except BaseException as e:
+            flight.error = e
+        finally:
+            with self._lock:
+                del self._flights[key]
+            flight.done.set()
+
+    def start(self, key, fn):
+        """Join the in-progress build for key, or start one"""
+        with self._lock:
+            flight = self._flights.get(key)
+            if flight is not None:
+                return flight
+            flight = self._flights[key] = _Flight()
+
+        threading.Thread(target=self._run, args=(key, flight, fn), name=f'build-{key}', daemon=True).start()
+        return flight
+
+    def do(self, key, fn, timeout=None):
+        """Return fn()'s result for key, raising TimeoutError after timeout seconds"""
+        flight = self.start(key, fn)
+        if not flight.done.wait(timeout):
+            raise TimeoutError(f"Timed out after {timeout}s waiting for {key}")
+        if flight.error is not None:
+            raise flight.error
+        return flight.result
+
+class ModelRegistry:
+    """In-process view of the model store with atomic hot swapping
+
+    Lookups read an immutable snapshot dict, so they never take a lock and
+    never observe a half-loaded model. New versions are loaded off the
+    request path and swapped in by replacing the snapshot.
+    """
+
+    def __init__(self, models_dir=MODELS_DIR):
+        self.models_dir = models_dir
+        self._models = {}  # name -> (version, model)
+        self._swap_lock = threading.Lock()
+        self._flights = SingleFlight()
+        self._watcher = None
+        self._stop = threading.Event()
+        self._manifest_mtime = self._read_manifest_mtime()
+        self._published = (None, {})  # (manifest mtime, its name -> entry)
+
+    def __contains__(self, name):
+        return name in self._models
+
+    def __getitem__(self, name):
+        return self._models[name][1]
+
+    def get(self, name, default=None):
+        entry = self._models.get(name)
+        return entry[1] if entry else default
+
+    def version(self, name):
+        entry = self._models.get(name)
+        return entry[0] if entry else None
+
+    def loaded(self):
+        """Snapshot of name -> version for every loaded model"""
+        return {name: entry[0] for name, entry in self._models.items()}
+
+    def _swap(self, updates):
+        with self._swap_lock:
+            models = dict(self._models)
+            models.update(updates)
+            self._models = models
+
+    def publish(self, name, model, metadata=None):
+        """Publish a model to the store and swap it in locally"""
+        version = publish_model(name, model, self.models_dir, metadata)
+        self._swap({name: (version, model)})
+        return model
+
+    def load(self, name):
+        """Load the current version of a model from disk, or return None"""
+        version, model = load_model(name, self.models_dir)
+        if model is not None:
+            self._swap({name: (version, model)})
+        return model
+
+    def get_or_build(self, name, build=None, timeout=None, fallback=None):
+        """Return a model, loading or building it once no matter how many callers ask
+
+        The first caller for a missing model loads it from the store, or calls
+        build() and publishes the result when it is not there. Concurrent
+        callers wait for that same load or build. A caller that waits longer
+        than timeout seconds, or whose build fails, gets fallback() instead.
+        """
+        model = self.get(name)
+        if model is not None:
+            return model
+
+        def load_or_build():
+            model = self.get(name)
+            if model is None:
+                model = self.load(name)
+            if model is None and build is not None:
+                model = self.publish(name, build())
+            return model
+
+        try:
+            model = self._flights.do(name, load_or_build, timeout)
+        except TimeoutError as e:
+            print(f"{e}; serving fallback")
+            model = None
+        except Exception as e:
+            if fallback is None:
+                raise
+            print(f"Error building {name}: {e}; serving fallback")
+            model = None
+
+        if model is None and fallback is not None:
+            return fallback()
+        return model
+
+    def unload(self, name):
+        """Drop a model from this process; it is loaded again from the store when next needed"""
+        with self._swap_lock:
+            models = dict(self._models)
+            removed = models.pop(name, None)
+            self._models = models
+        return removed is not None
+
+    def published(self):
+        """name -> manifest entry (version, path and metadata) of every published model, re-read only when it changes"""
+        mtime = self._read_manifest_mtime()
+        if self._published[0] != mtime or mtime is None:
+            self._published = (mtime, read_manifest(self.models_dir).get("models", {}))
+        return self._published[1]
+
+    def available(self, name):
+        """Whether a model is loaded or can be loaded from the store, without loading it"""
+        if name in self._models:
+            return True
+        return name in self.published() or os.path.exists(os.path.join(self.models_dir, f'{name}.joblib'))
+
+    def _read_manifest_mtime(self):
+        try:
+            return os.stat(manifest_path(self.models_dir)).st_mtime_ns
+        except FileNotFoundError:
+            return None
+
+    def refresh(self):
+        """Preload newer versions of the loaded models and swap them in together; drop unpublished ones"""
+        manifest = read_manifest(self.models_dir)
+        updates, withdrawn = {}, []
+        for name, (version, _) in self._models.items():
+            entry = manifest.get("models", {}).get(name)
+            if not entry:
+                if version not in ('memory', 'legacy'):
+                    withdrawn.append(name)  # Unpublished from the store
+                continue
+            if entry["version"] == version:
+                continue
+            try:
+                updates[name] = (entry["version"], joblib.load(os.path.join(self.models_dir, entry["path"])))
+            except Exception as e:
+                print(f"Error loading {name} version {entry['version']}: {e}")
+
+        if updates:
+            self._swap(updates)
+            print(f"Hot-swapped models: {', '.join(f'{n}@{v}' for n, (v, _) in updates.items())}")
+        for name in withdrawn:
+            self.unload(name)
+        if withdrawn:
+            print(f"Unloaded unpublished models: {', '.join(withdrawn)}")
+        return list(updates)
+
+    def _watch(self, interval):
+        while not self._stop.wait(interval):
+            mtime = self._read_manifest_mtime()
+            if mtime != self._manifest_mtime:
+                self._manifest_mtime = mtime
+                try:
+                    self.refresh()
+                except Exception as e:
+                    print(f"Error refreshing models: {e}")
+
+    def start_watching(self, interval=5.0):
+        """Poll the manifest in a background thread and hot-swap new versions"""
+        if interval <= 0 or self._watcher is not None:
+            return
+        self._watcher = threading.Thread(target=self._watch, args=(interval,), name='model-watcher', daemon=True)
+        self._watcher.start()
@@ -0,0 +1,205 @@
+from collections import Counter
+
+import numpy as np
+from sklearn.ensemble import HistGradientBoostingRegressor
+
+from features import calendar_features, entry_columns
+from sampling import ReservoirSample
+
+MULTI_TENANT_MODEL_PARAMS = {"max_iter": 200, "learning_rate": 0.1, "random_state": 42}
+
+# The shared model is fitted on a uniform sample of at most this many income
+# entries, so training memory does not grow with the population
+MULTI_TENANT_MAX_TRAINING_ROWS = 200000
+
+# A user's bias is their mean residual shrunk toward zero as if BIAS_SHRINKAGE
+# extra zero-residual entries had been seen, so sparse users are not overfitted.
+# Their typical entry amount is shrunk toward the population mean the same way.
+BIAS_SHRINKAGE = 10
+
+# User-level rates from the worker's personality profile; users without one
+# get the neutral "Balanced" profile
+PROFILE_RATES = ('income_boost', 'expense_reduction', 'savings_boost')
+NEUTRAL_RATES = (1.0, 1.0, 1.0)
+
+# Column layout of the shared model's input
+CALENDAR_COLUMNS = 3
+CATEGORY_COLUMN = 3
+SOURCE_COLUMN = 4
+MEAN_AMOUNT_COLUMN = 5
+RATES_START = 6
+N_COLUMNS = RATES_START + len(PROFILE_RATES)
+
+# Extra columns of a training row: the owning user's slot and the entry amount
+OWNER_COLUMN = N_COLUMNS
+AMOUNT_COLUMN = N_COLUMNS + 1
+
+def _most_common(values):
+    counts = Counter(value for value in values if value is not None)
+    return counts.most_common(1)[0][0] if counts else None
+
+class MultiTenantForecaster:
+    """One income model for every user, instead of one pickled model per user
+
+    Each row is an income entry's calendar features, its gig category and
+    income source (as categorical codes), the user's typical entry amount and
+    their profile rates. After the shared model is fitted, each user's
+    shrunken mean residual becomes a per-user bias added to their predictions.
+    Per-user state is a few numbers per user, so memory and load time barely
+    grow with the population.
+    """
+
+    def __init__(self, params=None, bias_shrinkage=BIAS_SHRINKAGE):
+        self.params = dict(MULTI_TENANT_MODEL_PARAMS if params is None else params)
+        self.bias_shrinkage = bias_shrinkage
+        self.model = None
+        self.category_codes = {}
+        self.source_codes = {}
+        self.user_slots = {}  # user_id -> row in the per-user arrays
+        self.user_rates = np.empty((0, len(PROFILE_RATES)), dtype=np.float32)
+        self.user_category = np.empty(0, dtype=np.float32)  # Most common category code (NaN if none)
+        self.user_source = np.empty(0, dtype=np.float32)  # Most common income source code
+        self.user_mean_amount = np.empty(0, dtype=np.float32)
+        self.user_bias = np.empty(0, dtype=np.float32)
+        self.mean_amount = 0.0  # Over every training entry
+
+    @staticmethod
+    def profile_rates(personality):
+        """Rates of a USER_PERSONALITIES entry, or the neutral profile"""
+        if not personality:
+            return NEUTRAL_RATES
+        return tuple(float(personality[rate]) for rate in PROFILE_RATES)
+
+    def _encode(self, codes, value, grow=False):
+        if value is None:
+            return np.nan
+        if value not in codes and grow:
+            codes[value] = len(codes)
+        return codes.get(value, np.nan)  # Unseen values are treated as missing by the model
+
+    def shrunk_mean_amount(self, amounts):
+        """A user's mean entry amount, pulled toward the population mean when they have few entries"""
+        return (float(np.sum(amounts)) + self.bias_shrinkage * self.mean_amount) / (len(amounts) + self.bias_shrinkage)
+
+    def fit(self, users, max_rows=MULTI_TENANT_MAX_TRAINING_ROWS, workdir=None):
+        """Fit on an iterable of {"user_id", "income_data", "rates"} dicts, one user at a time
+
+        Users are consumed as they are yielded: their income rows go into a
+        uniform reservoir sample of at most max_rows rows and only a few
+        numbers per user are kept. The shared model and the per-user biases
+        are fitted on the sample (exactly every row when there are fewer).
+        """
+        sample = ReservoirSample(max_rows, N_COLUMNS + 2, workdir=workdir, dtype=np.float64)  # + owner, amount
+        user_ids, user_rates, user_category, user_source = [], [], [], []
+        amount_sums, amount_counts = [], []
+        try:
+            for slot, user in enumerate(users):
+                days, amounts = entry_columns(user['income_data'])
+                categories = [item.get('category') for item in user['income_data']]
+                sources = [item.get('source') for item in user['income_data']]
+                rates = user.get('rates') or NEUTRAL_RATES
+
+                # The typical-amount column is filled in once the population mean is known
+                rows = np.empty((len(days), N_COLUMNS + 2), dtype=np.float64)
+                rows[:, :CALENDAR_COLUMNS] = calendar_features(days)
+                rows[:, CATEGORY_COLUMN] = [self._encode(self.category_codes, value, grow=True) for value in categories]
+                rows[:, SOURCE_COLUMN] = [self._encode(self.source_codes, value, grow=True) for value in sources]
+                rows[:, RATES_START:N_COLUMNS] = rates
+                rows[:, OWNER_COLUMN] = slot
+                rows[:, AMOUNT_COLUMN] = amounts
+                sample.add(rows)
+
+                user_ids.append(user['user_id'])
+                user_rates.append(rates)
+                user_category.append(self._encode(self.category_codes, _most_common(categories)))
+                user_source.append(self._encode(self.source_codes, _most_common(sources)))
+                amount_sums.append(float(np.sum(amounts)))
+                amount_counts.append(len(amounts))
+
+            amount_sums, amount_counts = np.array(amount_sums), np.array(amount_counts)
+            self.mean_amount = float(amount_sums.sum() / amount_counts.sum())
+            user_mean_amount = (amount_sums + self.bias_shrinkage * self.mean_amount) / \
+                (amount_counts + self.bias_shrinkage)
+
+            rows = np.array(sample.sample())
+        finally:
+            sample.release()
+        owner = rows[:, OWNER_COLUMN].astype(np.intp)
+        y = rows[:, AMOUNT_COLUMN]
+        X = rows[:, :N_COLUMNS]
+        X[:, MEAN_AMOUNT_COLUMN] = user_mean_amount[owner]
+
+        categorical = np.zeros(N_COLUMNS, dtype=bool)
+        categorical[[CATEGORY_COLUMN, SOURCE_COLUMN]] = True
+        self.model = HistGradientBoostingRegressor(categorical_features=categorical, **self.params)
+        self.model.fit(X, y)
+
+        # Per-user bias: shrunken mean residual of the shared model
+        residuals = y - self.model.predict(X)
+        sums = np.bincount(owner, weights=residuals, minlength=len(user_ids))
+        counts = np.bincount(owner, minlength=len(user_ids))
+        self.user_bias = (sums / (counts + self.bias_shrinkage)).astype(np.float32)
+
+        self.user_slots = {user_id: slot for slot, user_id in enumerate(user_ids)}
+        self.user_rates = np.array(user_rates, dtype=np.float32).reshape(-1, len(PROFILE_RATES))
+        self.user_category = np.array(user_category, dtype=np.float32)
+        self.user_source = np.array(user_source, dtype=np.float32)
+        self.user_mean_amount = user_mean_amount.astype(np.float32)
+        return self
+
+    def knows(self, user_id):
+        return user_id in self.user_slots
+
+    def predict_features(self, calendar_rows, user_id, category=None, source=None, mean_amount=None):
+        """Income predicted for a user on rows of (day_of_week, day_of_month, month)
+
+        Known users default to their usual category, income source and entry
+        amount; for other users pass them explicitly (their bias is zero).
+        """
+        calendar_rows = np.asarray(calendar_rows)
+        rows = np.empty((len(calendar_rows), N_COLUMNS), dtype=np.float64)
+        rows[:, :CALENDAR_COLUMNS] = calendar_rows[:, :CALENDAR_COLUMNS]
+
+        slot = self.user_slots.get(user_id)
+        known = slot is not None
+        rows[:, CATEGORY_COLUMN] = self.user_category[slot] if known and category is None else \
+            self._encode(self.category_codes, category)
+        rows[:, SOURCE_COLUMN] = self.user_source[slot] if known and source is None else \
+            self._encode(self.source_codes, source)
+        if mean_amount is None:
+            mean_amount = self.user_mean_amount[slot] if known else self.mean_amount
+        rows[:, MEAN_AMOUNT_COLUMN] = mean_amount
+        rows[:, RATES_START:] = self.user_rates[slot] if known else NEUTRAL_RATES
+
+        predictions = self.model.predict(rows)
+        return predictions + self.user_bias[slot] if known else predictions
+
+    def predict(self, user_id, dates, category=None, source=None, mean_amount=None):
+        """Income predicted for a user on each date"""
+        return self.predict_features(calendar_features(dates), user_id, category, source, mean_amount)
+
+    def for_user(self, user_id, income_data=()):
+        """Forecaster for one user with the same predict(calendar rows) interface as the per-user models"""
+        if self.knows(user_id) or not len(income_data):
+            return _UserForecaster(self, user_id, None, None, None)
+        return _UserForecaster(self, user_id,
+                               _most_common(item.get('category') for item in income_data),
+                               _most_common(item.get('source') for item in income_data),
+                               self.shrunk_mean_amount(entry_columns(income_data)[1]))
+
+    @property
+    def nbytes(self):
+        """Bytes of the per-user state (the shared model's size does not depend on the user count)"""
+        arrays = (self.user_rates, self.user_category, self.user_source, self.user_mean_amount, self.user_bias)
+        return sum(array.nbytes for array in arrays) + 100 * len(self.user_slots)
+
+class _UserForecaster:
+    def __init__(self, forecaster, user_id, category, source, mean_amount):
+        self.forecaster = forecaster
+        self.user_id = user_id
+        self.category = category
+        self.source = source
+        self.mean_amount = mean_amount
+
+    def predict(self, features):
+        return self.forecaster.predict_features(features, self.user_id, self.category, self.source, self.mean_amount)
@@ -0,0 +1,79 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+import zlib
+
+# Routes precomputed by batch_score.py and served from the store
+PRECOMPUTED_ROUTES = ('forecast-income', 'analyze-expenses', 'savings-plan', 'tax-suggestions',
+                      'low-income-preparation')
+
+# Only requests with nothing but these fields are answered from the store;
+# any other option (a tax regime, a simulation, ...) changes the result
+PRECOMPUTED_REQUEST_FIELDS = frozenset({'incomeData', 'expenseData', 'userId', 'datasetId', 'stateKey'})
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS results (
+    user_id TEXT NOT NULL,
+    route TEXT NOT NULL,
+    version TEXT NOT NULL,
+    payload BLOB NOT NULL,
+    computed_at REAL NOT NULL,
+    PRIMARY KEY (user_id, route)
+) WITHOUT ROWID
+"""
+
+class ResultStore:
+    """Precomputed route results per user in one SQLite file
+
+    Each row holds the latest result of one route for one user, the version
+    it was computed from (content hash of the ledgers and of the versions of
+    the models the route read), and the payload as zlib-compressed JSON.
+    Readers get one connection per thread.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        with self._connect() as connection:
+            connection.execute(SCHEMA)
+
+    def _connect(self):
+        connection = sqlite3.connect(self.path, timeout=30)
+        connection.execute('PRAGMA journal_mode=WAL')  # Readers are not blocked by a nightly run
+        return connection
+
+    @property
+    def _connection(self):
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            connection = self._local.connection = self._connect()
+        return connection
+
+    def get(self, user_id, route, version):
+        """Stored payload if it was computed from this version, else None"""
+        row = self._connection.execute(
+            'SELECT version, payload FROM results WHERE user_id = ? AND route = ?', (str(user_id), route)
+        ).fetchone()
+        if row is None or row[0] != version:
+            return None
+        return json.loads(zlib.decompress(row[1]))
+
+    def put_many(self, rows):
+        """Store (user_id, route, version, payload) rows in one transaction"""
+        now = time.time()
+        with self._connection as connection:
+            connection.executemany(
+                'INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?, ?)',
+                [(str(user_id), route, version, zlib.compress(json.dumps(payload).encode('utf-8'), 6), now)
+                 for user_id, route, version, payload in rows]
+            )
+
+    def stats(self):
+        """(rows, users, payload bytes)"""
+        return self._connection.execute(
+            'SELECT COUNT(*), COUNT(DISTINCT user_id), COALESCE(SUM(LENGTH(payload)), 0) FROM results'
+        ).fetchone()
@@ -0,0 +1,181 @@
+import hashlib
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+from ledger import Ledger, LedgerEntries, MISSING
+
+# Rollups are cached per distinct dataset; the cache is bounded both by the
+# number of datasets and by the approximate bytes their arrays take
+ROLLUP_CACHE_SIZE = 512
+ROLLUP_CACHE_MAX_BYTES = 64 * 1024 * 1024
+
+# Content hashes of stored dataset versions, which never change once written
+CONTENT_HASH_CACHE_SIZE = 1024
+_content_hashes = OrderedDict()
+_content_hashes_lock = threading.Lock()
+
+def content_hash(income_data, expense_data):
+    """Hash of the fields the aggregates depend on; the same for a stored dataset and the entries it was built from"""
+    keys = [getattr(side, 'key', None) for side in (income_data, expense_data)]
+    cache_key = '|'.join(keys) if all(keys) else None
+    if cache_key is not None:
+        with _content_hashes_lock:
+            if cache_key in _content_hashes:
+                _content_hashes.move_to_end(cache_key)
+                return _content_hashes[cache_key]
+
+    digest = hashlib.blake2b(digest_size=16)
+    for side in (income_data, expense_data):
+        digest.update(repr([(item.get('date'), item.get('amount'), item.get('category')) for item in side]).encode('utf-8'))
+        digest.update(b'|')
+    result = digest.hexdigest()
+
+    if cache_key is not None:
+        with _content_hashes_lock:
+            _content_hashes[cache_key] = result
+            if len(_content_hashes) > CONTENT_HASH_CACHE_SIZE:
+                _content_hashes.popitem(last=False)
+    return result
+
+def dataset_hash(income_data, expense_data):
+    """Identity of a dataset: its stored version's key, else the hash of its content"""
+    # Stored datasets already know their identity; skip hashing every entry
+    keys = [getattr(side, 'key', None) for side in (income_data, expense_data)]
+    if all(keys):
+        return '|'.join(keys)
+    return content_hash(income_data, expense_data)
+
+def _group_sum(keys, amounts):
+    """Unique keys with the total and count of the amounts under each"""
+    unique, inverse = np.unique(keys, return_inverse=True)
+    return unique, np.bincount(inverse, weights=amounts), np.bincount(inverse)
+
+class LedgerRollup:
+    """Daily, monthly and per-category totals of one ledger"""
+
+    def __init__(self, dates, amounts, categories, first_category=None):
+        self.count = len(amounts)
+        self.total = float(amounts.sum()) if self.count else 0.0
+        self.first_category = first_category
+
+        days = np.asarray(dates, dtype='datetime64[D]')
+        self.days, self.daily_totals, self.daily_counts = _group_sum(days, amounts)
+        self.months, self.monthly_totals_array, _ = _group_sum(days.astype('datetime64[M]'), amounts)
+        self.categories, self.category_totals, self.category_counts = _group_sum(np.asarray(categories), amounts)
+        self.categories = self.categories.tolist()
+
+    @classmethod
+    def from_ledger(cls, ledger, default_category='Uncategorized'):
+        """Aggregate a Ledger, grouping categories by their integer codes"""
+        codes = ledger.text_codes['category']
+        table = ledger.text_tables['category']
+        present = np.flatnonzero(codes != MISSING)
+        first_category = table[int(codes[present[0]])] if len(present) else None
+
+        rollup = cls(ledger.days, ledger.amounts, codes, first_category)
+        rollup.categories = [default_category if code == MISSING else table[code]
+                             for code in rollup.categories]
+        return rollup
+
+    @classmethod
+    def from_entries(cls, entries, default_category='Uncategorized'):
+        ledger = entries.ledger if isinstance(entries, LedgerEntries) else Ledger.from_entries(entries)
+        return cls.from_ledger(ledger, default_category)
+
+    @property
+    def first_date(self):
+        return str(self.days[0]) if self.count else None
+
+    @property
+    def last_date(self):
+        return str(self.days[-1]) if self.count else None
+
+    def monthly_totals(self):
+        """{'YYYY-MM': total} in date order"""
+        return {str(month): float(total) for month, total in zip(self.months, self.monthly_totals_array)}
+
+    def by_category(self):
+        """{category: (total, count)}"""
+        return {category: (float(total), int(count))
+                for category, total, count in zip(self.categories, self.category_totals, self.category_counts)}
+
+    @property
+    def nbytes(self):
+        arrays = (self.days, self.daily_totals, self.daily_counts, self.months, self.monthly_totals_array, self.category_totals, self.category_counts)
+        return sum(array.nbytes for array in arrays) + sum(len(category) + 49 for category in self.categories)
+
+class Rollups:
+    """Aggregates of one posted dataset, shared by every endpoint that receives it"""
+
+    def __init__(self, key, income_data, expense_data):
+        self.key = key
+        self.income = LedgerRollup.from_entries(income_data)
+        self.expense = LedgerRollup.from_entries(expense_data)
+
+    @property
+    def nbytes(self):
+        return self.income.nbytes + self.expense.nbytes
+
+class RollupCache:
+    """Thread-safe LRU of Rollups bounded by entry count and approximate bytes"""
+
+    def __init__(self, max_entries=ROLLUP_CACHE_SIZE, max_bytes=ROLLUP_CACHE_MAX_BYTES):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, income_data, expense_data):
+        """Rollups for a dataset, computed at most once while it stays cached"""
+        key = dataset_hash(income_data, expense_data)
+        with self._lock:
+            rollups = self._entries.get(key)
+            if rollups is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return rollups
+
+        # Aggregate outside the lock; two threads racing on a new dataset both compute it
+        rollups = Rollups(key, income_data, expense_data)
+        with self._lock:
+            self.misses += 1
+            if key not in self._entries:
+                self._entries[key] = rollups
+                self.nbytes += rollups.nbytes
+            self._evict()
+        return rollups
+
+    def _evict(self):
+        while self._entries and (len(self._entries) > self.max_entries or self.nbytes > self.max_bytes):
+            _, evicted = self._entries.popitem(last=False)
+            self.nbytes -= evicted.nbytes
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.nbytes = 0
+
+    def shrink(self, max_bytes):
+        """Evict least recently used rollups until at most max_bytes remain"""
+        with self._lock:
+            while self._entries and self.nbytes > max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self.nbytes -= evicted.nbytes
+
+_cache = RollupCache()
+
+def rollup_cache():
+    """The process-wide RollupCache behind get_rollups"""
+    return _cache
+
+def get_rollups(income_data, expense_data):
+    """Cached rollups of a dataset (see RollupCache)"""
+    return _cache.get(income_data, expense_data)
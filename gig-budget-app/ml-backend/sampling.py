@@ -0,0 +1,64 @@
+import os
+import tempfile
+
+import numpy as np
+
+# Buffers larger than this are backed by a temporary file instead of memory
+MEMMAP_THRESHOLD_BYTES = 256 * 1024 * 1024
+
+def allocate_buffer(shape, dtype=np.float32, workdir=None):
+    """Preallocate a buffer, memory-mapping it to a temporary file when it is large"""
+    nbytes = int(np.prod(shape)) * np.dtype(dtype).itemsize
+    if nbytes < MEMMAP_THRESHOLD_BYTES:
+        return np.empty(shape, dtype=dtype)
+    
+    handle = tempfile.NamedTemporaryFile(dir=workdir, suffix='.buf', delete=False)
+    handle.close()
+    return np.memmap(handle.name, dtype=dtype, mode='w+', shape=shape)
+
+def release_buffer(buffer):
+    """Drop a buffer from allocate_buffer, removing its backing file if any"""
+    filename = getattr(buffer, 'filename', None)
+    if isinstance(buffer, np.memmap) and filename:
+        mapping = getattr(buffer, '_mmap', None)
+        if mapping is not None:
+            mapping.close()  # Windows cannot remove a file that is still mapped
+        os.remove(filename)
+
+class ReservoirSample:
+    """Fixed-size uniform sample of rows that are streamed in chunks"""
+    
+    def __init__(self, capacity, width, seed=42, workdir=None, dtype=np.float32):
+        self.capacity = capacity
+        self.rows = allocate_buffer((capacity, width), dtype=dtype, workdir=workdir)
+        self.seen = 0
+        self.rng = np.random.default_rng(seed)
+    
+    def add(self, chunk):
+        """Offer a chunk of rows to the sample (vectorized Algorithm R)"""
+        chunk = np.asarray(chunk, dtype=self.rows.dtype)
+        if len(chunk) == 0:
+            return
+        
+        # Fill the reservoir until it is full
+        fill = max(0, min(self.capacity - self.seen, len(chunk)))
+        if fill:
+            self.rows[self.seen:self.seen + fill] = chunk[:fill]
+        
+        # Then each later row replaces a random slot with probability capacity / position
+        rest = chunk[fill:]
+        if len(rest):
+            positions = self.seen + fill + np.arange(len(rest))
+            slots = self.rng.integers(0, positions + 1)
+            keep = slots < self.capacity
+            self.rows[slots[keep]] = rest[keep]
+        
+        self.seen += len(chunk)
+    
+    def sample(self):
+        """Rows currently held in the reservoir"""
+        return self.rows[:min(self.seen, self.capacity)]
+    
+    def release(self):
+        release_buffer(self.rows)
+        self.rows = None
@@ -0,0 +1,78 @@
+import numpy as np
+
+# Sampled paths and months projected per simulation; requests may ask for
+# other values up to the maximums, which keep a simulation in milliseconds
+SIMULATION_PATHS = 2000
+SIMULATION_HORIZON_MONTHS = 60
+MAX_SIMULATION_PATHS = 20000
+MAX_SIMULATION_HORIZON_MONTHS = 120
+
+# Percentiles reported for the time to target and the balance fan; the fan
+# is reported every BALANCE_CHECKPOINT_MONTHS months (and at the horizon)
+PERCENTILES = (10, 25, 50, 75, 90)
+BALANCE_PERCENTILES = (10, 50, 90)
+BALANCE_CHECKPOINT_MONTHS = 6
+
+def monthly_history(rollups):
+    """(months, income per month, expenses per month) over every month from the first to the last entry
+
+    Months without income or without expenses are zeros rather than being
+    skipped, since a month with no work is part of the volatility.
+    """
+    sides = [side for side in (rollups.income, rollups.expense) if side.count]
+    start = min(side.months[0] for side in sides)
+    end = max(side.months[-1] for side in sides)
+    months = np.arange(start, end + 1)
+
+    def aligned(side):
+        totals = np.zeros(len(months))
+        if side.count:
+            totals[(side.months - start).astype(np.int64)] = side.monthly_totals_array
+        return totals
+
+    return months, aligned(rollups.income), aligned(rollups.expense)
+
+def simulate_savings(monthly_income, monthly_expenses, target, start_balance=0.0,
+                     paths=SIMULATION_PATHS, horizon=SIMULATION_HORIZON_MONTHS, seed=None):
+    """Distribution of the months needed for the savings balance to reach target
+
+    Every path draws horizon months with replacement from the user's own
+    history. A drawn month brings its income and its expenses together, so
+    months that were both lean and expensive stay that way. The balance of
+    all paths is one cumulative sum over a (horizon, paths) array, laid out
+    so that each month's balances are contiguous.
+    """
+    monthly_net = np.asarray(monthly_income, dtype=np.float64) - np.asarray(monthly_expenses, dtype=np.float64)
+    rng = np.random.default_rng(seed)
+    draws = rng.integers(0, len(monthly_net), size=(horizon, paths))
+    balances = np.cumsum(monthly_net[draws], axis=0)
+    balances += start_balance
+
+    if start_balance >= target:
+        months_to_target = np.zeros(paths)
+    else:
+        reached = balances >= target
+        months_to_target = np.where(reached.any(axis=0), reached.argmax(axis=0) + 1.0, np.inf)
+
+    # Paths that never reach the target sort last, so upper percentiles may be "not within horizon"
+    quantiles = np.percentile(months_to_target, PERCENTILES, method='higher')
+    checkpoints = np.unique(np.r_[np.arange(BALANCE_CHECKPOINT_MONTHS, horizon + 1, BALANCE_CHECKPOINT_MONTHS), horizon])
+    balance_fan = np.percentile(balances[checkpoints - 1], BALANCE_PERCENTILES, axis=1)
+
+    return {
+        "paths": paths,
+        "horizon_months": horizon,
+        "history_months": len(monthly_net),
+        "target": round(float(target), 2),
+        "start_balance": round(float(start_balance), 2),
+        "probability_within_horizon": round(float(np.isfinite(months_to_target).mean()), 4),
+        "months_to_target_percentiles": {
+            f"p{percentile}": None if np.isinf(value) else int(value)
+            for percentile, value in zip(PERCENTILES, quantiles)
+        },
+        "balance_months": checkpoints.tolist(),
+        "balance_percentiles": {
+            f"p{percentile}": np.round(row, 2).tolist()
+            for percentile, row in zip(BALANCE_PERCENTILES, balance_fan)
+        }
+    }
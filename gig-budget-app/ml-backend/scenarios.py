@@ -0,0 +1,104 @@
+import numpy as np
+
+# Most scenarios evaluated in one request
+MAX_SCENARIOS = 10000
+
+# Emergency fund: this many months of (post-scenario) expenses
+EMERGENCY_FUND_MONTHS = 3
+
+class ScenarioError(ValueError):
+    """A scenario that cannot be evaluated, reported to the client as a 400"""
+
+class ScenarioBaseline:
+    """A user's aggregated ledger that what-if scenarios are applied to
+
+    Amounts are per month over the months the ledger spans, so scenarios
+    compare with each other regardless of how much history was posted.
+    """
+
+    def __init__(self, categories, monthly_category_spend, monthly_income, annual_income):
+        self.categories = list(categories)
+        self.category_index = {category: column for column, category in enumerate(self.categories)}
+        self.monthly_category_spend = np.asarray(monthly_category_spend, dtype=np.float64)
+        self.monthly_income = float(monthly_income)
+        self.annual_income = float(annual_income)
+
+    @classmethod
+    def from_rollups(cls, rollups, months, annual_income):
+        categories, totals = rollups.expense.categories, rollups.expense.category_totals
+        return cls(categories, totals / months, rollups.income.total / months, annual_income)
+
+    def parse(self, scenarios):
+        """(cuts matrix of scenarios x categories as fractions, income change per scenario as fractions)
+
+        A scenario is {"cuts": {category: percent}, "incomeChange": percent};
+        both are optional. Raises ScenarioError for malformed scenarios,
+        unknown categories or percentages out of range.
+        """
+        if not isinstance(scenarios, list) or not 0 < len(scenarios) <= MAX_SCENARIOS:
+            raise ScenarioError(f"Provide a list of 1-{MAX_SCENARIOS} scenarios")
+
+        rows, columns, percents, income_changes = [], [], [], []
+        for row, scenario in enumerate(scenarios):
+            if not isinstance(scenario, dict):
+                raise ScenarioError(f"Scenario {row}: must be an object")
+            cuts = scenario.get('cuts') or {}
+            if not isinstance(cuts, dict):
+                raise ScenarioError(f"Scenario {row}: cuts must map categories to percentages")
+            for category, percent in cuts.items():
+                column = self.category_index.get(category)
+                if column is None:
+                    raise ScenarioError(f"Scenario {row}: no expenses in category {category}")
+                rows.append(row)
+                columns.append(column)
+                percents.append(percent)
+            income_changes.append(scenario.get('incomeChange', 0))
+
+        cuts = np.zeros((len(scenarios), len(self.categories)))
+        try:
+            cuts[rows, columns] = np.asarray(percents, dtype=np.float64) / 100
+            income_change = np.asarray(income_changes, dtype=np.float64) / 100
+        except (TypeError, ValueError):
+            raise ScenarioError("Cuts and incomeChange must be percentages")
+        if not (np.isfinite(cuts).all() and np.isfinite(income_change).all()):
+            raise ScenarioError("Cuts and incomeChange must be percentages")
+        if ((cuts < 0) | (cuts > 1)).any():
+            raise ScenarioError("Cuts must be between 0 and 100 percent")
+        if (income_change < -1).any():
+            raise ScenarioError("incomeChange cannot be below -100 percent")
+        return cuts, income_change
+
+    def evaluate(self, cuts, income_change, tax_table):
+        """Columns of results for every scenario, computed as whole-matrix operations"""
+        # One (scenarios x categories) product gives every scenario's savings per category
+        savings_by_category = cuts * self.monthly_category_spend
+        expenses = self.monthly_category_spend.sum() - savings_by_category.sum(axis=1)
+        income = self.monthly_income * (1 + income_change)
+        savings = income - expenses
+
+        emergency_fund = expenses * EMERGENCY_FUND_MONTHS
+        with np.errstate(divide='ignore', invalid='ignore'):
+            months_to_fund = np.where(savings > 0, emergency_fund / savings, np.inf)
+            savings_rate = np.where(income > 0, savings / income * 100, 0.0)
+
+        annual_income = self.annual_income * (1 + income_change)
+        tax = tax_table.liability(annual_income)
+        baseline_tax = float(tax_table.liability(self.annual_income))
+
+        return {
+            "monthly_income": income,
+            "monthly_expenses": expenses,
+            "monthly_savings": savings,
+            "savings_change": savings - (self.monthly_income - self.monthly_category_spend.sum()),
+            "savings_rate": savings_rate,
+            "emergency_fund_target": emergency_fund,
+            "months_to_emergency_fund": months_to_fund,
+            "annual_tax": tax,
+            "tax_change": tax - baseline_tax,
+            "savings_by_category": savings_by_category
+        }
+
+    def baseline(self, tax_table):
+        """The same results with no changes"""
+        results = self.evaluate(np.zeros((1, len(self.categories))), np.zeros(1), tax_table)
+        return {name: values[0] for name, values in results.items()}
@@ -0,0 +1,208 @@
+import calendar
+import threading
+from collections import OrderedDict
+
+from appends import TailDetector, entry_rows
+from features import entry_columns
+
+# A month is "low income" when its total is under this share of the average month
+LOW_INCOME_THRESHOLD = 0.8
+
+# Monthly totals are kept for this many recent years per calendar month; older
+# years stay in the running statistics but are no longer listed individually
+RETAINED_YEARS = 3
+
+# Maximum number of users whose trackers are kept in memory
+TRACKER_CACHE_SIZE = 1024
+
+# Approximate bytes of one tracker (24 RunningStats, 12 small dicts of yearly totals)
+TRACKER_NBYTES = 4096
+
+class RunningStats:
+    """Welford mean and variance that also supports removing a sample
+
+    Replacing a sample (remove the old monthly total, add the new one) keeps
+    the statistics exact while a month is still accumulating entries.
+    """
+    __slots__ = ('count', 'mean', 'm2')
+
+    def __init__(self):
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+
+    def add(self, value):
+        self.count += 1
+        delta = value - self.mean
+        self.mean += delta / self.count
+        self.m2 += delta * (value - self.mean)
+
+    def remove(self, value):
+        if self.count <= 1:
+            self.count, self.mean, self.m2 = 0, 0.0, 0.0
+            return
+        previous_mean = (self.count * self.mean - value) / (self.count - 1)
+        self.m2 = max(0.0, self.m2 - (value - self.mean) * (value - previous_mean))
+        self.mean = previous_mean
+        self.count -= 1
+
+    def replace(self, old_value, new_value):
+        self.remove(old_value)
+        self.add(new_value)
+
+    @property
+    def variance(self):
+        return self.m2 / (self.count - 1) if self.count > 1 else 0.0
+
+    @property
+    def std(self):
+        return self.variance ** 0.5
+
+class SeasonalityTracker:
+    """Per-calendar-month income statistics for one user, updated in O(1) per entry"""
+
+    def __init__(self, retained_years=RETAINED_YEARS):
+        self.retained_years = retained_years
+        self.by_month = [RunningStats() for _ in range(12)]  # Over the yearly totals of each calendar month
+        self.overall = RunningStats()  # Over every (year, month) total
+        self.year_totals = [{} for _ in range(12)]  # Calendar month -> {year: total}, recent years only
+        self.entries = 0
+        self.late_entries = 0  # Entries for years that were already evicted, which cannot be applied
+
+        # The tail of the caller's entry list as of the last sync, used to detect appends
+        self.source = TailDetector()
+
+    def add(self, date, amount):
+        """Apply one income entry dated 'YYYY-MM-DD'"""
+        year, month_index = int(date[:4]), int(date[5:7]) - 1
+        totals = self.year_totals[month_index]
+        stats = self.by_month[month_index]
+
+        if year in totals:
+            old_total = totals[year]
+            totals[year] = old_total + amount
+            stats.replace(old_total, totals[year])
+            self.overall.replace(old_total, totals[year])
+        elif len(totals) >= self.retained_years and year < min(totals):
+            self.late_entries += 1
+            return
+        else:
+            totals[year] = amount
+            stats.add(amount)
+            self.overall.add(amount)
+            if len(totals) > self.retained_years:
+                del totals[min(totals)]
+
+        self.entries += 1
+
+    def add_entries(self, income_data):
+        for item in income_data:
+            self.add(item['date'], item['amount'])
+
+    def snapshot(self):
+        """Copy of the statistics that later syncs do not change; O(1) as the state is bounded"""
+        copy = SeasonalityTracker(self.retained_years)
+        for stats, source in zip((*copy.by_month, copy.overall), (*self.by_month, self.overall)):
+            stats.count, stats.mean, stats.m2 = source.count, source.mean, source.m2
+        copy.year_totals = [dict(totals) for totals in self.year_totals]
+        copy.entries, copy.late_entries = self.entries, self.late_entries
+        return copy
+
+    @classmethod
+    def from_entries(cls, income_data, retained_years=RETAINED_YEARS):
+        tracker = cls(retained_years)
+        tracker.add_entries(sorted(income_data, key=lambda item: item['date']))
+        return tracker
+
+    def average_monthly_income(self):
+        return self.overall.mean
+
+    def monthly_totals(self):
+        """{'YYYY-MM': total} for the retained years, in date order"""
+        totals = {f'{year}-{month_index + 1:02d}': total
+                  for month_index, years in enumerate(self.year_totals)
+                  for year, total in years.items()}
+        return dict(sorted(totals.items()))
+
+    def low_income_months(self, threshold=LOW_INCOME_THRESHOLD):
+        """Retained months whose total is under threshold x the average month"""
+        cutoff = self.overall.mean * threshold
+        return [month for month, total in self.monthly_totals().items() if total < cutoff]
+
+    def seasonal_profile(self):
+        """Statistics per calendar month that has any income"""
+        profile = []
+        for month_index, stats in enumerate(self.by_month):
+            if stats.count == 0:
+                continue
+            years = self.year_totals[month_index]
+            recent = sorted(years)[-2:]
+            year_over_year = None
+            if len(recent) == 2 and recent[1] - recent[0] == 1 and years[recent[0]]:
+                year_over_year = round((years[recent[1]] - years[recent[0]]) / years[recent[0]] * 100, 2)
+            profile.append({
+                "month": month_index + 1,
+                "name": calendar.month_name[month_index + 1],
+                "years": stats.count,
+                "average_income": round(stats.mean, 2),
+                "std_income": round(stats.std, 2),
+                "relative_to_average": round(stats.mean / self.overall.mean, 3) if self.overall.mean else None,
+                "year_over_year_percent": year_over_year
+            })
+        return profile
+
+    def seasonal_risk_months(self, threshold=LOW_INCOME_THRESHOLD):
+        """Calendar months (1-12) that are on average under threshold x the average month"""
+        cutoff = self.overall.mean * threshold
+        return [month_index + 1 for month_index, stats in enumerate(self.by_month)
+                if stats.count and stats.mean < cutoff]
+
+class TrackerCache:
+    """Bounded LRU of trackers per user that only applies entries appended since the last call"""
+
+    def __init__(self, max_users=TRACKER_CACHE_SIZE):
+        self.max_users = max_users
+        self._trackers = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._trackers)
+
+    @property
+    def nbytes(self):
+        return len(self._trackers) * TRACKER_NBYTES
+
+    def shrink(self, max_bytes):
+        """Drop least recently used trackers until at most max_bytes remain; they are rebuilt on the next call"""
+        with self._lock:
+            while self._trackers and len(self._trackers) * TRACKER_NBYTES > max_bytes:
+                self._trackers.popitem(last=False)
+
+    def sync(self, user_key, income_data):
+        """Snapshot of a tracker reflecting income_data, reusing the cached state when entries were only appended
+
+        Only the last few entries seen and the appended ones are read, so a
+        call costs O(appended) rather than O(history). An edit to an older
+        entry is therefore not noticed until the tracker is evicted.
+        """
+        if user_key is None:
+            return SeasonalityTracker.from_entries(income_data)
+
+        length = len(income_data)
+        with self._lock:
+            tracker = self._trackers.get(user_key)
+            start = tracker.source.window(length) if tracker is not None else 0
+            rows = entry_rows(*entry_columns(income_data[start:]))
+            seen = tracker.source.update(rows, length) if tracker is not None else 0
+            if seen:
+                tracker.add_entries(income_data[seen:])
+                self._trackers.move_to_end(user_key)
+            else:
+                # First call, or the list shrank or its last entries changed
+                tracker = SeasonalityTracker.from_entries(income_data)
+                tail = income_data[max(length - tracker.source.tail, 0):]
+                tracker.source.update(entry_rows(*entry_columns(tail)), length)
+                self._trackers[user_key] = tracker
+                if len(self._trackers) > self.max_users:
+                    self._trackers.popitem(last=False)
+            return tracker.snapshot()
@@ -0,0 +1,240 @@
+import math
+
+import numpy as np
+
+from features import entry_columns
+from ledger import LedgerEntries
+
+# Quantiles are within this relative error of the true value
+RELATIVE_ACCURACY = 0.01
+
+# Percentiles are only reported against cohorts with at least this many users
+MIN_COHORT_USERS = 3
+
+ALL_USERS = 'all'
+
+def category_cohort(category):
+    return f'category:{category}'
+
+def personality_cohort(personality):
+    return f'personality:{personality}'
+
+def expense_metric(category):
+    return f'expense:{category}'
+
+def cohort_label(cohort):
+    """Readable name of a cohort, such as 'Cab Driver workers'"""
+    kind, _, name = cohort.partition(':')
+    if kind == 'category':
+        return f'{name} workers'
+    if kind == 'personality':
+        return f'{name} users'
+    return 'all users'
+
+def ordinal(number):
+    number = int(round(number))
+    suffix = 'th' if 10 <= number % 100 <= 20 else {1: 'st', 2: 'nd', 3: 'rd'}.get(number % 10, 'th')
+    return f'{number}{suffix}'
+
+class QuantileSketch:
+    """Mergeable quantile sketch with relative-error guarantees (DDSketch-style)
+
+    Positive values fall into logarithmic buckets [gamma^(i-1), gamma^i), so
+    any quantile is known within RELATIVE_ACCURACY whatever the range of the
+    data. Values <= 0 are counted separately. Two sketches merge by adding
+    bucket counts, so shards or per-file sketches combine exactly.
+    """
+
+    def __init__(self, relative_accuracy=RELATIVE_ACCURACY):
+        self.relative_accuracy = relative_accuracy
+        self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self.offset = 0  # Bucket index of counts[0]
+        self.counts = np.zeros(0, dtype=np.uint32)
+        self.zero_count = 0
+        self.count = 0
+        self._cumulative = None  # Cached for queries; rebuilt after changes
+
+    def __getstate__(self):
+        state = dict(self.__dict__)
+        state['_cumulative'] = None
+        return state
+
+    def _indices(self, values):
+        return np.ceil(np.log(values) / math.log(self.gamma)).astype(np.int64)
+
+    def _grow(self, low, high):
+        """Widen counts to cover bucket indices low..high"""
+        if not len(self.counts):
+            self.offset = low
+            self.counts = np.zeros(high - low + 1, dtype=np.uint32)
+            return
+        new_offset = min(low, self.offset)
+        new_end = max(high + 1, self.offset + len(self.counts))
+        if new_offset == self.offset and new_end == self.offset + len(self.counts):
+            return
+        counts = np.zeros(new_end - new_offset, dtype=np.uint32)
+        counts[self.offset - new_offset:self.offset - new_offset + len(self.counts)] = self.counts
+        self.offset, self.counts = new_offset, counts
+
+    def add(self, values):
+        """Add one value or an array of values"""
+        values = np.atleast_1d(np.asarray(values, dtype=np.float64))
+        positive = values[values > 0]
+        self.zero_count += len(values) - len(positive)
+        self.count += len(values)
+        if len(positive):
+            indices = self._indices(positive)
+            self._grow(int(indices.min()), int(indices.max()))
+            self.counts += np.bincount(indices - self.offset, minlength=len(self.counts)).astype(np.uint32)
+        self._cumulative = None
+        return self
+
+    def merge(self, other):
+        """Add another sketch's values to this one"""
+        if other.gamma != self.gamma:
+            raise ValueError("Cannot merge sketches with different accuracy")
+        if len(other.counts):
+            self._grow(other.offset, other.offset + len(other.counts) - 1)
+            start = other.offset - self.offset
+            self.counts[start:start + len(other.counts)] += other.counts
+        self.zero_count += other.zero_count
+        self.count += other.count
+        self._cumulative = None
+        return self
+
+    def _cumulative_counts(self):
+        if self._cumulative is None:
+            self._cumulative = np.concatenate([[self.zero_count], self.zero_count + np.cumsum(self.counts, dtype=np.int64)])
+        return self._cumulative
+
+    def rank(self, value):
+        """Approximate share (0-1) of the values that are below value"""
+        if not self.count:
+            return None
+        cumulative = self._cumulative_counts()
+        if value <= 0:
+            return self.zero_count / 2 / self.count
+        position = math.ceil(math.log(value) / math.log(self.gamma)) - self.offset
+        if position < 0:
+            return self.zero_count / self.count
+        if position >= len(self.counts):
+            return 1.0
+        # Values in the same bucket count as half below
+        below = cumulative[position]
+        return float(below + self.counts[position] / 2) / self.count
+
+    def quantile(self, q):
+        """Approximate q-quantile (0 <= q <= 1)"""
+        if not self.count:
+            return None
+        target = q * (self.count - 1)
+        if target < self.zero_count:
+            return 0.0
+        position = int(np.searchsorted(self._cumulative_counts()[1:], target, side='right'))
+        position = min(position, len(self.counts) - 1)
+        return 2 * self.gamma ** (self.offset + position) / (self.gamma + 1)
+
+    @property
+    def nbytes(self):
+        return self.counts.nbytes + 32
+
+def user_metrics(income_data, expense_data):
+    """{metric: the user's average monthly amount} for income, all expenses and each expense category
+
+    Months are counted from the first to the last month of each ledger, so a
+    month without any spend in a category lowers that category's average.
+    """
+    metrics = {}
+    if len(income_data):
+        metrics['income'] = _monthly_average(*entry_columns(income_data))
+    if len(expense_data):
+        days, amounts = entry_columns(expense_data)
+        metrics['expenses'] = _monthly_average(days, amounts)
+        months = _month_span(days)
+        if isinstance(expense_data, LedgerEntries):
+            categories = expense_data.ledger.texts('category')
+        else:
+            categories = [item.get('category') for item in expense_data]
+        totals = {}
+        for category, amount in zip(categories, amounts.tolist()):
+            if category is not None:
+                totals[category] = totals.get(category, 0.0) + amount
+        for category, total in totals.items():
+            metrics[expense_metric(category)] = total / months
+    return metrics
+
+def _month_span(days):
+    months = days.astype('datetime64[M]').astype(np.int64)
+    return int(months.max() - months.min()) + 1
+
+def _monthly_average(days, amounts):
+    return float(amounts.sum()) / _month_span(days)
+
+class CohortSketches:
+    """Quantile sketches of user metrics per cohort (gig category, personality, everyone)"""
+
+    def __init__(self, relative_accuracy=RELATIVE_ACCURACY):
+        self.relative_accuracy = relative_accuracy
+        self.sketches = {}  # cohort -> {metric: QuantileSketch}
+        self.users = {}  # cohort -> number of users
+
+    def add_user(self, cohorts, metrics):
+        """Add one user's metrics to each of their cohorts
+
+        Every cohort gets a value for every metric it has seen, so users with
+        no spend in a category count as zero instead of being left out.
+        """
+        for cohort in [ALL_USERS, *cohorts]:
+            sketches = self.sketches.setdefault(cohort, {})
+            for metric in metrics.keys() - sketches.keys():
+                # Earlier users of the cohort had none of this metric
+                sketches[metric] = QuantileSketch(self.relative_accuracy).add(np.zeros(self.users.get(cohort, 0)))
+            for metric, sketch in sketches.items():
+                sketch.add(metrics.get(metric, 0.0))
+            self.users[cohort] = self.users.get(cohort, 0) + 1
+        return self
+
+    def merge(self, other):
+        for cohort, sketches in other.sketches.items():
+            mine = self.sketches.setdefault(cohort, {})
+            users, other_users = self.users.get(cohort, 0), other.users[cohort]
+            for metric in mine.keys() | sketches.keys():
+                if metric not in mine:
+                    mine[metric] = QuantileSketch(self.relative_accuracy).add(np.zeros(users))
+                mine[metric].merge(sketches[metric] if metric in sketches else
+                                   QuantileSketch(self.relative_accuracy).add(np.zeros(other_users)))
+            self.users[cohort] = users + other_users
+        return self
+
+    def cohort_size(self, cohort):
+        return self.users.get(cohort, 0)
+
+    def get(self, cohort, metric):
+        return self.sketches.get(cohort, {}).get(metric)
+
+    def percentile(self, cohort, metric, value):
+        """Percentile (0-100) of value within the cohort, or None without enough peers"""
+        sketch = self.get(cohort, metric)
+        if sketch is None or self.users.get(cohort, 0) < MIN_COHORT_USERS:
+            return None
+        return round(sketch.rank(value) * 100, 1)
+
+    def compare(self, metrics, cohorts):
+        """{metric: {"value", "cohort", "percentile", "median"}} against the most specific cohort with enough users"""
+        comparison = {}
+        for metric, value in metrics.items():
+            for cohort in [*cohorts, ALL_USERS]:
+                percentile = self.percentile(cohort, metric, value)
+                if percentile is not None:
+                    comparison[metric] = {
+                        "value": round(value, 2),
+                        "cohort": cohort,
+                        "percentile": percentile,
+                        "median": round(self.get(cohort, metric).quantile(0.5), 2)
+                    }
+                    break
+        return comparison
+
+    @property
+    def nbytes(self):
+        return sum(sketch.nbytes for sketches in self.sketches.values() for sketch in sketches.values())
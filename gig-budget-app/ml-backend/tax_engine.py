@@ -0,0 +1,130 @@
+import json
+import os
+from datetime import datetime
+
+import numpy as np
+
+# Slab tables are data: add a regime or a new financial year to tax_slabs.json
+TAX_SLABS_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'tax_slabs.json')
+
+# Shortest period an income history is treated as covering when annualizing,
+# so a handful of payments on one day is not multiplied by 365
+MIN_ANNUALIZATION_DAYS = 30
+
+class TaxInputError(ValueError):
+    """Batch input that cannot be scored, reported to the client as a 400"""
+
+class TaxSlabTable:
+    """Progressive slab table evaluated for many incomes at once
+
+    Liability is offsets[i] + (income - lowers[i]) * rates[i], where i is the
+    slab the income falls in and offsets[i] is the tax due on all lower slabs.
+    """
+
+    def __init__(self, key, name, slabs):
+        slabs = sorted(slabs, key=lambda slab: slab["from"])
+        self.key = key
+        self.name = name
+        self.lowers = np.array([slab["from"] for slab in slabs], dtype=np.float64)
+        self.rates = np.array([slab["rate"] for slab in slabs], dtype=np.float64)
+        self.labels = [slab.get("label", f"{slab['rate']:.0%} slab") for slab in slabs]
+        self.offsets = np.concatenate([[0.0], np.cumsum(np.diff(self.lowers) * self.rates[:-1])])
+
+    def slab_index(self, incomes):
+        """Index of the slab each income falls in (a slab's upper bound is inclusive)"""
+        incomes = np.asarray(incomes, dtype=np.float64)
+        return np.clip(np.searchsorted(self.lowers, incomes, side='left') - 1, 0, len(self.lowers) - 1)
+
+    def liability(self, incomes):
+        """Tax due for each income, in one vectorized pass"""
+        incomes = np.maximum(np.asarray(incomes, dtype=np.float64), 0)
+        index = self.slab_index(incomes)
+        return self.offsets[index] + (incomes - self.lowers[index]) * self.rates[index]
+
+_tables = None
+
+def load_tax_tables(path=TAX_SLABS_FILE):
+    """Load every regime from the slab file; returns (tables by key, default key)"""
+    with open(path, 'r', encoding='utf-8') as f:
+        config = json.load(f)
+    tables = {key: TaxSlabTable(key, regime.get("name", key), regime["slabs"])
+              for key, regime in config["regimes"].items()}
+    return tables, config.get("default_regime", next(iter(tables)))
+
+def get_tax_tables():
+    """Slab tables loaded once per process"""
+    global _tables
+    if _tables is None:
+        _tables = load_tax_tables()
+    return _tables
+
+def get_regime(regime=None):
+    """Slab table for a regime key, or the default one; raises KeyError if unknown"""
+    tables, default = get_tax_tables()
+    return tables[regime or default]
+
+def compare_regimes(incomes, regimes=None):
+    """Liability of every income under each regime, as {regime: array}"""
+    tables, _ = get_tax_tables()
+    return {key: tables[key].liability(incomes) for key in (regimes or tables)}
+
+def annualize_income(income_data):
+    """Estimate annual income from entries spread over any period
+
+    Scales the total by the calendar span the entries cover (at least
+    MIN_ANNUALIZATION_DAYS), regardless of how many entries there are.
+    """
+    if not income_data:
+        return 0.0
+
+    dates = [item['date'] for item in income_data]
+    return annualize_total(sum(item['amount'] for item in income_data), min(dates), max(dates))
+
+def annualize_total(total, first_date, last_date):
+    """Scale a total earned between two 'YYYY-MM-DD' dates to a year"""
+    if first_date is None:
+        return 0.0
+
+    first = datetime.strptime(first_date, '%Y-%m-%d')
+    last = datetime.strptime(last_date, '%Y-%m-%d')
+    span_days = max((last - first).days + 1, MIN_ANNUALIZATION_DAYS)
+    return total * 365 / span_days
+
+def _is_amount(value):
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+def batch_incomes(data):
+    """(ids, annual incomes) of a tax batch request
+
+    Precomputed "annualIncomes" are numbered from 0; each of the "workers"
+    keeps its "id" (default: its position after them) and has its
+    "incomeData" annualized. Raises TaxInputError for malformed input.
+    """
+    if not isinstance(data, dict):
+        raise TaxInputError("Request body must be a JSON object")
+    annual_incomes = data.get('annualIncomes') or []
+    workers = data.get('workers') or []
+    if not isinstance(annual_incomes, list) or not isinstance(workers, list):
+        raise TaxInputError("annualIncomes and workers must be lists")
+    if not all(_is_amount(income) for income in annual_incomes):
+        raise TaxInputError("annualIncomes must be numbers")
+
+    ids = list(range(len(annual_incomes)))
+    annual_incomes = list(annual_incomes)
+    for index, worker in enumerate(workers):
+        income_data = worker.get('incomeData') if isinstance(worker, dict) else None
+        if not isinstance(income_data, list) or not all(
+                isinstance(item, dict) and _is_amount(item.get('amount')) for item in income_data):
+            raise TaxInputError(f"Worker {index}: incomeData must be a list of entries with an amount and date")
+        try:
+            annual_incomes.append(annualize_income(income_data))
+        except (KeyError, TypeError, ValueError):
+            raise TaxInputError(f"Worker {index}: income dates must be YYYY-MM-DD")
+        ids.append(worker.get('id', len(ids)))
+
+    if not annual_incomes:
+        raise TaxInputError("Provide annualIncomes or workers with incomeData")
+    incomes = np.array(annual_incomes, dtype=np.float64)
+    if not np.isfinite(incomes).all() or (incomes < 0).any():
+        raise TaxInputError("Annual incomes must be finite and non-negative")
+    return ids, incomes
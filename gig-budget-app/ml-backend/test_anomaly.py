@@ -0,0 +1,44 @@
+import numpy as np
+
+from anomaly import AnomalyState, ANOMALY_Z_THRESHOLD, MAX_PASS_RANK
+
+def _ledger(n_expenses, n_categories, seed=7):
+    """Expenses spread over several categories, with a few spikes to flag"""
+    rng = np.random.default_rng(seed)
+    categories = [f'Category {index}' for index in rng.integers(0, n_categories, n_expenses)]
+    amounts = rng.lognormal(6, 1, n_expenses) * np.where(rng.random(n_expenses) < 0.02, 8, 1)
+    return categories, amounts
+
+def _sequential(state, categories, amounts):
+    scored = [state.score(category, amount) for category, amount in zip(categories, amounts)]
+    return np.array([z for z, _ in scored]), np.array([mean for _, mean in scored])
+
+def test_score_batch_matches_sequential_score():
+    """score_batch on a multi-category ledger gives what score() gives one expense at a time"""
+    # Enough expenses per category for several passes of MAX_PASS_RANK
+    categories, amounts = _ledger(20000, 12)
+    assert len(amounts) / 12 > 2 * MAX_PASS_RANK
+
+    batch_scores, batch_expected = AnomalyState().score_batch(categories, amounts)
+    scores, expected = _sequential(AnomalyState(), categories, amounts)
+
+    np.testing.assert_array_equal(np.isnan(batch_scores), np.isnan(scores))
+    np.testing.assert_allclose(batch_expected, expected, rtol=1e-9)
+    np.testing.assert_allclose(batch_scores, scores, rtol=1e-9, atol=1e-9, equal_nan=True)
+    np.testing.assert_array_equal(batch_scores >= ANOMALY_Z_THRESHOLD, scores >= ANOMALY_Z_THRESHOLD)
+
+def test_score_batch_continues_existing_state():
+    """A batch applied after earlier expenses matches scoring everything in turn"""
+    categories, amounts = _ledger(3000, 12)
+    state = AnomalyState()
+    state.score_batch(categories[:1000], amounts[:1000])
+    batch_scores, batch_expected = state.score_batch(categories[1000:], amounts[1000:])
+    scores, expected = _sequential(AnomalyState(), categories, amounts)
+
+    np.testing.assert_allclose(batch_expected, expected[1000:], rtol=1e-9)
+    np.testing.assert_allclose(batch_scores, scores[1000:], rtol=1e-9, atol=1e-9, equal_nan=True)
+
+if __name__ == "__main__":
+    test_score_batch_matches_sequential_score()
+    test_score_batch_continues_existing_state()
+    print("Batch anomaly scores match sequential scoring")
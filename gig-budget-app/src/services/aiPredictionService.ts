@@ -25,6 +25,67 @@ const getCategoryData = async (category: string): Promise<any> => {
   }
 };
 
+// Dataset sessions by category: the ledger is uploaded once, then analysis
+// calls send only its id
+const datasetSessions: Record<string, { datasetId: string }> = {};
+
+// Uploads in progress by category, so the dashboard's parallel analysis
+// calls share one POST /datasets instead of each creating a dataset
+const pendingSessions: Record<string, Promise<any>> = {};
+
+/**
+ * Upload a category's ledger as a new dataset; the full ledger is the
+ * request body when the dataset cannot be created
+ */
+const createDatasetSession = async (category: string): Promise<any> => {
+  const userData = await getCategoryData(category);
+  try {
+    const response = await axios.post(`${API_BASE_URL}/datasets`, userData);
+    datasetSessions[category] = { datasetId: response.data.datasetId };
+    return { datasetId: response.data.datasetId };
+  } catch (error) {
+    console.error('Error creating dataset, sending the full ledger instead:', error);
+    return userData;
+  }
+};
+
+/**
+ * Request body for an analysis call: a dataset id when a session exists,
+ * otherwise the full ledger (when the dataset cannot be created)
+ */
+const getAnalysisPayload = (category: string): Promise<any> => {
+  const session = datasetSessions[category];
+  if (session) {
+    return Promise.resolve({ datasetId: session.datasetId });
+  }
+  
+  if (!pendingSessions[category]) {
+    pendingSessions[category] = createDatasetSession(category).finally(() => {
+      delete pendingSessions[category];
+    });
+  }
+  return pendingSessions[category];
+};
+
+/**
+ * POST an analysis request, re-uploading the ledger once if the server no longer has the dataset
+ */
+const postAnalysis = async (endpoint: string, category: string): Promise<any> => {
+  const payload = await getAnalysisPayload(category);
+  try {
+    return await axios.post(`${API_BASE_URL}/${endpoint}`, payload);
+  } catch (error) {
+    if (payload.datasetId && axios.isAxiosError(error) && error.response?.status === 404) {
+      // Parallel calls all see the 404; only the first one drops the session
+      if (datasetSessions[category]?.datasetId === payload.datasetId) {
+        delete datasetSessions[category];
+      }
+      return axios.post(`${API_BASE_URL}/${endpoint}`, await getAnalysisPayload(category));
+    }
+    throw error;
+  }
+};
+
 /**
  * Get income forecast for the specified user
  */
@@ -35,11 +96,8 @@ export const getIncomeForecast = async (user: User): Promise<any> => {
       return predictionCache[user.id].incomeForecast;
     }
     
-    // Fetch appropriate data for this user's category
-    const userData = await getCategoryData(user.category);
-    
-    // Make API call to the ML backend
-    const response = await axios.post(`${API_BASE_URL}/forecast-income`, userData);
+    // Make API call to the ML backend with this user's category dataset
+    const response = await postAnalysis('forecast-income', user.category);
     
     // Cache the result
     if (!predictionCache[user.id]) {
@@ -64,11 +122,8 @@ export const getExpenseAnalysis = async (user: User): Promise<any> => {
       return predictionCache[user.id].expenseAnalysis;
     }
     
-    // Fetch appropriate data for this user's category
-    const userData = await getCategoryData(user.category);
-    
-    // Make API call to the ML backend
-    const response = await axios.post(`${API_BASE_URL}/analyze-expenses`, userData);
+    // Make API call to the ML backend with this user's category dataset
+    const response = await postAnalysis('analyze-expenses', user.category);
     
     // Cache the result
     if (!predictionCache[user.id]) {
@@ -93,11 +148,8 @@ export const getSavingsPlan = async (user: User): Promise<any> => {
       return predictionCache[user.id].savingsPlan;
     }
     
-    // Fetch appropriate data for this user's category
-    const userData = await getCategoryData(user.category);
-    
-    // Make API call to the ML backend
-    const response = await axios.post(`${API_BASE_URL}/savings-plan`, userData);
+    // Make API call to the ML backend with this user's category dataset
+    const response = await postAnalysis('savings-plan', user.category);
     
     // Cache the result
     if (!predictionCache[user.id]) {
@@ -122,11 +174,8 @@ export const getTaxSuggestions = async (user: User): Promise<any> => {
       return predictionCache[user.id].taxSuggestions;
     }
     
-    // Fetch appropriate data for this user's category
-    const userData = await getCategoryData(user.category);
-    
-    // Make API call to the ML backend
-    const response = await axios.post(`${API_BASE_URL}/tax-suggestions`, userData);
+    // Make API call to the ML backend with this user's category dataset
+    const response = await postAnalysis('tax-suggestions', user.category);
     
     // Cache the result
     if (!predictionCache[user.id]) {
@@ -151,11 +200,8 @@ export const getLowIncomePreparation = async (user: User): Promise<any> => {
       return predictionCache[user.id].lowIncomePreparation;
     }
     
-    // Fetch appropriate data for this user's category
-    const userData = await getCategoryData(user.category);
-    
-    // Make API call to the ML backend
-    const response = await axios.post(`${API_BASE_URL}/low-income-preparation`, userData);
+    // Make API call to the ML backend with this user's category dataset
+    const response = await postAnalysis('low-income-preparation', user.category);
     
     // Cache the result
     if (!predictionCache[user.id]) {